@@ -1,24 +1,63 @@
 import os
+import json
+import time
+import uuid
+import asyncio
 
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import HTTPException
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from typing import Optional, Dict, List
+from functools import lru_cache
+from contextlib import asynccontextmanager
 
-from src.extraction import extract_articles_and_paragraphs, extract_qa_scope
-from src.language import arabic_to_english_translation, english_to_arabic_translation
-from src.q_and_a import get_question_summary, get_relevant_context, query_response
+_imports_started = time.perf_counter()
+from src.extraction import aextract_articles_and_paragraphs, aextract_qa_scope
+from src.language import aarabic_to_english_translation, aenglish_to_arabic_translation
+from src.q_and_a import (aget_question_summary, aget_relevant_context, aquery_response, astream_query_response,
+                         vector_db)
+from src.llm import get_metrics
+from src.cache import response_cache
+from src.semantic_cache import semantic_cache
+from src.scope import scope_stats
+from src.context import token_stats
+from src.citations import citation_stats
+from src.artifacts import artifacts
+from src.chat import arun_turn
+from src.sessions import get_session_store
+from src.summaries import arefresh_summary, fold_due, summary_stats
+from src.batch import parse_requests, run_batch, BATCH_CONCURRENCY
+from src.registry import get_registry
+from src.startup import record_import, start_warmup, startup_report
+from src.tracing import get_span_metrics, prometheus_metrics
+
+record_import("app", time.perf_counter() - _imports_started)
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+@lru_cache(maxsize=1)
+def get_vector_store():
+    # Loaded once and shared by every request
+    return vector_db()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model and vector store in the background; /ready reports the progress
+    # and requests arriving meanwhile wait for the loads they need
+    start_warmup()
+    yield
+
+
 app = FastAPI(
     title = "AI Regulatory Compliance Assistant Backend API",
     description = "API Documentation",
-    version = "1.0.0"
+    version = "1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -30,16 +69,125 @@ app.add_middleware(
 )
 
 
+def sse_event(event: str, data) -> str:
+    # One Server-Sent Events message
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
 # Home
 @app.get("/", tags=["Home"])
 async def index():
     return {"Project": "AI Regulatory Compliance Assistant Backend"}
 
 
+@app.get("/ready", tags=["Operations"])
+async def ready():
+    # Readiness probe: 503 while the model and vector store are loading
+    report = startup_report()
+    return JSONResponse(content=jsonable_encoder(report), status_code=200 if report["ready"] else 503)
+
+
+def _metric_sections() -> dict:
+    # Every module's counters, one section each
+    registry = get_registry()
+    return {
+        "stages": get_span_metrics,
+        "llm": get_metrics,
+        "caches": lambda: {"responses": response_cache.stats(), "semantic": semantic_cache.stats()},
+        "scope": scope_stats,
+        "summaries": summary_stats,
+        "registry": registry.stats,
+        "embeddings": registry.embedding_stats,
+        "citations": citation_stats,
+        "artifacts": artifacts.stats,
+        "tokens": token_stats,
+    }
+
+
+@app.get("/metrics", tags=["Operations"])
+async def metrics(format: str = "json", section: Optional[str] = None):
+    """
+    Per-stage histograms and the counters of each component, one section each. `section`
+    returns a single section; `format=prometheus` returns the stage histograms.
+    """
+    if format == "prometheus":
+        return PlainTextResponse(prometheus_metrics(), media_type="text/plain; version=0.0.4")
+    sections = _metric_sections()
+    if section is not None:
+        if section not in sections:
+            raise HTTPException(status_code=404, detail=f"Unknown metrics section: {section}")
+        sections = {section: sections[section]}
+    # Some sections read SQLite files
+    report = await asyncio.to_thread(lambda: {name: collect() for name, collect in sections.items()})
+    return JSONResponse(content=jsonable_encoder(report))
+
+
+@app.post("/chat", tags=["Chat"])
+async def chat_endpoint(background_tasks: BackgroundTasks, question: str, language: str = "English",
+                        session_id: Optional[str] = None):
+    """
+    Run a full conversation turn (scope check, translation, summary, retrieval and answer)
+    server-side. The conversation history is kept per `session_id`; omit it to start a new one.
+    """
+    try:
+        store = get_session_store()
+        # The session store may be a SQLite file: keep its reads and writes off the event loop
+        session = await asyncio.to_thread(store.load, session_id or uuid.uuid4().hex)
+        vector_store = await asyncio.to_thread(get_vector_store)
+        result = await arun_turn(question, language, session.recent_messages(), vector_store,
+                                 summary=session.summary)
+        session = await asyncio.to_thread(store.add_turn, session, question, result["answer"], result["message"])
+        # Fold the new exchange into the rolling summary after the response is sent;
+        # out-of-scope turns are folded with the next in-scope one unless the window is full
+        if fold_due(store, session, result["in_scope"]):
+            background_tasks.add_task(arefresh_summary, store, session.session_id)
+        return JSONResponse(content=jsonable_encoder({"session_id": session.session_id, **result}))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/chat/{session_id}", tags=["Chat"])
+async def get_chat_session(session_id: str):
+    session = await asyncio.to_thread(get_session_store().get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return JSONResponse(content=jsonable_encoder({
+        "session_id": session.session_id,
+        "messages": session.messages,
+        "display_messages": session.display_messages(),
+        "summary": session.summary,
+    }))
+
+
+@app.delete("/chat/{session_id}", tags=["Chat"])
+async def delete_chat_session(session_id: str):
+    await asyncio.to_thread(get_session_store().delete, session_id)
+    return {"session_id": session_id, "deleted": True}
+
+
+@app.post("/batch", tags=["Chat"])
+async def batch_endpoint(file: UploadFile = File(...), concurrency: int = Query(BATCH_CONCURRENCY, ge=1, le=64)):
+    """
+    Answer a JSONL file of {"id", "question", "language"} objects. Results are streamed back
+    as JSONL in completion order.
+    """
+    try:
+        requests = parse_requests((await file.read()).decode("utf-8").splitlines())
+    except (UnicodeDecodeError, ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSONL input: {e}")
+
+    async def results():
+        vector_store = await asyncio.to_thread(get_vector_store)
+        async for result in run_batch(requests, vector_store, concurrency):
+            yield json.dumps(jsonable_encoder(result), ensure_ascii=False) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @app.post("/extract_articles_and_paragraphs", tags=["Extraction"])
 async def extract_articles_and_paragraphs_endpoint(question: str):
     try:
-        result = extract_articles_and_paragraphs(question)
+        result = await aextract_articles_and_paragraphs(question)
         return JSONResponse(content=jsonable_encoder(result))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -47,7 +195,7 @@ async def extract_articles_and_paragraphs_endpoint(question: str):
 @app.post("/extract_qa_scope", tags=["Extraction"])
 async def extract_qa_scope_endpoint(question: str):
     try:
-        result = extract_qa_scope(question)
+        result = await aextract_qa_scope(question)
         return JSONResponse(content=jsonable_encoder(result))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -55,7 +203,7 @@ async def extract_qa_scope_endpoint(question: str):
 @app.post("/arabic_to_english_translation", tags=["Language"])
 async def arabic_to_english_translation_endpoint(text: str):
     try:
-        result = arabic_to_english_translation(text)
+        result = await aarabic_to_english_translation(text)
         return JSONResponse(content=jsonable_encoder(result))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
@@ -64,7 +212,7 @@ async def arabic_to_english_translation_endpoint(text: str):
 @app.post("/english_to_arabic_translation", tags=["Language"])
 async def english_to_arabic_translation_endpoint(text: str):
     try:
-        result = english_to_arabic_translation(text)
+        result = await aenglish_to_arabic_translation(text)
         return JSONResponse(content=jsonable_encoder(result))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -74,15 +222,16 @@ async def get_question_summary_endpoint(question: str, conversation_history: Opt
     try:
         if conversation_history is None:
             conversation_history = []
-        result = get_question_summary(question, conversation_history)
+        result = await aget_question_summary(question, conversation_history)
         return JSONResponse(content=jsonable_encoder(result))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.post("/get_relevant_context", tags=["Q&A"])
-async def get_relevant_context_endpoint(question_summary: str):
+async def get_relevant_context_endpoint(question_summary: str, language: str = "English"):
     try:
-        result = get_relevant_context(question_summary)
+        result = await aget_relevant_context(question_summary, await asyncio.to_thread(get_vector_store),
+                                             language=language)
         return JSONResponse(content=jsonable_encoder(result))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -92,8 +241,28 @@ async def get_relevant_context_endpoint(question_summary: str):
 async def query_response_endpoint(question: str, conversation_history: List[Dict[str, str]],
                                       relevant_context: List[Dict[str, str]]):
      try:
-          result = query_response(question, conversation_history, relevant_context)
+          result = await aquery_response(question, conversation_history, relevant_context)
           return JSONResponse(content=jsonable_encoder(result))
      except Exception as e:
           raise HTTPException(status_code=500, detail=str(e))
-     
+
+
+@app.post("/query_stream", tags=["Q&A"])
+async def query_stream_endpoint(question: str, conversation_history: List[Dict[str, str]],
+                                relevant_context: List[Dict[str, str]]):
+    """
+    Streaming `/query_response` as Server-Sent Events: "delta" events carry pieces of the
+    answer as they are generated, the final "response" event the answer with its citations.
+    """
+    async def events():
+        try:
+            async for event in astream_query_response(question, conversation_history, relevant_context):
+                if event["type"] == "delta":
+                    yield sse_event("delta", {"text": event["text"]})
+                else:
+                    yield sse_event("response", event["response"])
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
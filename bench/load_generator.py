@@ -0,0 +1,123 @@
+# Concurrent load generator against a running app.py (see the README for the full setup)
+#   python -m bench.load_generator --url http://127.0.0.1:8000 --concurrency 16 --requests 400 --output load.json
+
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from pathlib import Path
+import httpx
+from .results import latency_report, write_results
+
+FIXTURES = Path(__file__).absolute().parent / "fixtures"
+ENDPOINTS = {
+    "chat": lambda question, language: ("/chat", {"question": question, "language": language}),
+    "relevant_context": lambda question, language: ("/get_relevant_context",
+                                                    {"question_summary": question, "language": language}),
+}
+
+
+def load_questions() -> list[tuple[str, str]]:
+    questions = []
+    for name, language in (("scope_questions.jsonl", "English"), ("arabic_questions.jsonl", "Arabic")):
+        for line in (FIXTURES / name).read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                questions.append((json.loads(line)["question"], language))
+    return questions
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"Server not ready after {timeout}s")
+
+
+async def run_load(url: str, endpoint: str, concurrency: int, requests: int, languages: list[str],
+                   unique: bool = False, timeout: float = 300.0) -> dict:
+    """
+    Send `requests` requests with `concurrency` in flight.
+
+    Returns:
+        dict: Latency report of the successful requests, throughput, errors by status, and the
+            server's metrics after the run.
+    """
+    questions = [item for item in load_questions() if item[1] in languages]
+    queue = asyncio.Queue()
+    for index in range(requests):
+        queue.put_nowait(questions[index % len(questions)])
+
+    seconds = []
+    statuses = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        await wait_until_ready(client, timeout)
+
+        async def worker():
+            while not queue.empty():
+                question, language = queue.get_nowait()
+                if unique:
+                    question = f"{question} ({uuid.uuid4().hex[:8]})"
+                path, params = ENDPOINTS[endpoint](question, language)
+                started = time.perf_counter()
+                try:
+                    status = (await client.post(path, params=params)).status_code
+                except httpx.TransportError as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - started
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status == 200:
+                    seconds.append(elapsed)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+        server_metrics = (await client.get("/metrics")).json()
+
+    return {
+        "latency": latency_report(seconds),
+        "requests": requests,
+        "succeeded": len(seconds),
+        "errors": requests - len(seconds),
+        "statuses": statuses,
+        "wall_seconds": wall,
+        "throughput_rps": len(seconds) / wall if wall else 0.0,
+        "stages": {name: {"p50_s": stats["wall_seconds"]["p50"], "p95_s": stats["wall_seconds"]["p95"],
+                          "mean_s": stats["wall_seconds"]["mean"]}
+                   for name, stats in server_metrics["stages"].items()},
+        "llm": server_metrics["llm"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test against app.py")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the app")
+    parser.add_argument("--endpoint", choices=list(ENDPOINTS), default="chat")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests")
+    parser.add_argument("--languages", nargs="+", default=["English", "Arabic"], choices=["English", "Arabic"])
+    parser.add_argument("--unique", action="store_true", help="Make every question distinct (defeats caches)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request and readiness timeout")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_load(args.url, args.endpoint, args.concurrency, args.requests, args.languages,
+                                   args.unique, args.timeout))
+    write_results("load_generator", {
+        "endpoint": args.endpoint,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "languages": args.languages,
+        "unique": args.unique,
+    }, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# Microbenchmarks of the retrieval path: embedding, Chroma lookups and get_relevant_context
+#   python -m bench.microbenchmarks --repeat 50 --output micro.json
+
+import os
+import json
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from .results import latency_report, write_results
+from .mock_openrouter import MockConfig, serve_in_thread
+
+FIXTURES = Path(__file__).absolute().parent / "fixtures"
+BENCHMARKS = ["embed_query", "embed_documents", "embedding_service", "similarity_search", "lexical_search",
+              "corpus_lookup", "metadata_lookup", "get_relevant_context"]
+
+
+def load_questions() -> list[str]:
+    questions = []
+    for name in ("reference_questions.jsonl", "scope_questions.jsonl"):
+        for line in (FIXTURES / name).read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                questions.append(json.loads(line)["question"])
+    return list(dict.fromkeys(questions))
+
+
+def measure(func, inputs: list, repeat: int) -> list[float]:
+    """
+    Call `func` on every input, `repeat` times over, after one untimed warm-up pass.
+
+    Returns:
+        list[float]: The duration of every timed call, in seconds.
+    """
+    for item in inputs:
+        func(item)
+    seconds = []
+    for _ in range(repeat):
+        for item in inputs:
+            started = time.perf_counter()
+            func(item)
+            seconds.append(time.perf_counter() - started)
+    return seconds
+
+
+def embedding_service_scaling(service, questions: list[str], repeat: int,
+                              concurrency_levels: tuple = (1, 8, 32)) -> dict:
+    """
+    Throughput of the micro-batching embedding service with 1, 8 and 32 concurrent callers.
+    Every text is unique, so nothing is served from its cache.
+    """
+    results = {}
+    for concurrency in concurrency_levels:
+        texts = [f"{question} #{concurrency}-{i}" for i in range(repeat) for question in questions]
+        before = service.stats()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(service.embed_query, texts))
+        seconds = time.perf_counter() - started
+        after = service.stats()
+        batches = after["batches"] - before["batches"]
+        results[f"concurrency_{concurrency}"] = {
+            "texts_per_second": len(texts) / seconds,
+            "average_batch_size": (after["embedded"] - before["embedded"]) / batches if batches else 0.0,
+        }
+    return results
+
+
+def run(benchmarks: list[str], repeat: int, batch_size: int) -> dict:
+    # Imported here: the LLM gateway reads OPENROUTER_BASE_URL at import time
+    from src.q_and_a import (vector_db, embed_query, search_similar_chunks, get_relevant_context,
+                             RETRIEVAL_CANDIDATES)
+    from src.bm25 import lexical_search
+    from src.corpus import load_corpus, mention_pairs, batched_metadata_lookup
+    from src.references import parse_references
+
+    vector_store = vector_db()
+    questions = load_questions()
+    embeddings = {question: embed_query(question, vector_store) for question in questions}
+    mentions = [mention_pairs(parse_references(question)[0]) for question in questions]
+    mentions = [pairs for pairs in mentions if pairs] or [[(4, "1"), (5, "2")]]
+    batches = [questions[start:start + batch_size] for start in range(0, len(questions), batch_size)]
+    # The model itself, without the service's batching and memoization
+    model = getattr(vector_store.embeddings, "model", vector_store.embeddings)
+
+    cases = {
+        "embed_query": (lambda question: model.embed_query(question), questions),
+        "embed_documents": (lambda batch: model.embed_documents(batch), batches),
+        "similarity_search": (lambda question: search_similar_chunks(
+            question, vector_store, k=RETRIEVAL_CANDIDATES, query_embedding=embeddings[question]), questions),
+        "lexical_search": (lambda question: lexical_search(question, vector_store, k=RETRIEVAL_CANDIDATES),
+                           questions),
+        "corpus_lookup": (lambda pairs: load_corpus(vector_store).lookup(pairs), mentions),
+        "metadata_lookup": (lambda pairs: batched_metadata_lookup(vector_store._collection, pairs), mentions),
+        "get_relevant_context": (lambda question: get_relevant_context(question, vector_store), questions),
+    }
+
+    results = {}
+    for name in benchmarks:
+        if name == "embedding_service":
+            results[name] = embedding_service_scaling(vector_store.embeddings, questions, repeat)
+            continue
+        func, inputs = cases[name]
+        report = latency_report(measure(func, inputs, repeat))
+        if name == "embed_documents":
+            report["texts_per_second"] = len(questions) * repeat / (report["mean_ms"] * report["count"] / 1e3)
+        results[name] = report
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of embedding, Chroma lookups and retrieval")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS, help="Benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed passes over the inputs")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per embed_documents call")
+    parser.add_argument("--live", action="store_true", help="Use OPENROUTER_BASE_URL instead of the mock")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Latency of the mock LLM (seconds)")
+    parser.add_argument("--mock-port", type=int, default=8089)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    if not args.live:
+        config = MockConfig(latency=args.llm_latency, jitter=0.0, seed=0)
+        os.environ["OPENROUTER_BASE_URL"] = serve_in_thread(config, port=args.mock_port)
+        os.environ.setdefault("OPENROUTER_API_KEY", "mock")
+        os.environ["LLM_FREE_TIER_RPM"] = "0"
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+
+    results = run(args.only, args.repeat, args.batch_size)
+    write_results("microbenchmarks", {
+        "benchmarks": args.only,
+        "repeat": args.repeat,
+        "batch_size": args.batch_size,
+        "llm": "live" if args.live else f"mock ({args.llm_latency}s)",
+    }, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
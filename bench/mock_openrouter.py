@@ -0,0 +1,233 @@
+# Local stand-in for the OpenRouter Responses API, for offline benchmarks and load tests
+#   python -m bench.mock_openrouter --port 8089 --latency 0.4 --jitter 0.1 --error-rate 0.05
+
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import threading
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Words the generated strings are made of
+FILLER = ("the controller shall process personal data only for the purpose for which it was collected "
+          "and the data subject has the right to access correct and destroy it").split()
+
+
+class MockConfig:
+    """
+    Behaviour of the mock server.
+
+    Args:
+        latency (float): Base seconds before the response (or the first streamed event).
+        jitter (float): Up to this many extra seconds, uniformly random.
+        token_delay (float): Seconds between streamed deltas.
+        error_rate (float): Fraction of requests answered with 429.
+        retry_after (float): Retry-After of the 429 responses, in seconds.
+        answer_words (int): Words in generated free-text fields (answers, translations, summaries).
+        seed (int, optional): Seed of the random generator, for repeatable runs.
+    """
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.1, token_delay: float = 0.01,
+                 error_rate: float = 0.0, retry_after: float = 0.5, answer_words: int = 60, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.answer_words = answer_words
+        self.random = random.Random(seed)
+
+
+def sample_schema(schema: dict, words: int, rng: random.Random):
+    """
+    A value valid against a (strict, structured-output) JSON schema.
+
+    Args:
+        schema (dict): The JSON schema.
+        words (int): Words in generated strings.
+        rng (random.Random): Random generator.
+
+    Returns:
+        The generated value.
+    """
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: sample_schema(prop, words, rng) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        count = max(schema.get("minItems", 0), rng.randint(0, 2))
+        if "maxItems" in schema:
+            count = min(count, schema["maxItems"])
+        return [sample_schema(schema["items"], words, rng) for _ in range(count)]
+    if kind == "integer":
+        return rng.randint(schema.get("minimum", 1), schema.get("maximum", 43))
+    if kind == "number":
+        return rng.uniform(schema.get("minimum", 0.0), schema.get("maximum", 1.0))
+    if kind == "boolean":
+        # Scope checks answer "in scope", so turns go all the way through
+        return True
+    if kind == "string":
+        return " ".join(rng.choice(FILLER) for _ in range(words)).capitalize() + "."
+    return None
+
+
+def request_format(request: dict) -> dict:
+    """
+    The `text.format` of a request. `response_with_citations_schema` is passed as `text=` without
+    the {"format": ...} wrapper, so a bare schema is treated as a json_schema format.
+    """
+    text = request.get("text") or {}
+    if "format" in text:
+        return text["format"]
+    if "properties" in text:
+        return {"type": "json_schema", "name": text.get("title", "schema"), "schema": text}
+    return {}
+
+
+def output_text(request: dict, config: MockConfig) -> str:
+    """
+    Text of the response to a Responses API request.
+    """
+    text_format = request_format(request)
+    if text_format.get("type") == "json_schema":
+        value = sample_schema(text_format["schema"], config.answer_words, config.random)
+        return json.dumps(value, ensure_ascii=False)
+    if text_format.get("type") == "json_object":
+        return json.dumps({"text": sample_schema({"type": "string"}, config.answer_words, config.random)})
+    return sample_schema({"type": "string"}, config.answer_words, config.random)
+
+
+def _estimate_tokens(value) -> int:
+    return max(len(json.dumps(value, ensure_ascii=False)) // 4, 1)
+
+
+def response_object(request: dict, text: str, status: str = "completed") -> dict:
+    """
+    A Responses API response object carrying `text` as its output.
+    """
+    input_tokens = _estimate_tokens(request.get("input", "")) + _estimate_tokens(request.get("instructions", ""))
+    output_tokens = _estimate_tokens(text) if status == "completed" else 0
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": request.get("model", "mock"),
+        "status": status,
+        "output": [] if status != "completed" else [{
+            "type": "message",
+            "id": f"msg_{uuid.uuid4().hex}",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def _chunks(text: str, size: int = 16) -> list[str]:
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    """
+    The mock server app.
+    """
+    app = FastAPI(title="Mock OpenRouter Responses API")
+    stats = {"requests": 0, "streamed": 0, "rate_limited": 0, "formats": {}}
+    lock = threading.Lock()
+
+    def sse(event: dict) -> str:
+        return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    async def events(request: dict, text: str):
+        sequence = 0
+        item_id = f"msg_{uuid.uuid4().hex}"
+        yield sse({"type": "response.created", "sequence_number": sequence,
+                   "response": response_object(request, "", status="in_progress")})
+        for delta in _chunks(text):
+            sequence += 1
+            await asyncio.sleep(config.token_delay)
+            yield sse({"type": "response.output_text.delta", "sequence_number": sequence, "item_id": item_id,
+                       "output_index": 0, "content_index": 0, "delta": delta, "logprobs": []})
+        yield sse({"type": "response.completed", "sequence_number": sequence + 1,
+                   "response": response_object(request, text)})
+
+    @app.post("/api/v1/responses")
+    @app.post("/v1/responses")
+    async def responses(http_request: Request):
+        request = await http_request.json()
+        text_format = request_format(request).get("name", "text")
+        with lock:
+            stats["requests"] += 1
+            stats["formats"][text_format] = stats["formats"].get(text_format, 0) + 1
+            rate_limited = config.random.random() < config.error_rate
+            stats["rate_limited"] += rate_limited
+            stats["streamed"] += bool(request.get("stream"))
+        if rate_limited:
+            return JSONResponse(status_code=429, headers={"Retry-After": str(config.retry_after)},
+                                content={"error": {"message": "Rate limit exceeded (mock)", "code": 429}})
+
+        await asyncio.sleep(config.latency + config.random.uniform(0, config.jitter))
+        text = output_text(request, config)
+        if request.get("stream"):
+            return StreamingResponse(events(request, text), media_type="text/event-stream")
+        return JSONResponse(content=response_object(request, text))
+
+    @app.get("/stats")
+    async def get_stats():
+        with lock:
+            return JSONResponse(content=json.loads(json.dumps(stats)))
+
+    return app
+
+
+def serve_in_thread(config: MockConfig, port: int = 8089, host: str = "127.0.0.1") -> str:
+    """
+    Run the mock server in a daemon thread of the current process.
+
+    Returns:
+        str: Its base URL, for OPENROUTER_BASE_URL.
+    """
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="mock-openrouter", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://{host}:{port}/api/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenRouter Responses API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.3, help="Base response latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random extra latency, up to (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed deltas")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After of the 429s (seconds)")
+    parser.add_argument("--answer-words", type=int, default=60, help="Words per generated text field")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+    config = MockConfig(args.latency, args.jitter, args.token_delay, args.error_rate, args.retry_after,
+                        args.answer_words, args.seed)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Latency and citation accuracy of Arabic turns: translation round trips vs direct answers
+#   python -m bench.multilingual_benchmark --direct-config src/collections_multilingual.yml --output multilingual.json
+
+import json
+import time
+import argparse
+from pathlib import Path
+from src import language, registry
+from src.registry import COLLECTIONS_CONFIG, CollectionRegistry
+from src.chat import run_turn
+from src.llm import get_metrics
+from src.cache import response_cache
+from src.semantic_cache import semantic_cache
+
+FIXTURES = Path(__file__).absolute().parent / "fixtures" / "arabic_questions.jsonl"
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def llm_requests() -> int:
+    return sum(stats["requests"] for stats in get_metrics().values())
+
+
+def _matches(citation: dict, expected: dict) -> bool:
+    if int(citation["article"]) != expected["article"]:
+        return False
+    return expected["paragraph"] is None or int(citation["paragraph"]) == expected["paragraph"]
+
+
+def citation_scores(citations: list[dict], expected: list[dict]) -> tuple[int, int]:
+    """
+    (correct citations, expected references cited) of one answer.
+    """
+    correct = sum(1 for citation in citations if any(_matches(citation, item) for item in expected))
+    found = sum(1 for item in expected if any(_matches(citation, item) for citation in citations))
+    return correct, found
+
+
+def run_path(mode: str, config: str, fixtures: list[dict]) -> dict:
+    language.ANSWER_LANGUAGE_MODE = mode
+    registry._registry = CollectionRegistry.from_yaml(config)
+    vector_store = registry.get_registry().default_store()
+
+    seconds = []
+    calls = []
+    cited = correct = expected = found = arabic = out_of_scope = errors = 0
+    for fixture in fixtures:
+        before = llm_requests()
+        start = time.perf_counter()
+        try:
+            result = run_turn(fixture["question"], "Arabic", [], vector_store)
+        except Exception as e:
+            print(f"Error on {fixture['question']!r}: {e}")
+            errors += 1
+            continue
+        seconds.append(time.perf_counter() - start)
+        calls.append(llm_requests() - before)
+        if not result["in_scope"]:
+            out_of_scope += 1
+        arabic += not language.needs_translation(result["answer"], "Arabic")
+        hits, matched = citation_scores(result["citations"], fixture["expected"])
+        cited += len(result["citations"])
+        correct += hits
+        expected += len(fixture["expected"])
+        found += matched
+
+    answered = len(seconds)
+    return {
+        "mode": mode,
+        "config": config,
+        "questions": len(fixtures),
+        "errors": errors,
+        "out_of_scope": out_of_scope,
+        "latency_mean_s": sum(seconds) / answered if answered else None,
+        "latency_p50_s": percentile(seconds, 0.5) if answered else None,
+        "latency_p95_s": percentile(seconds, 0.95) if answered else None,
+        "llm_calls_per_turn": sum(calls) / answered if answered else None,
+        "answered_in_arabic": arabic / answered if answered else None,
+        "citation_precision": correct / cited if cited else None,
+        "citation_recall": found / expected if expected else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the translation and direct paths for Arabic questions")
+    parser.add_argument("--translate-config", default=COLLECTIONS_CONFIG, help="Collections of the translate path")
+    parser.add_argument("--direct-config", default=COLLECTIONS_CONFIG, help="Collections of the direct path")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    fixtures = [json.loads(line) for line in FIXTURES.read_text(encoding="utf-8").splitlines() if line.strip()]
+    response_cache.enabled = False
+    semantic_cache.enabled = False
+
+    report = {
+        "translate": run_path("translate", args.translate_config, fixtures),
+        "direct": run_path("direct", args.direct_config, fixtures),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Accuracy / latency of the local reference parser vs the LLM extractor
+#   python -m bench.reference_parser [--llm]
+
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+from src.references import parse_references
+
+FIXTURES = Path(__file__).absolute().parent / "fixtures" / "reference_questions.jsonl"
+
+
+def canonical(result: dict) -> dict:
+    """
+    Order-insensitive form of an extraction result ({article: sorted paragraphs}).
+    """
+    articles = {}
+    for record in result.get("articles", []):
+        articles.setdefault(int(record["article"]), set()).update(int(p) for p in record["paragraphs"])
+    return {article: sorted(paragraphs) for article, paragraphs in sorted(articles.items())}
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(round(q * (len(values) - 1))), len(values) - 1)]
+
+
+def run(with_llm: bool, repeat: int, min_confidence: float) -> dict:
+    fixtures = [json.loads(line) for line in FIXTURES.read_text().splitlines() if line.strip()]
+    parser_correct = 0
+    confident = 0
+    confident_correct = 0
+    parser_times = []
+    failures = []
+
+    llm_correct = 0
+    hybrid_correct = 0
+    llm_times = []
+
+    for fixture in fixtures:
+        expected = canonical(fixture["expected"])
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result, confidence = parse_references(fixture["question"])
+            timings.append(time.perf_counter() - start)
+        parser_times.append(statistics.median(timings))
+
+        correct = canonical(result) == expected
+        parser_correct += correct
+        is_confident = confidence >= min_confidence
+        confident += is_confident
+        confident_correct += correct and is_confident
+        if not correct:
+            failures.append({"question": fixture["question"], "expected": expected,
+                             "parsed": canonical(result), "confidence": confidence})
+
+        if with_llm:
+            from src.extraction import extract_articles_and_paragraphs
+            start = time.perf_counter()
+            llm_result = extract_articles_and_paragraphs.__wrapped__(fixture["question"])
+            llm_times.append(time.perf_counter() - start)
+            llm_ok = canonical(llm_result) == expected
+            llm_correct += llm_ok
+            hybrid_correct += correct if is_confident else llm_ok
+
+    total = len(fixtures)
+    report = {
+        "fixtures": total,
+        "min_confidence": min_confidence,
+        "parser": {
+            "accuracy": parser_correct / total,
+            "confident_fraction": confident / total,
+            "accuracy_when_confident": confident_correct / confident if confident else None,
+            "p50_us": percentile(parser_times, 0.5) * 1e6,
+            "p95_us": percentile(parser_times, 0.95) * 1e6,
+            "max_us": max(parser_times) * 1e6,
+        },
+        "failures": failures,
+    }
+    if with_llm:
+        report["llm"] = {
+            "accuracy": llm_correct / total,
+            "p50_s": percentile(llm_times, 0.5),
+            "p95_s": percentile(llm_times, 0.95),
+        }
+        report["hybrid"] = {
+            "accuracy": hybrid_correct / total,
+            "llm_calls": total - confident,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the local reference parser with the LLM extractor")
+    parser.add_argument("--llm", action="store_true", help="Also run the LLM extractor for comparison")
+    parser.add_argument("--repeat", type=int, default=200, help="Parser runs per question (median is reported)")
+    parser.add_argument("--min-confidence", type=float, default=0.8)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args.llm, args.repeat, args.min_confidence)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
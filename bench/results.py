@@ -0,0 +1,126 @@
+# Benchmark results as JSON, tagged with their commit, and their comparison
+#   python -m bench.results old.json new.json --threshold 10
+
+import json
+import time
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def latency_report(seconds: list[float]) -> dict:
+    """
+    Mean and percentiles of a list of durations, in milliseconds.
+    """
+    if not seconds:
+        return {"count": 0}
+    millis = [s * 1e3 for s in seconds]
+    return {
+        "count": len(millis),
+        "mean_ms": sum(millis) / len(millis),
+        "p50_ms": percentile(millis, 0.5),
+        "p95_ms": percentile(millis, 0.95),
+        "p99_ms": percentile(millis, 0.99),
+        "max_ms": max(millis),
+    }
+
+
+def git_commit() -> tuple[str, bool]:
+    """
+    The current commit and whether the working tree has uncommitted changes.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def write_results(benchmark: str, config: dict, results: dict, output: str = None) -> dict:
+    """
+    Print a benchmark's results and write them to `output` as JSON.
+
+    Args:
+        benchmark (str): Name of the benchmark.
+        config (dict): Parameters of the run (what has to match for two runs to be comparable).
+        results (dict): The measurements.
+        output (str, optional): JSON file to write.
+
+    Returns:
+        dict: The report.
+    """
+    commit, dirty = git_commit()
+    report = {
+        "benchmark": benchmark,
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": config,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        Path(output).write_text(text)
+    return report
+
+
+def _numbers(value, prefix: str = "") -> dict:
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, (int, float)):
+        return {prefix: value}
+    if isinstance(value, dict):
+        numbers = {}
+        for key, item in value.items():
+            numbers.update(_numbers(item, f"{prefix}.{key}" if prefix else str(key)))
+        return numbers
+    return {}
+
+
+def compare(old: dict, new: dict) -> list[tuple[str, float, float, float]]:
+    """
+    Relative change of every number present in both reports' results.
+
+    Returns:
+        list[tuple[str, float, float, float]]: (path, old, new, % change), in path order.
+    """
+    old_numbers = _numbers(old["results"])
+    new_numbers = _numbers(new["results"])
+    changes = []
+    for path in sorted(old_numbers.keys() & new_numbers.keys()):
+        before, after = old_numbers[path], new_numbers[path]
+        change = (after - before) / abs(before) * 100 if before else 0.0
+        changes.append((path, before, after, change))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old", help="Baseline results JSON")
+    parser.add_argument("new", help="Results JSON to compare")
+    parser.add_argument("--threshold", type=float, default=0.0, help="Only show changes above this %%")
+    args = parser.parse_args()
+
+    old = json.loads(Path(args.old).read_text())
+    new = json.loads(Path(args.new).read_text())
+    if old["config"] != new["config"]:
+        print(f"Warning: configs differ\n  old: {old['config']}\n  new: {new['config']}")
+    print(f"{old['benchmark']}: {old['commit']} -> {new['commit']}")
+    for path, before, after, change in compare(old, new):
+        if abs(change) >= args.threshold:
+            print(f"{path:60} {before:>14.4f} {after:>14.4f} {change:>+8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Latency and recall@k of the in-memory NumPy backend (src/memory_store.py) against Chroma
+#   python -m bench.retrieval_benchmark --k 10 --repeat 50 --output retrieval.json
+
+import json
+import time
+import argparse
+from pathlib import Path
+from src.q_and_a import vector_db
+from src.memory_store import InMemoryVectorStore
+
+FIXTURES = Path(__file__).absolute().parent / "fixtures"
+
+
+def load_questions() -> list[str]:
+    questions = []
+    for name in ("reference_questions.jsonl", "scope_questions.jsonl"):
+        for line in (FIXTURES / name).read_text().splitlines():
+            if line.strip():
+                questions.append(json.loads(line)["question"])
+    return list(dict.fromkeys(questions))
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def latency_report(seconds: list[float]) -> dict:
+    micros = [s * 1e6 for s in seconds]
+    return {
+        "mean_us": sum(micros) / len(micros),
+        "p50_us": percentile(micros, 0.5),
+        "p95_us": percentile(micros, 0.95),
+        "p99_us": percentile(micros, 0.99),
+    }
+
+
+def timed_search(store, embeddings: list[list[float]], k: int, repeat: int):
+    seconds = []
+    results = []
+    for embedding in embeddings:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            documents = store.similarity_search_by_vector(embedding, k=k)
+            seconds.append(time.perf_counter() - start)
+        results.append([document.id for document in documents])
+    return seconds, results
+
+
+def recall_at_k(results: list[list[str]], exact: list[list[str]]) -> float:
+    found = sum(len(set(result) & set(truth)) for result, truth in zip(results, exact))
+    total = sum(len(truth) for truth in exact)
+    return found / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the in-memory retrieval backend with Chroma")
+    parser.add_argument("--k", type=int, default=5, help="Number of chunks to retrieve")
+    parser.add_argument("--repeat", type=int, default=200, help="Searches per question")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    chroma = vector_db()
+    if isinstance(chroma, InMemoryVectorStore):
+        raise SystemExit("Unset RETRIEVAL_BACKEND=memory to benchmark against Chroma")
+
+    start = time.perf_counter()
+    memory = InMemoryVectorStore.from_chroma(chroma)
+    load_seconds = time.perf_counter() - start
+
+    questions = load_questions()
+    embeddings = chroma.embeddings.embed_documents(questions)
+
+    chroma_seconds, chroma_results = timed_search(chroma, embeddings, args.k, args.repeat)
+    memory_seconds, memory_results = timed_search(memory, embeddings, args.k, args.repeat)
+
+    report = {
+        "chunks": len(memory),
+        "dimensions": int(memory.matrix.shape[1]),
+        "questions": len(questions),
+        "k": args.k,
+        "snapshot_load_ms": load_seconds * 1000,
+        "chroma": {**latency_report(chroma_seconds), "recall_at_k": recall_at_k(chroma_results, memory_results)},
+        "memory": {**latency_report(memory_seconds), "recall_at_k": 1.0},
+    }
+    report["speedup_p50"] = report["chroma"]["p50_us"] / report["memory"]["p50_us"]
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+
+
+if __name__ == "__main__":
+    main()
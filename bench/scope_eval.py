@@ -0,0 +1,104 @@
+# Offline evaluation of the local scope classifier (src/scope.py)
+#   python -m bench.scope_eval [--llm] [--sweep]
+
+import json
+import time
+import argparse
+from pathlib import Path
+from src.q_and_a import vector_db
+from src.registry import get_registry
+from src.scope import ScopeClassifier, SCOPE_IN_THRESHOLD, SCOPE_OUT_THRESHOLD
+
+FIXTURES = Path(__file__).absolute().parent / "fixtures" / "scope_questions.jsonl"
+
+
+def precision_recall(pairs: list[tuple[bool, bool]]) -> dict:
+    """
+    Precision / recall of the in-scope class over (predicted, expected) pairs.
+    """
+    true_positive = sum(1 for predicted, expected in pairs if predicted and expected)
+    false_positive = sum(1 for predicted, expected in pairs if predicted and not expected)
+    false_negative = sum(1 for predicted, expected in pairs if not predicted and expected)
+    correct = sum(1 for predicted, expected in pairs if predicted == expected)
+    return {
+        "n": len(pairs),
+        "accuracy": correct / len(pairs) if pairs else None,
+        "precision": true_positive / (true_positive + false_positive) if true_positive + false_positive else None,
+        "recall": true_positive / (true_positive + false_negative) if true_positive + false_negative else None,
+    }
+
+
+def evaluate(classifier: ScopeClassifier, fixtures: list[dict], scores: list[dict], llm_labels=None) -> dict:
+    local_pairs = []
+    tiered_pairs = []
+    deferred = 0
+    for index, (fixture, score) in enumerate(zip(fixtures, scores)):
+        if score.get("reference"):
+            decision = True
+        elif score.get("non_english"):
+            decision = None
+        else:
+            decision = classifier.decide(score["margin"])
+        if decision is None:
+            deferred += 1
+            if llm_labels is not None:
+                tiered_pairs.append((llm_labels[index], fixture["in_scope"]))
+            continue
+        local_pairs.append((decision, fixture["in_scope"]))
+        tiered_pairs.append((decision, fixture["in_scope"]))
+    report = {
+        "in_threshold": classifier.in_threshold,
+        "out_threshold": classifier.out_threshold,
+        "local": precision_recall(local_pairs),
+        "llm_calls": deferred,
+        "llm_call_reduction": 1 - deferred / len(fixtures),
+    }
+    if llm_labels is not None:
+        report["tiered"] = precision_recall(tiered_pairs)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local scope classifier")
+    parser.add_argument("--llm", action="store_true", help="Resolve the uncertain band with the LLM classifier")
+    parser.add_argument("--sweep", action="store_true", help="Report metrics over a grid of thresholds")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    fixtures = [json.loads(line) for line in FIXTURES.read_text().splitlines() if line.strip()]
+    classifier = ScopeClassifier(vector_db(), multilingual=get_registry().multilingual)
+
+    scores = []
+    local_times = []
+    for fixture in fixtures:
+        start = time.perf_counter()
+        _, score = classifier.classify(fixture["question"])
+        local_times.append(time.perf_counter() - start)
+        scores.append(score)
+
+    llm_labels = None
+    if args.llm:
+        from src.extraction import extract_qa_scope
+        llm_labels = [extract_qa_scope(fixture["question"]) for fixture in fixtures]
+
+    report = evaluate(classifier, fixtures, scores, llm_labels)
+    report["local_ms_mean"] = sum(local_times) / len(local_times) * 1000
+    if llm_labels is not None:
+        report["llm_only"] = precision_recall(list(zip(llm_labels, (f["in_scope"] for f in fixtures))))
+
+    if args.sweep:
+        report["sweep"] = []
+        for in_threshold in (0.0, 0.04, 0.08, 0.12, 0.16, 0.2):
+            for out_threshold in (0.0, -0.04, -0.08, -0.12, -0.16):
+                classifier.in_threshold, classifier.out_threshold = in_threshold, out_threshold
+                report["sweep"].append(evaluate(classifier, fixtures, scores, llm_labels))
+        classifier.in_threshold, classifier.out_threshold = SCOPE_IN_THRESHOLD, SCOPE_OUT_THRESHOLD
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+
+
+if __name__ == "__main__":
+    main()
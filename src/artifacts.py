@@ -0,0 +1,318 @@
+# Precomputed per-paragraph artifacts (Arabic version, optional summary), built offline:
+#   python -m src.artifacts --concurrency 8 [--summaries]
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import argparse
+import threading
+from pathlib import Path
+from .functions import paragraph_summary_format
+from .llm import DEFAULT_MODEL, prompts, create_response, acreate_response
+from .context import measure_prompt, citation_label
+from .cache import response_cache
+from .corpus import Corpus, reference_key
+from .language import aenglish_to_arabic_translation, ARABIC_SCRIPT
+from .registry import DEFAULT_LANGUAGE, get_registry
+from .startup import lazy_import
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_PATH = os.getenv("ARTIFACTS_PATH", "./chunk_artifacts.sqlite3")
+ARTIFACTS_ENABLED = os.getenv("ARTIFACTS_ENABLED", "1") == "1"
+
+ARABIC_LANGUAGE = "Arabic"
+
+
+def canonical_text(text: str) -> str:
+    """
+    A chunk's text as it is rendered in the prompt (see `context.render_chunk`): whitespace
+    collapsed, line breaks from the PDF extraction removed.
+    """
+    return " ".join(text.split())
+
+
+def _text_hash(*texts: str) -> str:
+    return hashlib.sha256("\x1f".join(texts).encode("utf-8")).hexdigest()[:16]
+
+
+class ChunkArtifacts:
+    """
+    The artifacts file: read into memory on first lookup, and read again whenever the file
+    changes (e.g. a build finished after the app started), written by the build step.
+
+    Args:
+        path (str): SQLite file.
+    """
+
+    def __init__(self, path: str = ARTIFACTS_PATH):
+        self.path = path
+        self.connection = None
+        self.rows = None
+        self.loaded_mtime = None
+        self.lock = threading.Lock()
+        self.counters = {"lookups": 0, "hits": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self.connection is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                "regulation TEXT, article INTEGER, paragraph TEXT, source_hash TEXT, text TEXT, "
+                "arabic TEXT, arabic_source TEXT, summary TEXT, built REAL, "
+                "PRIMARY KEY (regulation, article, paragraph)) WITHOUT ROWID"
+            )
+        return self.connection
+
+    def _load(self) -> dict:
+        # Called with the lock held. A missing file means no artifacts (yet), not an error
+        try:
+            mtime = Path(self.path).stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if self.rows is None or mtime != self.loaded_mtime:
+            rows = {}
+            cursor = self._db().execute("SELECT * FROM artifacts")
+            names = [column[0] for column in cursor.description]
+            for row in cursor:
+                row = dict(zip(names, row))
+                rows[(row["regulation"], *reference_key(row["article"], row["paragraph"]))] = row
+            self.rows, self.loaded_mtime = rows, mtime
+        return self.rows
+
+    def lookup(self, regulation: str, article, paragraph) -> dict | None:
+        """
+        The artifacts of a paragraph.
+
+        Args:
+            regulation (str): Regulation key in the collections config.
+            article: Article number.
+            paragraph: Paragraph number.
+
+        Returns:
+            dict | None: "text", "arabic", "arabic_source" ("official" or "translated") and
+                "summary", or None when the paragraph has not been built.
+        """
+        try:
+            key = (regulation, *reference_key(article, paragraph))
+        except (TypeError, ValueError):
+            return None
+        with self.lock:
+            row = self._load().get(key)
+            self.counters["lookups"] += 1
+            self.counters["hits"] += row is not None
+        return row
+
+    def built(self, regulation: str) -> dict:
+        """
+        (article, paragraph) -> row, for every built paragraph of a regulation.
+        """
+        with self.lock:
+            return {key[1:]: row for key, row in self._load().items() if key[0] == regulation}
+
+    def write(self, rows: list[dict], stale: list[tuple] = ()):
+        """
+        Insert or replace built rows and delete the rows of paragraphs that no longer exist.
+
+        Args:
+            rows (list[dict]): Rows with every column of the table.
+            stale (list[tuple]): (regulation, article, paragraph) keys to delete.
+        """
+        with self.lock:
+            db = self._db()
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT OR REPLACE INTO artifacts VALUES (:regulation, :article, :paragraph, :source_hash, :text, "
+                ":arabic, :arabic_source, :summary, :built)", rows)
+            db.executemany("DELETE FROM artifacts WHERE regulation = ? AND article = ? AND paragraph = ?", stale)
+            db.execute("COMMIT")
+            self.rows = None
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.counters)
+            stats["paragraphs"] = len(self._load())
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+
+artifacts = ChunkArtifacts()
+
+
+def localized_paragraph(citation: dict, language: str) -> dict | None:
+    """
+    The Arabic version of a cited paragraph, shown under an English excerpt to Arabic users.
+
+    Args:
+        citation (dict): {"article", "paragraph", "text"} citation, with the "regulation" (display
+            name) set by `verify_citations`, if any.
+        language (str): The user's language.
+
+    Returns:
+        dict | None: {"text", "source"} ("official" or "translated"), or None when the excerpt
+            needs no Arabic version or the paragraph has not been built.
+    """
+    if language != ARABIC_LANGUAGE or not ARTIFACTS_ENABLED or ARABIC_SCRIPT.search(citation["text"]):
+        return None
+    registry = get_registry()
+    regulation = registry.by_name.get(citation.get("regulation"), registry.default)
+    row = artifacts.lookup(regulation.key, citation["article"], citation["paragraph"])
+    if row is None or not row["arabic"]:
+        return None
+    return {"text": row["arabic"], "source": row["arabic_source"]}
+
+
+def _paragraph_summary_request(label: str, paragraph: str) -> dict:
+    system_prompt = prompts["prompts"]["paragraph_summary"]["system_prompt"]
+    user_prompt = prompts["prompts"]["paragraph_summary"]["user_prompt"]
+
+    # Replace user_prompt placeholders for: label, paragraph
+    user_prompt = user_prompt.replace("{{ label }}", label)
+    user_prompt = user_prompt.replace("{{ paragraph }}", paragraph)
+    measure_prompt("paragraph_summary", system=system_prompt, user=user_prompt)
+
+    return dict(
+        model=DEFAULT_MODEL,
+        input=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+                ],
+        text = paragraph_summary_format
+    )
+
+
+@response_cache.memoize("paragraph_summary")
+def summarize_paragraph(label: str, paragraph: str) -> str:
+    """
+    Summarize a paragraph of the regulation in one sentence.
+
+    Args:
+        label (str): Its citation label (e.g. "Article 5, Paragraph 2").
+        paragraph (str): Its text.
+
+    Returns:
+        str: The summary.
+    """
+    response = create_response(**_paragraph_summary_request(label, paragraph))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict["summary"]
+
+
+@response_cache.memoize("paragraph_summary")
+async def asummarize_paragraph(label: str, paragraph: str) -> str:
+    """
+    Async version of `summarize_paragraph`.
+    """
+    response = await acreate_response(**_paragraph_summary_request(label, paragraph))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict["summary"]
+
+
+def _collection_corpus(collection: str) -> Corpus:
+    # Read the collection straight from Chroma: building artifacts needs no embedding model
+    chromadb = lazy_import("chromadb")
+    client = chromadb.PersistentClient(path=get_registry().persist_directory)
+    return Corpus.from_collection(client.get_collection(collection))
+
+
+async def _build_row(regulation: str, key: tuple, text: str, official: str, summaries: bool,
+                     semaphore: asyncio.Semaphore) -> dict:
+    article, paragraph = key
+    async with semaphore:
+        if official:
+            arabic, arabic_source = official, "official"
+        else:
+            arabic = (await aenglish_to_arabic_translation(text))["translation"]
+            arabic_source = "translated"
+        summary = await asummarize_paragraph(citation_label(article, paragraph), text) if summaries else ""
+    return {
+        "regulation": regulation, "article": article, "paragraph": paragraph,
+        "source_hash": _text_hash(text, official), "text": text,
+        "arabic": arabic, "arabic_source": arabic_source, "summary": summary, "built": time.time(),
+    }
+
+
+async def build_artifacts(regulation_keys: list[str] = None, concurrency: int = 8, summaries: bool = False,
+                          store: ChunkArtifacts = artifacts) -> dict:
+    """
+    Build the artifacts of every paragraph of the given regulations, skipping paragraphs
+    whose text has not changed since the last build.
+
+    Args:
+        regulation_keys (list[str], optional): Regulations to build (default: all configured).
+        concurrency (int): Maximum LLM calls in flight.
+        summaries (bool): Whether to generate the summaries (one LLM call per paragraph).
+        store (ChunkArtifacts): The artifacts file.
+
+    Returns:
+        dict: Counts per regulation (paragraphs, built, unchanged, deleted, translated, failed)
+            and the elapsed seconds.
+    """
+    registry = get_registry()
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    report = {}
+    for key in regulation_keys or list(registry.regulations):
+        regulation = registry.regulations[key]
+        corpus = _collection_corpus(regulation.collections[DEFAULT_LANGUAGE])
+        official = {}
+        if ARABIC_LANGUAGE in regulation.collections:
+            arabic_corpus = _collection_corpus(regulation.collections[ARABIC_LANGUAGE])
+            official = {ref: canonical_text(arabic_corpus.documents[indexes[0]])
+                        for ref, indexes in arabic_corpus.by_reference.items()}
+
+        paragraphs = {ref: canonical_text(corpus.documents[indexes[0]]) for ref, indexes in corpus.by_reference.items()}
+        built = store.built(key)
+        todo = [ref for ref, text in paragraphs.items()
+                if ref not in built or built[ref]["source_hash"] != _text_hash(text, official.get(ref, ""))
+                or (summaries and not built[ref]["summary"])]
+        stale = [(key, *ref) for ref in built if ref not in paragraphs]
+
+        results = await asyncio.gather(*(
+            _build_row(key, ref, paragraphs[ref], official.get(ref, ""), summaries, semaphore) for ref in todo
+        ), return_exceptions=True)
+        rows = [row for row in results if isinstance(row, dict)]
+        for ref, result in zip(todo, results):
+            if isinstance(result, Exception):
+                logger.warning("Artifacts of %s %s failed: %s", key, citation_label(*ref), result)
+        store.write(rows, stale)
+        report[key] = {
+            "paragraphs": len(paragraphs),
+            "built": len(rows),
+            "unchanged": len(paragraphs) - len(todo),
+            "deleted": len(stale),
+            "translated": sum(row["arabic_source"] == "translated" for row in rows),
+            "failed": len(todo) - len(rows),
+        }
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the Arabic version of every paragraph")
+    parser.add_argument("--regulation", nargs="+", default=None, help="Regulation keys (default: all configured)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum LLM calls in flight")
+    parser.add_argument("--summaries", action="store_true", help="Also build one-sentence summaries")
+    parser.add_argument("--path", default=ARTIFACTS_PATH, help="Artifacts SQLite file")
+    args = parser.parse_args()
+
+    report = asyncio.run(build_artifacts(args.regulation, args.concurrency, args.summaries,
+                                         ChunkArtifacts(args.path)))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
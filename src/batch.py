@@ -0,0 +1,234 @@
+# Batch compliance queries over a JSONL file, resumable after an interruption
+#   python -m src.batch questions.jsonl answers.jsonl --concurrency 8
+
+import os
+import json
+import logging
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from .cache import normalize_question
+from .chat import OUT_OF_SCOPE_MESSAGE, format_message, acheck_scope
+from .citations import verify_citations
+from .language import (aarabic_to_english_translation, aenglish_to_arabic_translation, answers_directly,
+                       answer_language, needs_translation)
+from .q_and_a import aget_relevant_context
+from .semantic_cache import acached_query_response
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+
+def parse_requests(lines) -> list[dict]:
+    """
+    Parse JSONL batch input.
+
+    Args:
+        lines: Iterable of JSONL lines.
+
+    Returns:
+        list[dict]: Requests with "id", "question" and "language".
+    """
+    requests = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        requests.append({
+            "id": str(record.get("id", number)),
+            "question": record["question"],
+            "language": record.get("language", "English"),
+        })
+    return requests
+
+
+def _answered_records(output_path) -> dict:
+    # id -> JSONL line of the answered (error-free) records of an earlier run
+    path = Path(output_path)
+    if not path.exists():
+        return {}
+    answered = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # Partial last line of a crashed run
+            continue
+        if "error" not in record:
+            answered.setdefault(record["id"], line)
+    return answered
+
+
+def completed_ids(output_path) -> set:
+    """
+    Ids already answered (without error) in an output file from an earlier run.
+    """
+    return set(_answered_records(output_path))
+
+
+def compact_output(output_path) -> set:
+    """
+    Rewrite an output file from an earlier run with only its answered records (one per id),
+    dropping error records and partial lines so that retried requests are not listed twice.
+
+    Args:
+        output_path: JSONL output of an earlier run.
+
+    Returns:
+        set: The ids already answered.
+    """
+    path = Path(output_path)
+    answered = _answered_records(path)
+    if path.exists():
+        temporary = path.with_name(path.name + ".tmp")
+        temporary.write_text("".join(line + "\n" for line in answered.values()), encoding="utf-8")
+        os.replace(temporary, path)
+    return set(answered)
+
+
+def group_requests(requests: list[dict]) -> dict:
+    """
+    Group requests asking the same question (after normalization) in the same language.
+
+    Returns:
+        dict: (language, normalized question) -> requests, in input order.
+    """
+    groups = {}
+    for request in requests:
+        key = (request["language"], normalize_question(request["question"]))
+        groups.setdefault(key, []).append(request)
+    return groups
+
+
+async def _english(question: str, language: str, semaphore: asyncio.Semaphore) -> str:
+    if language != "Arabic" or answers_directly(language):
+        return question
+    async with semaphore:
+        return (await aarabic_to_english_translation(question))["translation"]
+
+
+async def _answer(question: str, language: str, embedding, vector_store, semaphore: asyncio.Semaphore) -> dict:
+    async with semaphore:
+        if not await acheck_scope(question, vector_store, embedding):
+            return {"in_scope": False, "answer": OUT_OF_SCOPE_MESSAGE, "citations": [], "message": OUT_OF_SCOPE_MESSAGE}
+        relevant_context = await aget_relevant_context(question, vector_store, embedding, language)
+        response = await acached_query_response(question, [], relevant_context, embedding, vector_store,
+                                                answer_language(language), question)
+        answer = response["answer"]
+        if needs_translation(answer, language):
+            answer = (await aenglish_to_arabic_translation(answer))["translation"]
+        citations = await asyncio.to_thread(verify_citations, response["citations"], relevant_context, vector_store)
+        return {
+            "in_scope": True,
+            "answer": answer,
+            "citations": citations,
+            "message": format_message(answer, citations, language),
+        }
+
+
+async def run_batch(requests: list[dict], vector_store, concurrency: int = BATCH_CONCURRENCY):
+    """
+    Answer many questions with bounded concurrency.
+
+    Args:
+        requests (list[dict]): Requests from `parse_requests`.
+        vector_store: The vector store used for retrieval.
+        concurrency (int): Maximum number of questions in flight.
+
+    Yields:
+        dict: One result per request ("id", "question", "language" and the answer fields, or
+            "error"), in completion order.
+
+    Raises:
+        ValueError: If `concurrency` is less than 1.
+    """
+    if concurrency < 1:
+        # A zero-sized semaphore would never let a question through
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+    groups = list(group_requests(requests).values())
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Translate what needs translating, then embed every question in one batched call
+    questions = await asyncio.gather(*(
+        _english(group[0]["question"], group[0]["language"], semaphore) for group in groups
+    ), return_exceptions=True)
+    english = [question for question in questions if isinstance(question, str)]
+    embeddings = iter(await asyncio.to_thread(vector_store.embeddings.embed_documents, english)
+                      if english else [])
+    embedded = [next(embeddings) if isinstance(question, str) else None for question in questions]
+
+    async def answer(group, question, embedding):
+        if isinstance(question, BaseException):
+            return group, question
+        try:
+            return group, await _answer(question, group[0]["language"], embedding, vector_store, semaphore)
+        except Exception as e:
+            return group, e
+
+    for task in asyncio.as_completed([answer(*args) for args in zip(groups, questions, embedded)]):
+        group, result = await task
+        for request in group:
+            if isinstance(result, BaseException):
+                yield {**request, "error": str(result)}
+            else:
+                yield {**request, **result}
+
+
+async def run_batch_file(input_path, output_path, vector_store, concurrency: int = BATCH_CONCURRENCY) -> dict:
+    """
+    Answer a JSONL file of questions, appending results to `output_path` as they complete.
+    Requests already answered in `output_path` are skipped; its error records are removed
+    and their requests retried.
+
+    Args:
+        input_path: JSONL input.
+        output_path: JSONL output (appended to).
+        vector_store: The vector store used for retrieval.
+        concurrency (int): Maximum number of questions in flight.
+
+    Returns:
+        dict: Run report (counts and throughput).
+    """
+    requests = parse_requests(Path(input_path).read_text(encoding="utf-8").splitlines())
+    done = compact_output(output_path)
+    pending = [request for request in requests if request["id"] not in done]
+
+    started = time.perf_counter()
+    answered = 0
+    errors = 0
+    with open(output_path, "a", encoding="utf-8") as output:
+        async for result in run_batch(pending, vector_store, concurrency):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            if "error" in result:
+                errors += 1
+            else:
+                answered += 1
+    seconds = time.perf_counter() - started
+    return {
+        "requests": len(requests),
+        "resumed": len(requests) - len(pending),
+        "unique_questions": len(group_requests(pending)),
+        "answered": answered,
+        "errors": errors,
+        "seconds": seconds,
+        "questions_per_second": len(pending) / seconds if seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of compliance questions")
+    parser.add_argument("input", help="JSONL file with one {\"id\", \"question\", \"language\"} object per line")
+    parser.add_argument("output", help="JSONL file the results are appended to (resumes an earlier run)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Questions in flight")
+    args = parser.parse_args()
+
+    from .q_and_a import vector_db
+    report = asyncio.run(run_batch_file(args.input, args.output, vector_db(), args.concurrency))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
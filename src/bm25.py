@@ -0,0 +1,172 @@
+# Okapi BM25 over the regulation chunks, plus reciprocal rank fusion with the vector results
+
+import os
+import re
+import math
+import threading
+from .corpus import load_corpus
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+a an and are as at be been by can do does for from has have how i if in into is it its may
+must my of on or shall should such that the their them there these this those to under upon
+was were what when where which who will with without would you your
+""".split())
+
+
+def _stem(token: str) -> str:
+    # Light plural folding so "controllers" matches "controller" and "entities" matches "entity"
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased, stopword-free, plural-folded word tokens.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list[str]: The tokens.
+    """
+    return [_stem(token) for token in TOKEN_PATTERN.findall(text.casefold()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted BM25 index over a list of texts.
+
+    Args:
+        texts (list[str]): The documents, addressed by their position.
+        k1 (float): Term-frequency saturation.
+        b (float): Length normalization.
+    """
+
+    def __init__(self, texts: list[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.lengths = []
+        self.postings = {}
+        for index, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                self.postings.setdefault(token, []).append((index, count))
+        n = len(texts)
+        self.average_length = sum(self.lengths) / n if n else 0.0
+        self.idf = {
+            token: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self.postings.items()
+        }
+        # Per-document length normalization, precomputed for the scoring loop
+        self.norms = [
+            k1 * (1 - b + b * length / self.average_length) if self.average_length else k1
+            for length in self.lengths
+        ]
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def search(self, query: str, k: int = 10) -> list[tuple[int, float]]:
+        """
+        Top-k documents for a query.
+
+        Args:
+            query (str): The query text.
+            k (int): Number of results.
+
+        Returns:
+            list[tuple[int, float]]: (document index, score), best first.
+        """
+        scores = {}
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = self.idf[token]
+            for index, count in postings:
+                scores[index] = scores.get(index, 0.0) + idf * count * (self.k1 + 1) / (count + self.norms[index])
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+# id(corpus) -> (corpus, BM25Index), holding the corpus so its id cannot be reused (see `_corpora`)
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_bm25_index(vector_store) -> BM25Index:
+    """
+    The BM25 index of a vector store's collection, built once from its corpus snapshot.
+
+    Args:
+        vector_store: The vector store.
+
+    Returns:
+        BM25Index: The shared index (document positions match `load_corpus(vector_store)`).
+    """
+    corpus = load_corpus(vector_store)
+    key = id(corpus)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = (corpus, BM25Index(corpus.documents))
+        return _indexes[key][1]
+
+
+def invalidate_bm25_index(corpus):
+    """
+    Drop the BM25 index built from a corpus snapshot (see `invalidate_corpus`).
+    """
+    with _indexes_lock:
+        _indexes.pop(id(corpus), None)
+
+
+def lexical_search(question_summary: str, vector_store, k: int = 10) -> list[dict]:
+    """
+    Run a BM25 search over the collection's chunks.
+
+    Args:
+        question_summary (str): The input question summary (with conversation history).
+        vector_store: The vector store holding the chunks.
+        k (int): Number of chunks to return.
+
+    Returns:
+        list[dict]: The matching chunks with their article and paragraph numbers, best first.
+    """
+    corpus = load_corpus(vector_store)
+    return [corpus.chunk(index) for index, _ in get_bm25_index(vector_store).search(question_summary, k)]
+
+
+def reciprocal_rank_fusion(rankings: list[list], key=None, k: int = RRF_K) -> list:
+    """
+    Merge ranked lists with reciprocal rank fusion: score(d) = sum over lists of 1 / (k + rank).
+
+    Args:
+        rankings (list[list]): Ranked lists, best first.
+        key (callable, optional): Identity of an item, used to merge duplicates across lists.
+        k (int): Rank smoothing constant.
+
+    Returns:
+        list: The unique items, best fused score first (first occurrence wins on ties).
+    """
+    key = key or (lambda item: item)
+    scores = {}
+    items = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            identity = key(item)
+            scores[identity] = scores.get(identity, 0.0) + 1.0 / (k + rank)
+            items.setdefault(identity, item)
+    order = sorted(scores, key=lambda identity: -scores[identity])
+    return [items[identity] for identity in order]
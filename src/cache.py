@@ -0,0 +1,340 @@
+# Two-tier (in-memory LRU + SQLite) cache for deterministic LLM calls
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import inspect
+import threading
+import functools
+import unicodedata
+import yaml
+from pathlib import Path
+from collections import OrderedDict
+from .llm import DEFAULT_MODEL, prompts
+from . import tracing
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.sqlite3")
+# Entries older than the TTL (seconds) are treated as misses and purged
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024"))
+LLM_CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "100000"))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for cache keys: Unicode NFKC and collapsed whitespace.
+
+    Args:
+        text (str): The input text.
+
+    Returns:
+        str: The normalized text.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normalize a question for cache keys. Like `normalize_text`, but also case-insensitive,
+    which is safe for classification-style prompts whose output does not echo the input.
+
+    Args:
+        text (str): The input question.
+
+    Returns:
+        str: The normalized question.
+    """
+    return normalize_text(text).casefold()
+
+
+@functools.lru_cache(maxsize=None)
+def prompt_version(prompt_name: str) -> str:
+    """
+    Hash of a prompts.yml entry, so that editing a prompt invalidates its cached responses.
+
+    Args:
+        prompt_name (str): Key under `prompts` in prompts.yml.
+
+    Returns:
+        str: A short hex digest.
+    """
+    entry = prompts["prompts"][prompt_name]
+    return hashlib.sha256(yaml.safe_dump(entry, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    """
+    LRU cache in memory backed by a SQLite file, with TTL and size-based eviction.
+
+    Args:
+        path (str): SQLite file of the persistent tier.
+        ttl_seconds (float): Time to live of an entry.
+        max_memory_entries (int): Size of the in-memory LRU tier.
+        max_disk_entries (int): Size of the SQLite tier; least recently used entries are evicted.
+        enabled (bool): When False every lookup is a miss and nothing is stored.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_memory_entries: int, max_disk_entries: int,
+                 enabled: bool = True):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.enabled = enabled
+        self.memory = OrderedDict()
+        # The LRU tier and the counters are guarded by `lock`, the SQLite tier by `db_lock`, so
+        # memory hits never wait on disk I/O (the async wrappers run the disk tier in a thread)
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.connection = None
+        self.writes_since_eviction = 0
+        self.counters = {}
+
+    def _db(self) -> sqlite3.Connection:
+        if self.connection is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, prompt TEXT, value TEXT, created REAL, accessed REAL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        return self.connection
+
+    def _count(self, prompt_name: str, counter: str):
+        stats = self.counters.setdefault(prompt_name, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0})
+        stats[counter] += 1
+        if counter != "writes":
+            tracing.add("cache_misses" if counter == "misses" else "cache_hits")
+
+    def _remember(self, key: str, entry: tuple):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _memory_get(self, prompt_name: str, key: str, now: float) -> tuple[bool, object]:
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl_seconds:
+                    self.memory.move_to_end(key)
+                    self._count(prompt_name, "memory_hits")
+                    # Entries are kept serialized so callers can't mutate the cached copy
+                    return True, json.loads(value)
+                del self.memory[key]
+        return False, None
+
+    def _disk_get(self, prompt_name: str, key: str, now: float) -> tuple[bool, object]:
+        entry = None
+        with self.db_lock:
+            db = self._db()
+            row = db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value, created = row
+                if now - created <= self.ttl_seconds:
+                    db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    entry = (created, value)
+                else:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        with self.lock:
+            if entry is None:
+                self._count(prompt_name, "misses")
+                return False, None
+            self._remember(key, entry)
+            self._count(prompt_name, "disk_hits")
+        return True, json.loads(entry[1])
+
+    def get(self, prompt_name: str, key: str) -> tuple[bool, object]:
+        """
+        Look up a cached response.
+
+        Args:
+            prompt_name (str): Prompt the entry belongs to (used for the counters).
+            key (str): Cache key, see `make_key`.
+
+        Returns:
+            tuple[bool, object]: (hit, value).
+        """
+        if not self.enabled:
+            return False, None
+        now = time.time()
+        hit, value = self._memory_get(prompt_name, key, now)
+        if hit:
+            return hit, value
+        return self._disk_get(prompt_name, key, now)
+
+    async def aget(self, prompt_name: str, key: str) -> tuple[bool, object]:
+        """
+        Async version of `get`: the LRU tier is read on the event loop, the SQLite tier in a
+        worker thread.
+        """
+        if not self.enabled:
+            return False, None
+        now = time.time()
+        hit, value = self._memory_get(prompt_name, key, now)
+        if hit:
+            return hit, value
+        return await asyncio.to_thread(self._disk_get, prompt_name, key, now)
+
+    def _memory_set(self, prompt_name: str, key: str, value, now: float) -> str:
+        serialized = json.dumps(value, ensure_ascii=False)
+        with self.lock:
+            self._remember(key, (now, serialized))
+            self._count(prompt_name, "writes")
+        return serialized
+
+    def _disk_set(self, prompt_name: str, key: str, serialized: str, now: float):
+        with self.db_lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, prompt, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, prompt_name, serialized, now, now),
+            )
+            self.writes_since_eviction += 1
+            # Size / TTL eviction is amortized over many writes
+            if self.writes_since_eviction >= 100:
+                self.writes_since_eviction = 0
+                self._evict(db, now)
+
+    def set(self, prompt_name: str, key: str, value):
+        """
+        Store a response in both tiers.
+
+        Args:
+            prompt_name (str): Prompt the entry belongs to.
+            key (str): Cache key, see `make_key`.
+            value: JSON-serializable response.
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        self._disk_set(prompt_name, key, self._memory_set(prompt_name, key, value, now), now)
+
+    async def aset(self, prompt_name: str, key: str, value):
+        """
+        Async version of `set`: the SQLite write runs in a worker thread.
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        serialized = self._memory_set(prompt_name, key, value, now)
+        await asyncio.to_thread(self._disk_set, prompt_name, key, serialized, now)
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        (count,) = db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_disk_entries:
+            db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+
+    def clear(self):
+        """
+        Drop every entry from both tiers.
+        """
+        with self.lock:
+            self.memory.clear()
+        with self.db_lock:
+            self._db().execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """
+        Hit / miss counters per prompt.
+
+        Returns:
+            dict: Counters per prompt plus totals and the overall hit rate.
+        """
+        with self.lock:
+            prompts_stats = {name: dict(stats) for name, stats in self.counters.items()}
+            memory_entries = len(self.memory)
+        totals = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        for stats in prompts_stats.values():
+            for counter in totals:
+                totals[counter] += stats[counter]
+        lookups = totals["memory_hits"] + totals["disk_hits"] + totals["misses"]
+        totals["hit_rate"] = (totals["memory_hits"] + totals["disk_hits"]) / lookups if lookups else 0.0
+        return {"enabled": self.enabled, "memory_entries": memory_entries, "totals": totals, "prompts": prompts_stats}
+
+    def make_key(self, prompt_name: str, inputs: list, model: str = DEFAULT_MODEL) -> str:
+        """
+        Build the cache key of a call.
+
+        Args:
+            prompt_name (str): Key under `prompts` in prompts.yml.
+            inputs (list): Normalized inputs of the call.
+            model (str): Model the call is sent to.
+
+        Returns:
+            str: The cache key.
+        """
+        payload = json.dumps([model, prompt_name, prompt_version(prompt_name), inputs], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def memoize(self, prompt_name: str, normalize=normalize_text, model: str = DEFAULT_MODEL):
+        """
+        Decorator caching a sync or async LLM helper on its (normalized) arguments.
+
+        String arguments are normalized with `normalize`; lists of strings are normalized item by item.
+
+        Args:
+            prompt_name (str): Key under `prompts` in prompts.yml used by the helper.
+            normalize (callable): Normalization applied to string inputs.
+            model (str): Model the helper sends its requests to.
+        """
+        def normalize_value(value):
+            if isinstance(value, str):
+                return normalize(value)
+            if isinstance(value, (list, tuple)):
+                return [normalize_value(item) for item in value]
+            return value
+
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            def key_for(args, kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                inputs = [normalize_value(value) for value in bound.arguments.values()]
+                return self.make_key(prompt_name, inputs, model)
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    key = key_for(args, kwargs)
+                    hit, value = await self.aget(prompt_name, key)
+                    if hit:
+                        return value
+                    value = await func(*args, **kwargs)
+                    await self.aset(prompt_name, key, value)
+                    return value
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = key_for(args, kwargs)
+                hit, value = self.get(prompt_name, key)
+                if hit:
+                    return value
+                value = func(*args, **kwargs)
+                self.set(prompt_name, key, value)
+                return value
+            return wrapper
+
+        return decorator
+
+
+response_cache = ResponseCache(
+    path=LLM_CACHE_PATH,
+    ttl_seconds=LLM_CACHE_TTL,
+    max_memory_entries=LLM_CACHE_MEMORY_ENTRIES,
+    max_disk_entries=LLM_CACHE_DISK_ENTRIES,
+    enabled=LLM_CACHE_ENABLED,
+)
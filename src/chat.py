@@ -0,0 +1,489 @@
+# Run a full conversation turn (scope -> translation -> summary -> retrieval -> answer)
+
+import time
+import logging
+from .scope import classify_scope, aclassify_scope
+from .language import (arabic_to_english_translation, english_to_arabic_translation,
+                       aarabic_to_english_translation, aenglish_to_arabic_translation,
+                       stream_english_to_arabic_translation, astream_english_to_arabic_translation,
+                       answers_directly, answer_language, needs_translation)
+from .q_and_a import get_question_summary, relevant_context_stages, aget_question_summary
+from .citations import verify_citations
+from .artifacts import localized_paragraph
+from .semantic_cache import (cached_query_response, acached_query_response,
+                             stream_cached_query_response, astream_cached_query_response)
+from .pipeline import Pipeline, Stage
+from .tracing import span
+from .summaries import needs_question_summary
+from .registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+OUT_OF_SCOPE_MESSAGE = "Your question is outside the scope of the regulation. Please ask a relevant question."
+
+# Labels of the references list under an answer
+REFERENCE_LABELS = {
+    "English": {"references": "References", "citation": "Article {article}, Paragraph {paragraph}",
+                "not_verified": "quote not verified"},
+    "Arabic": {"references": "المراجع", "citation": "المادة {article}، الفقرة {paragraph}",
+               "not_verified": "لم يتم التحقق من الاقتباس",
+               "official": "النص الرسمي للفقرة", "translated": "ترجمة الفقرة (آلية)"},
+}
+
+# Number of previous messages passed to the summarizer and the answer prompt
+HISTORY_WINDOW = 6
+
+
+def format_conversation_history(history: list[tuple[str, str]], summary: str = "") -> list[str]:
+    """
+    Format the most recent messages as "Human: ..." / "AI: ..." lines.
+
+    When a rolling `summary` of the conversation is available it comes first, and `history`
+    only needs the messages it does not cover yet (see `Session.recent_messages`).
+
+    Args:
+        history (list[tuple[str, str]]): Previous (role, text) messages, oldest first.
+        summary (str): Rolling summary of the conversation, if any.
+
+    Returns:
+        list[str]: The formatted conversation history.
+    """
+    conversation_history = []
+    if summary:
+        conversation_history.append(f"Summary of the conversation so far: {summary}\n")
+    for role, text in history[-HISTORY_WINDOW:]:
+        if role == "user":
+            conversation_history.append(f"Human: {text}\n")
+        else:
+            conversation_history.append(f"AI: {text}\n")
+    return conversation_history
+
+
+def format_message(answer: str, citations: list[dict], language: str = "English") -> str:
+    """
+    Append the citations of a response as a references list.
+
+    For Arabic users the list is in Arabic, and each quoted excerpt is followed by the whole
+    cited paragraph in Arabic, labeled as the official text or a translation, taken from the
+    precomputed artifacts (see src/artifacts.py) rather than translated per turn.
+
+    Args:
+        answer (str): The answer text.
+        citations (list[dict]): Citations with "article", "paragraph" and "text" keys, and the
+            "status" set by `verify_citations`, if any.
+        language (str): The user's language.
+
+    Returns:
+        str: The message to display.
+    """
+    labels = REFERENCE_LABELS.get(language, REFERENCE_LABELS["English"])
+    message = answer
+    if citations:
+        message += f"\n\n{labels['references']}:\n"
+        for citation in citations:
+            article = citation["article"]
+            paragraph = citation["paragraph"]
+            verified = citation.get("status", "verified") in ("verified", "repaired")
+            flag = "" if verified else f" ({labels['not_verified']})"
+            message += f"- {labels['citation'].format(article=article, paragraph=paragraph)}{flag}: {citation['text']}\n"
+            localized = localized_paragraph(citation, language)
+            if localized is not None:
+                message += f"  {labels[localized['source']]}: {localized['text']}\n"
+    return message
+
+
+def _scope_failed(error: Exception) -> bool:
+    # A failed scope check does not block the answer
+    logger.warning("Error in scope extraction: %s", error)
+    return True
+
+
+def check_scope(prompt: str, vector_store, query_embedding=None) -> bool:
+    """
+    `classify_scope`, treating a failed check as in scope.
+
+    Args:
+        prompt (str): The question.
+        vector_store: The vector store used for the local classifier.
+        query_embedding (list[float], optional): Precomputed embedding of the question.
+
+    Returns:
+        bool: True if the question is within scope (or could not be classified).
+    """
+    try:
+        scope = classify_scope(prompt, vector_store, query_embedding)
+    except Exception as e:
+        scope = _scope_failed(e)
+    logger.debug("Scope: %s", scope)
+    return scope
+
+
+async def acheck_scope(prompt: str, vector_store, query_embedding=None) -> bool:
+    """
+    Async version of `check_scope`.
+    """
+    try:
+        scope = await aclassify_scope(prompt, vector_store, query_embedding)
+    except Exception as e:
+        scope = _scope_failed(e)
+    logger.debug("Scope: %s", scope)
+    return scope
+
+
+def _translates_question(language: str, routes: list = None) -> bool:
+    # Context retrieved from collections in the question's language (e.g. the Arabic original)
+    # is answered from the question as asked
+    if routes is not None and all(route.language == language for route in routes):
+        return False
+    return language == "Arabic" and not answers_directly(language)
+
+
+def _question(prompt: str, language: str, routes: list = None) -> str:
+    if _translates_question(language, routes):
+        return arabic_to_english_translation(prompt)["translation"]
+    return prompt
+
+
+async def _aquestion(prompt: str, language: str, routes: list = None) -> str:
+    if _translates_question(language, routes):
+        return (await aarabic_to_english_translation(prompt))["translation"]
+    return prompt
+
+
+def _summary_failed(prompt: str, error: Exception) -> str:
+    # The question as asked is a usable (if less precise) retrieval query
+    logger.warning("Error in question summarization: %s", error)
+    return prompt
+
+
+def _question_summary(prompt: str, conversation_history: list[str]) -> str:
+    try:
+        if not needs_question_summary(prompt, conversation_history):
+            question_summary = prompt
+        else:
+            question_summary = get_question_summary(prompt, conversation_history)
+    except Exception as e:
+        question_summary = _summary_failed(prompt, e)
+    logger.debug("Question Summary: %s", question_summary)
+    return question_summary
+
+
+async def _aquestion_summary(prompt: str, conversation_history: list[str]) -> str:
+    try:
+        if not needs_question_summary(prompt, conversation_history):
+            question_summary = prompt
+        else:
+            question_summary = await aget_question_summary(prompt, conversation_history)
+    except Exception as e:
+        question_summary = _summary_failed(prompt, e)
+    logger.debug("Question Summary: %s", question_summary)
+    return question_summary
+
+
+def _response_args(question: str, language: str, conversation_history: list[str], relevant_context: list[dict],
+                   query_embedding, question_summary: str, vector_store) -> tuple:
+    # Positional arguments of the (a)(stream_)cached_query_response calls
+    return (question, conversation_history, relevant_context, query_embedding, vector_store,
+            answer_language(language), question_summary)
+
+
+def _response(**kwargs) -> dict:
+    response = cached_query_response(*_response_args(**kwargs))
+    logger.debug("Final Response: %s", response)
+    return response
+
+
+async def _aresponse(**kwargs) -> dict:
+    response = await acached_query_response(*_response_args(**kwargs))
+    logger.debug("Final Response: %s", response)
+    return response
+
+
+def _citations(response: dict, relevant_context: list[dict], vector_store, routes: list = None) -> list[dict]:
+    # Quotes are checked against the cited paragraphs locally (see src/citations.py), in every
+    # routed regulation
+    return verify_citations(response["citations"], relevant_context, vector_store, routes=routes)
+
+
+def _answer(response: dict, language: str) -> str:
+    message = response["answer"]
+    # Translate back to Arabic if needed (also the fallback when a direct answer came back in English)
+    if needs_translation(message, language):
+        message = english_to_arabic_translation(message)["translation"]
+    return message
+
+
+async def _aanswer(response: dict, language: str) -> str:
+    message = response["answer"]
+    if needs_translation(message, language):
+        message = (await aenglish_to_arabic_translation(message))["translation"]
+    return message
+
+
+def _context_stages(vector_store) -> list[Stage]:
+    # Everything a turn needs before the answer is generated
+    routed = get_registry().routed
+    return [
+        Stage("in_scope", lambda prompt: check_scope(prompt, vector_store), requires=("prompt",),
+              afunc=lambda prompt: acheck_scope(prompt, vector_store)),
+        Stage("question", _question, requires=("prompt", "language", "routes") if routed else ("prompt", "language"),
+              afunc=_aquestion),
+        Stage("question_summary", _question_summary, requires=("prompt", "conversation_history"),
+              afunc=_aquestion_summary),
+        *relevant_context_stages(vector_store),
+    ]
+
+
+def turn_pipeline(vector_store) -> Pipeline:
+    """
+    Build the dependency graph of a conversation turn.
+
+    Scope classification, translation, summarization and retrieval start together; the answer
+    waits for the scope check, and the back-translation and citation check wait for the answer.
+
+    Args:
+        vector_store: The vector store used for retrieval.
+
+    Returns:
+        Pipeline: The turn pipeline.
+    """
+    return Pipeline([
+        *_context_stages(vector_store),
+        Stage("response",
+              lambda in_scope, **kwargs: _response(vector_store=vector_store, **kwargs),
+              requires=("in_scope", "question", "language", "conversation_history", "relevant_context",
+                        "query_embedding", "question_summary"),
+              when=lambda in_scope, **_: in_scope,
+              afunc=lambda in_scope, **kwargs: _aresponse(vector_store=vector_store, **kwargs)),
+        Stage("citations", lambda **kwargs: _citations(vector_store=vector_store, **kwargs),
+              requires=("response", "relevant_context", "routes") if get_registry().routed
+              else ("response", "relevant_context")),
+        Stage("answer", _answer, requires=("response", "language"), afunc=_aanswer),
+    ])
+
+
+def _out_of_scope_result(question_summary: str, timings: dict) -> dict:
+    return {
+        "in_scope": False,
+        "answer": OUT_OF_SCOPE_MESSAGE,
+        "citations": [],
+        "message": OUT_OF_SCOPE_MESSAGE,
+        "question_summary": question_summary,
+        "timings": timings,
+    }
+
+
+def _answer_result(answer: str, citations: list[dict], question_summary: str, timings: dict,
+                   language: str = "English") -> dict:
+    return {
+        "in_scope": True,
+        "answer": answer,
+        "citations": citations,
+        "message": format_message(answer, citations, language),
+        "question_summary": question_summary,
+        "timings": timings,
+    }
+
+
+def _turn_result(result) -> dict:
+    logger.debug("Stage timings: %s", result.timings)
+
+    if not result["in_scope"]:
+        return _out_of_scope_result(result["question_summary"], result.timings)
+    return _answer_result(result["answer"], result["citations"], result["question_summary"], result.timings,
+                          result["language"])
+
+
+def _turn_inputs(prompt: str, language: str, history: list[tuple[str, str]], summary: str) -> dict:
+    return {"prompt": prompt, "language": language,
+            "conversation_history": format_conversation_history(history, summary)}
+
+
+def run_turn(prompt: str, language: str, history: list[tuple[str, str]], vector_store,
+             summary: str = "") -> dict:
+    """
+    Answer a user message.
+
+    Args:
+        prompt (str): The user message.
+        language (str): "English" or "Arabic".
+        history (list[tuple[str, str]]): Previous (role, text) messages, oldest first.
+        vector_store: The vector store used for retrieval.
+        summary (str): Rolling summary of the earlier conversation, if any; `history` then only
+            needs the messages it does not cover.
+
+    Returns:
+        dict: "in_scope", "answer" (the answer in the user's language), "citations",
+            "message" (answer plus references, for display), the standalone "question_summary"
+            and per-stage "timings".
+    """
+    with span("turn", language=language):
+        result = turn_pipeline(vector_store).run(**_turn_inputs(prompt, language, history, summary))
+    return _turn_result(result)
+
+
+async def arun_turn(prompt: str, language: str, history: list[tuple[str, str]], vector_store,
+                    summary: str = "") -> dict:
+    """
+    Async version of `run_turn`.
+    """
+    with span("turn", language=language):
+        result = await turn_pipeline(vector_store).arun(**_turn_inputs(prompt, language, history, summary))
+    return _turn_result(result)
+
+
+class _StreamedTurn:
+    """
+    State of a streamed turn after its context stages ran: which events reach the user, the
+    answer, its citations, and stage timings continuing the offsets of the context pipeline run.
+    """
+
+    def __init__(self, result, language: str, vector_store, started: float):
+        self.result = result
+        self.language = language
+        self.vector_store = vector_store
+        self.started = started
+        self.timings = dict(result.timings)
+        self.stage_started = None
+        # Translated answers stream as the back-translation, not as the English answer
+        self.streams_answer = language != "Arabic" or answers_directly(language)
+        self.response = None
+        self.answer = None
+        self.citations = []
+
+    def start(self, stage: str):
+        self.stage_started = time.perf_counter()
+        self.timings[stage] = {"start": self.stage_started - self.started, "duration": None}
+
+    def stop(self, stage: str):
+        self.timings[stage]["duration"] = time.perf_counter() - self.stage_started
+
+    def _first_token(self):
+        if "first_token" not in self.timings:
+            self.timings["first_token"] = {"start": 0.0, "duration": time.perf_counter() - self.started}
+
+    def _finish(self) -> dict:
+        self.timings["total"] = {"start": 0.0, "duration": time.perf_counter() - self.started}
+        logger.debug("Stage timings: %s", self.timings)
+        return self.timings
+
+    def out_of_scope_events(self) -> list[dict]:
+        self._first_token()
+        return [{"type": "delta", "text": OUT_OF_SCOPE_MESSAGE},
+                {"type": "done", **_out_of_scope_result(self.result["question_summary"], self._finish())}]
+
+    def response_args(self) -> tuple:
+        return _response_args(self.result["question"], self.language, self.result["conversation_history"],
+                              self.result["relevant_context"], self.result["query_embedding"],
+                              self.result["question_summary"], self.vector_store)
+
+    def response_event(self, event: dict):
+        # The event to yield, if any
+        if event["type"] == "response":
+            self.response = event["response"]
+            self.answer = self.response["answer"]
+        elif self.streams_answer:
+            self._first_token()
+            return event
+        return None
+
+    def check_citations(self):
+        self.citations = _citations(self.response, self.result["relevant_context"], self.vector_store,
+                                    self.result.get("routes"))
+
+    def needs_translation(self) -> bool:
+        return needs_translation(self.answer, self.language)
+
+    def translation_event(self, event: dict):
+        if event["type"] == "response":
+            self.answer = event["response"]["translation"]
+            return None
+        self._first_token()
+        return event
+
+    def done_event(self) -> dict:
+        return {"type": "done", **_answer_result(self.answer, self.citations, self.result["question_summary"],
+                                                 self._finish(), self.language)}
+
+
+def stream_turn(prompt: str, language: str, history: list[tuple[str, str]], vector_store,
+                summary: str = ""):
+    """
+    Streaming version of `run_turn`.
+
+    Streams the answer as it is generated, or its back-translation for translated Arabic turns.
+
+    Args:
+        prompt (str): The user message.
+        language (str): "English" or "Arabic".
+        history (list[tuple[str, str]]): Previous (role, text) messages, oldest first.
+        vector_store: The vector store used for retrieval.
+        summary (str): Rolling summary of the earlier conversation, if any; `history` then only
+            needs the messages it does not cover.
+
+    Yields:
+        dict: {"type": "delta", "text": ...} pieces of the answer, then
+            {"type": "done", **<the `run_turn` result>}.
+    """
+    started = time.perf_counter()
+    with span("turn", language=language, streamed=True) as turn:
+        result = Pipeline(_context_stages(vector_store)).run(**_turn_inputs(prompt, language, history, summary))
+        streamed = _StreamedTurn(result, language, vector_store, started)
+        if not result["in_scope"]:
+            yield from streamed.out_of_scope_events()
+            return
+
+        streamed.start("response")
+        with span("response", parent=turn):
+            for event in stream_cached_query_response(*streamed.response_args()):
+                if (event := streamed.response_event(event)) is not None:
+                    yield event
+        streamed.stop("response")
+
+        with span("citations", parent=turn):
+            streamed.check_citations()
+
+        if streamed.needs_translation():
+            streamed.start("answer")
+            with span("answer", parent=turn):
+                for event in stream_english_to_arabic_translation(streamed.answer):
+                    if (event := streamed.translation_event(event)) is not None:
+                        yield event
+            streamed.stop("answer")
+
+    yield streamed.done_event()
+
+
+async def astream_turn(prompt: str, language: str, history: list[tuple[str, str]], vector_store,
+                       summary: str = ""):
+    """
+    Async version of `stream_turn`.
+    """
+    started = time.perf_counter()
+    with span("turn", language=language, streamed=True) as turn:
+        result = await Pipeline(_context_stages(vector_store)).arun(**_turn_inputs(prompt, language, history, summary))
+        streamed = _StreamedTurn(result, language, vector_store, started)
+        if not result["in_scope"]:
+            for event in streamed.out_of_scope_events():
+                yield event
+            return
+
+        streamed.start("response")
+        with span("response", parent=turn):
+            async for event in astream_cached_query_response(*streamed.response_args()):
+                if (event := streamed.response_event(event)) is not None:
+                    yield event
+        streamed.stop("response")
+
+        with span("citations", parent=turn):
+            streamed.check_citations()
+
+        if streamed.needs_translation():
+            streamed.start("answer")
+            with span("answer", parent=turn):
+                async for event in astream_english_to_arabic_translation(streamed.answer):
+                    if (event := streamed.translation_event(event)) is not None:
+                        yield event
+            streamed.stop("answer")
+
+    yield streamed.done_event()
@@ -0,0 +1,255 @@
+# Local citation verifier: matches each quoted excerpt against the paragraph it cites
+# (CITATION_CHECK_MODE: flag, repair or off)
+
+import os
+import re
+import time
+import functools
+import threading
+import unicodedata
+from . import tracing
+from .corpus import load_corpus, reference_key
+from .registry import get_registry
+
+CITATION_CHECK_MODE = os.getenv("CITATION_CHECK_MODE", "flag")
+# Minimum share of the excerpt's trigrams that must appear in the passage
+CITATION_MATCH_THRESHOLD = float(os.getenv("CITATION_MATCH_THRESHOLD", "0.8"))
+# Length of a replacement excerpt, the upper bound the prompt asks for
+REPAIRED_EXCERPT_CHARS = 200
+
+NGRAM_SIZE = 3
+STATUSES = ("verified", "misattributed", "misquoted", "unknown_reference")
+
+_counters = {"turns": 0, "checked": 0, **{status: 0 for status in STATUSES}, "repaired": 0, "dropped": 0,
+             "seconds": 0.0}
+_counters_lock = threading.Lock()
+
+
+def normalize_excerpt(text: str) -> str:
+    """
+    Casefolded NFKC text with punctuation (quotes, ellipses, brackets) removed and whitespace
+    collapsed, so that an excerpt can be matched against its passage.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+@functools.lru_cache(maxsize=8192)
+def _ngrams(text: str) -> frozenset:
+    return frozenset(text[start:start + NGRAM_SIZE] for start in range(len(text) - NGRAM_SIZE + 1))
+
+
+def match_score(excerpt: str, passage: str) -> float:
+    """
+    How much of `excerpt` appears in `passage`.
+
+    Args:
+        excerpt (str): The quoted text.
+        passage (str): The paragraph it should come from.
+
+    Returns:
+        float: 1.0 when the normalized excerpt is a substring of the passage, otherwise the
+            share of its character trigrams found in the passage (0.0 for an empty excerpt).
+    """
+    excerpt = normalize_excerpt(excerpt)
+    passage = normalize_excerpt(passage)
+    if not excerpt:
+        return 0.0
+    if excerpt in passage:
+        return 1.0
+    grams = _ngrams(excerpt)
+    if not grams:
+        return 0.0
+    return len(grams & _ngrams(passage)) / len(grams)
+
+
+def _key(citation: dict):
+    try:
+        return reference_key(citation["article"], citation["paragraph"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _cited_regulation(citation: dict, corpora: dict) -> str:
+    # The regulation named by the citation; a citation without one (or with an unknown name)
+    # refers to the first corpus, the default regulation ("" when unrouted)
+    regulation = citation.get("regulation") or ""
+    if not corpora or regulation in corpora:
+        return regulation
+    return next(iter(corpora))
+
+
+def _cited_passages(key, regulation: str, relevant_context: list[dict], corpora: dict) -> list[str]:
+    # Text of the cited paragraph of the cited regulation, as the model saw it and as indexed
+    passages = [chunk["content"] for chunk in relevant_context
+                if chunk.get("regulation", "") == regulation
+                and reference_key(chunk["article number"], chunk["paragraph number"]) == key]
+    if regulation in (corpora or {}):
+        passages += [chunk["content"] for chunk in corpora[regulation].lookup([key])]
+    return passages
+
+
+def _best_match(excerpt: str, chunks: list[dict], exclude) -> tuple[dict | None, float]:
+    best, best_score = None, 0.0
+    for chunk in chunks:
+        # Article headers can't be cited (citations name a paragraph)
+        if chunk["paragraph number"] in ("", None):
+            continue
+        if (chunk.get("regulation", ""), *reference_key(chunk["article number"], chunk["paragraph number"])) == exclude:
+            continue
+        score = match_score(excerpt, chunk["content"])
+        if score > best_score:
+            best, best_score = chunk, score
+    return best, best_score
+
+
+def check_citation(citation: dict, relevant_context: list[dict], corpora: dict = None,
+                   threshold: float = CITATION_MATCH_THRESHOLD) -> dict:
+    """
+    Verify one citation.
+
+    Args:
+        citation (dict): {"article", "paragraph", "text"} from `query_response`, and the
+            "regulation" it names, if any.
+        relevant_context (list[dict]): The context the answer was generated from.
+        corpora (dict, optional): Regulation display name ("" when unrouted) -> collection
+            snapshot, to look up paragraphs outside the context. The first one is the default
+            regulation.
+        threshold (float): Minimum match score of a verified excerpt.
+
+    Returns:
+        dict: "status" ("verified", "misattributed", "misquoted" or "unknown_reference"), the
+            best "score", the cited "passage" (or None), the "regulation" of the passage the
+            excerpt was found in ("" when unknown) and, when misattributed, the context "match"
+            chunk the excerpt comes from.
+    """
+    key = _key(citation)
+    regulation = _cited_regulation(citation, corpora)
+    excerpt = citation.get("text", "")
+    passages = _cited_passages(key, regulation, relevant_context, corpora) if key is not None else []
+    scores = [match_score(excerpt, passage) for passage in passages]
+    best = max(range(len(passages)), key=scores.__getitem__, default=None)
+    if best is not None and scores[best] >= threshold:
+        return {"status": "verified", "score": scores[best], "passage": passages[best], "regulation": regulation,
+                "match": None}
+
+    score = scores[best] if best is not None else 0.0
+    passage = passages[0] if passages else None
+    exclude = (regulation, *key) if key is not None else None
+    match, match_found = _best_match(excerpt, relevant_context, exclude=exclude)
+    if match is not None and match_found >= threshold:
+        return {"status": "misattributed", "score": match_found, "passage": passage,
+                "regulation": match.get("regulation", ""), "match": match}
+    if passages:
+        return {"status": "misquoted", "score": score, "passage": passage, "regulation": regulation, "match": None}
+    return {"status": "unknown_reference", "score": score, "passage": None, "regulation": "", "match": None}
+
+
+def shorten_excerpt(passage: str, max_chars: int = REPAIRED_EXCERPT_CHARS) -> str:
+    """
+    A passage cut at a word boundary to at most `max_chars` characters, for display as an excerpt.
+    """
+    text = " ".join(passage.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + " ..."
+
+
+def _repair(citation: dict, check: dict, original: dict) -> dict | None:
+    if check["status"] == "verified":
+        return citation
+    if check["status"] == "misattributed":
+        match = check["match"]
+        cited = {name: original[name] for name in ("regulation", "article", "paragraph") if name in original}
+        return {**citation, "article": int(match["article number"]), "paragraph": int(match["paragraph number"]),
+                "status": "repaired", "cited": cited}
+    if check["status"] == "misquoted":
+        return {**citation, "text": shorten_excerpt(check["passage"]), "status": "repaired"}
+    return None
+
+
+def _corpora(vector_store, relevant_context: list[dict], routes) -> dict:
+    # The routed regulations' collections, plus any other collection the context came from;
+    # without routing, the single collection of `vector_store`
+    collections = {route.regulation: route.collection for route in routes or ()}
+    for chunk in relevant_context:
+        if "collection" in chunk:
+            collections.setdefault(chunk["regulation"], chunk["collection"])
+    if collections:
+        registry = get_registry()
+        return {regulation: load_corpus(registry.load(collection)) for regulation, collection in collections.items()}
+    return {"": load_corpus(vector_store)} if vector_store is not None else {}
+
+
+def verify_citations(citations: list[dict], relevant_context: list[dict], vector_store=None,
+                     mode: str = CITATION_CHECK_MODE, threshold: float = CITATION_MATCH_THRESHOLD,
+                     routes: list = None) -> list[dict]:
+    """
+    Check the citations of an answer and flag or repair the ones that do not hold.
+
+    The response's own citation dicts are not modified (cached responses share them).
+
+    Args:
+        citations (list[dict]): Citations from `query_response`.
+        relevant_context (list[dict]): The context the answer was generated from.
+        vector_store (optional): The vector store, whose corpus snapshot is used to look up
+            cited paragraphs that were not in the context (unrouted retrieval).
+        mode (str): "flag", "repair" or "off" (see CITATION_CHECK_MODE).
+        threshold (float): Minimum match score of a verified excerpt.
+        routes (list[Route], optional): The collections retrieval was routed to; a cited
+            paragraph is looked up in the regulation the citation names, the first route's
+            otherwise.
+
+    Returns:
+        list[dict]: The citations with a "status", "score" and, when known, the "regulation"
+            (display name) they were found in (flag), or the repaired citations (repair:
+            re-attributed or re-quoted ones have status "repaired", unknown references are
+            dropped).
+    """
+    if mode == "off" or not citations:
+        return citations
+    started = time.perf_counter()
+    corpora = _corpora(vector_store, relevant_context, routes)
+    checked = []
+    counts = dict.fromkeys((*STATUSES, "repaired", "dropped"), 0)
+    for citation in citations:
+        check = check_citation(citation, relevant_context, corpora, threshold)
+        counts[check["status"]] += 1
+        flagged = {**citation, "status": check["status"], "score": round(check["score"], 3)}
+        if check["regulation"]:
+            flagged["regulation"] = check["regulation"]
+        if mode == "repair":
+            repaired = _repair(flagged, check, citation)
+            if repaired is None:
+                counts["dropped"] += 1
+                continue
+            counts["repaired"] += repaired["status"] == "repaired"
+            flagged = repaired
+        checked.append(flagged)
+    seconds = time.perf_counter() - started
+
+    with _counters_lock:
+        _counters["turns"] += 1
+        _counters["checked"] += len(citations)
+        _counters["seconds"] += seconds
+        for name, count in counts.items():
+            _counters[name] += count
+    tracing.add("citations", len(citations))
+    tracing.add("citations_verified", counts["verified"])
+    return checked
+
+
+def citation_stats() -> dict:
+    """
+    How many citations were checked and how many held.
+
+    Returns:
+        dict: Counters per status, the citation precision (verified / checked) and the mean
+            verification time per turn.
+    """
+    with _counters_lock:
+        counters = dict(_counters)
+    counters["mode"] = CITATION_CHECK_MODE
+    counters["precision"] = counters["verified"] / counters["checked"] if counters["checked"] else 0.0
+    counters["mean_ms_per_turn"] = counters["seconds"] / counters["turns"] * 1e3 if counters["turns"] else 0.0
+    return counters
@@ -0,0 +1,198 @@
+# Token-budgeted packing of the retrieved chunks into the query_response prompt
+
+import os
+import logging
+import threading
+from functools import lru_cache
+from .corpus import chunk_key
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")
+
+
+# Why token counts are estimated, when they are (reported by `token_stats`)
+_fallback_reason = None
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    global _fallback_reason
+    if tiktoken is None:
+        _fallback_reason = "tiktoken is not installed"
+        logger.warning("tiktoken is not installed, estimating tokens as characters / 4")
+        return None
+    try:
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        # The encoding file is downloaded on first use; fall back to the estimate when offline
+        _fallback_reason = f"encoding {TOKENIZER_ENCODING!r} unavailable: {e}"
+        logger.warning("Tokenizer %r unavailable, estimating tokens: %s", TOKENIZER_ENCODING, e)
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """
+    Number of tokens in a text, using the local tokenizer when available.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The token count (estimated as characters / 4 without tiktoken).
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def citation_label(article, paragraph, regulation: str = "") -> str:
+    """
+    "Article 23, Paragraph 5", or "Article 23" for the article header, prefixed with the
+    regulation name when there is one.
+    """
+    label = f"Article {article}" if paragraph in ("", None) else f"Article {article}, Paragraph {paragraph}"
+    return f"{regulation}, {label}" if regulation else label
+
+
+def render_chunk(chunk: dict) -> str:
+    """
+    A context chunk as a single prompt line.
+    """
+    label = citation_label(chunk["article number"], chunk["paragraph number"], chunk.get("regulation", ""))
+    return f"[{label}] {' '.join(chunk['content'].split())}"
+
+
+def fit_to_budget(chunks: list[dict], token_budget: int = CONTEXT_TOKEN_BUDGET) -> tuple[list[dict], dict]:
+    """
+    Deduplicate chunks by (regulation, article, paragraph) and keep them, in rank order, within a token budget.
+
+    Chunks that would push the total past `token_budget` are skipped (a smaller, lower-ranked
+    chunk may still fit); the first chunk is always kept.
+
+    Args:
+        chunks (list[dict]): Context chunks, most relevant first.
+        token_budget (int): Maximum tokens of the rendered context.
+
+    Returns:
+        tuple[list[dict], dict]: The kept chunks and a report with "chunks", "kept",
+            "duplicates", "over_budget" and "tokens".
+    """
+    kept = []
+    seen = set()
+    tokens = 0
+    duplicates = 0
+    over_budget = 0
+    for chunk in chunks:
+        key = chunk_key(chunk)
+        if key in seen:
+            duplicates += 1
+            continue
+        cost = count_tokens(render_chunk(chunk)) + 1  # + newline
+        if kept and tokens + cost > token_budget:
+            over_budget += 1
+            continue
+        seen.add(key)
+        kept.append(chunk)
+        tokens += cost
+    report = {
+        "chunks": len(chunks),
+        "kept": len(kept),
+        "duplicates": duplicates,
+        "over_budget": over_budget,
+        "tokens": tokens,
+    }
+    return kept, report
+
+
+def pack_context(chunks: list[dict], token_budget: int = CONTEXT_TOKEN_BUDGET) -> tuple[str, dict]:
+    """
+    Render the relevant context for a prompt.
+
+    Args:
+        chunks (list[dict]): Context chunks, most relevant first.
+        token_budget (int): Maximum tokens of the rendered context.
+
+    Returns:
+        tuple[str, dict]: The packed context text and the `fit_to_budget` report.
+    """
+    kept, report = fit_to_budget(chunks, token_budget)
+    return "\n".join(render_chunk(chunk) for chunk in kept), report
+
+
+class PromptTokenStats:
+    """
+    Running totals of prompt tokens per LLM stage and prompt section.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage: str, sections: dict):
+        with self._lock:
+            stats = self._stages.setdefault(stage, {"requests": 0, "sections": {}})
+            stats["requests"] += 1
+            for section, tokens in sections.items():
+                totals = stats["sections"].setdefault(section, {"total": 0, "max": 0})
+                totals["total"] += tokens
+                totals["max"] = max(totals["max"], tokens)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            report = {}
+            for stage, stats in self._stages.items():
+                requests = stats["requests"]
+                report[stage] = {
+                    "requests": requests,
+                    "sections": {
+                        section: {"mean": totals["total"] / requests, "max": totals["max"]}
+                        for section, totals in stats["sections"].items()
+                    },
+                }
+            return report
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+
+prompt_token_stats = PromptTokenStats()
+
+
+def measure_prompt(stage: str, **sections: str) -> dict:
+    """
+    Count and record the tokens of each section of an LLM prompt.
+
+    Args:
+        stage (str): The prompt name (e.g. "response_with_citations").
+        **sections (str): The prompt parts, e.g. system=..., context=...
+
+    Returns:
+        dict: Tokens per section, plus "total".
+    """
+    tokens = {section: count_tokens(text) for section, text in sections.items()}
+    tokens["total"] = sum(tokens.values())
+    prompt_token_stats.record(stage, tokens)
+    return tokens
+
+
+def token_stats() -> dict:
+    """
+    Prompt token usage per LLM stage: mean and max tokens of each prompt section, and the
+    active tokenizer ("estimate" with the reason in "tokenizer_fallback" when tiktoken is not used).
+    """
+    return {
+        "tokenizer": TOKENIZER_ENCODING if _encoding() is not None else "estimate",
+        "tokenizer_fallback": _fallback_reason,
+        "context_token_budget": CONTEXT_TOKEN_BUDGET,
+        "stages": prompt_token_stats.snapshot(),
+    }
@@ -0,0 +1,167 @@
+# In-process snapshot of the regulation chunks with an (article, paragraph) -> chunk index
+
+import os
+import threading
+
+METADATA_INDEX_ENABLED = os.getenv("METADATA_INDEX_ENABLED", "1") == "1"
+
+
+def reference_key(article, paragraph) -> tuple[int, str]:
+    """
+    Normalized (article number, paragraph number) key. Articles are stored as integers and
+    paragraphs as strings in the collection metadata.
+    """
+    return int(article), str(paragraph)
+
+
+def mention_pairs(mentions: dict) -> list[tuple[int, str]]:
+    """
+    Flatten an extraction result into (article, paragraph) keys, in mention order.
+
+    Args:
+        mentions (dict): Output of `extract_references` / `extract_articles_and_paragraphs`.
+
+    Returns:
+        list[tuple[int, str]]: The referenced (article, paragraph) keys.
+    """
+    pairs = []
+    for record in mentions["articles"]:
+        for para in record["paragraphs"]:
+            pairs.append(reference_key(record["article"], para))
+    return pairs
+
+
+def chunk_key(chunk: dict) -> tuple[str, int, str]:
+    """
+    Identity of a context chunk, its (regulation, article, paragraph), used to drop duplicates
+    between retrieval sources. The regulation is only set on chunks of routed searches
+    (see src/registry.py).
+    """
+    return (chunk.get("regulation", ""), *reference_key(chunk["article number"], chunk["paragraph number"]))
+
+
+def _chunk(document: str, metadata: dict) -> dict:
+    return {
+        "content": document,
+        "article number": metadata["article number"],
+        "paragraph number": metadata["paragraph number"]
+    }
+
+
+class Corpus:
+    """
+    Documents and metadata of a collection, indexed by (article number, paragraph number).
+
+    Args:
+        ids (list[str]): Chunk ids.
+        documents (list[str]): Chunk texts.
+        metadatas (list[dict]): Chunk metadata.
+    """
+
+    def __init__(self, ids: list[str], documents: list[str], metadatas: list[dict]):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.by_reference = {}
+        for index, metadata in enumerate(metadatas):
+            key = reference_key(metadata["article number"], metadata["paragraph number"])
+            self.by_reference.setdefault(key, []).append(index)
+
+    @classmethod
+    def from_collection(cls, collection) -> "Corpus":
+        records = collection.get(include=["documents", "metadatas"])
+        return cls(records["ids"], records["documents"], records["metadatas"])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def chunk(self, index: int) -> dict:
+        """
+        The chunk at `index` in the context format used by `get_relevant_context`.
+        """
+        return _chunk(self.documents[index], self.metadatas[index])
+
+    def lookup(self, pairs: list[tuple[int, str]]) -> list[dict]:
+        """
+        Chunks of the given (article, paragraph) keys, in key order.
+
+        Args:
+            pairs (list[tuple[int, str]]): Keys from `mention_pairs`.
+
+        Returns:
+            list[dict]: The matching chunks.
+        """
+        results = []
+        for key in pairs:
+            for index in self.by_reference.get(key, ()):
+                results.append(self.chunk(index))
+        return results
+
+
+# id(collection) -> (collection, Corpus). The entry holds the collection so that its id cannot
+# be reused by another object while the snapshot is cached; the registry drops the entry when
+# it evicts the collection.
+_corpora = {}
+_corpora_lock = threading.Lock()
+
+
+def load_corpus(vector_store) -> Corpus:
+    """
+    The corpus snapshot of a vector store's collection, loaded once.
+
+    Args:
+        vector_store: The vector store.
+
+    Returns:
+        Corpus: The shared snapshot.
+    """
+    collection = vector_store._collection
+    key = id(collection)
+    with _corpora_lock:
+        if key not in _corpora:
+            _corpora[key] = (collection, Corpus.from_collection(collection))
+        return _corpora[key][1]
+
+
+def invalidate_corpus(vector_store):
+    """
+    Drop the cached snapshot of a vector store's collection (e.g. after re-indexing).
+
+    Returns:
+        Corpus | None: The dropped snapshot, if there was one.
+    """
+    with _corpora_lock:
+        _, corpus = _corpora.pop(id(vector_store._collection), (None, None))
+        return corpus
+
+
+def batched_metadata_lookup(collection, pairs: list[tuple[int, str]]) -> list[dict]:
+    """
+    Fetch the chunks of many (article, paragraph) keys with a single metadata query.
+
+    Args:
+        collection: The Chroma collection.
+        pairs (list[tuple[int, str]]): Keys from `mention_pairs`.
+
+    Returns:
+        list[dict]: The matching chunks, in key order.
+    """
+    unique = list(dict.fromkeys(pairs))
+    if not unique:
+        return []
+    articles = sorted({article for article, _ in unique})
+    paragraphs = sorted({paragraph for _, paragraph in unique})
+    # Over-fetch with $in on both fields, then keep the exact pairs client-side
+    clauses = [
+        {"article number": {"$in": articles}},
+        {"paragraph number": {"$in": paragraphs}},
+    ]
+    res = collection.get(where={"$and": clauses}, include=["documents", "metadatas"])
+    by_reference = {}
+    for document, metadata in zip(res["documents"], res["metadatas"]):
+        key = reference_key(metadata["article number"], metadata["paragraph number"])
+        by_reference.setdefault(key, []).append(_chunk(document, metadata))
+    results = []
+    for key in pairs:
+        results.extend(by_reference.get(key, ()))
+    return results
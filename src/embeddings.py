@@ -0,0 +1,260 @@
+# Embedding service: micro-batched, memoized query embeddings on sentence-transformers or ONNX Runtime
+
+import os
+import json
+import time
+import queue
+import asyncio
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from .startup import lazy_import
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+# How long the worker waits for more queries after the first one of a batch, and the batch cap
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def normalize_text(text: str) -> str:
+    # Same normalization as the response cache keys (NFKC, collapsed whitespace); case is kept,
+    # the embedding model may be cased
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class OnnxEmbeddings:
+    """
+    Sentence-transformers model on ONNX Runtime: tokenizer, ONNX encoder, mean pooling and,
+    when the model's pipeline has it, L2 normalization. Same interface as HuggingFaceEmbeddings.
+
+    Args:
+        model_name (str): Hugging Face model id (e.g. sentence-transformers/all-MiniLM-L6-v2).
+        file_name (str): ONNX file in the model repository.
+    """
+
+    def __init__(self, model_name: str, file_name: str = EMBEDDING_ONNX_FILE):
+        hub = lazy_import("huggingface_hub")
+        tokenizers = lazy_import("tokenizers")
+        onnxruntime = lazy_import("onnxruntime")
+
+        def download(name):
+            return hub.hf_hub_download(model_name, name)
+
+        modules = json.loads(open(download("modules.json")).read())
+        self.normalize = any(module["type"].endswith("Normalize") for module in modules)
+        try:
+            max_length = json.loads(open(download("sentence_bert_config.json")).read())["max_seq_length"]
+        except Exception:
+            max_length = 256
+
+        self.tokenizer = tokenizers.Tokenizer.from_file(download("tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.session = onnxruntime.InferenceSession(download(file_name), providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(list(texts))
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: value for name, value in inputs.items() if name in self.input_names})[0]
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def load_embedding_model(model_name: str, backend: str = EMBEDDING_BACKEND):
+    """
+    Load an embedding model on the chosen backend.
+
+    Args:
+        model_name (str): Hugging Face model id.
+        backend (str): "torch" (sentence-transformers) or "onnx" (ONNX Runtime).
+
+    Returns:
+        An object with `embed_documents` and `embed_query`.
+    """
+    if backend == "onnx":
+        return OnnxEmbeddings(model_name)
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend!r}")
+    embeddings = lazy_import("langchain_community.embeddings")
+    return embeddings.HuggingFaceEmbeddings(model_name=model_name)
+
+
+class EmbeddingService:
+    """
+    Micro-batching, memoizing front of an embedding model with the LangChain `Embeddings`
+    interface, so it can be given to Chroma as its embedding function.
+
+    Args:
+        model: The embedding model (see `load_embedding_model`).
+        batch_window (float): Seconds to wait for more queries once one has arrived.
+        max_batch_size (int): Maximum texts per forward pass.
+        cache_size (int): Vectors kept in the LRU.
+    """
+
+    def __init__(self, model, batch_window: float = EMBEDDING_BATCH_WINDOW_MS / 1000,
+                 max_batch_size: int = EMBEDDING_MAX_BATCH, cache_size: int = EMBEDDING_CACHE_SIZE):
+        self.model = model
+        self.batch_window = batch_window
+        self.max_batch_size = max(max_batch_size, 1)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.requests = queue.SimpleQueue()
+        self.worker = None
+        self.last_batch_size = 0
+        self.counters = {"queries": 0, "documents": 0, "cache_hits": 0, "embedded": 0, "batches": 0,
+                         "forward_seconds": 0.0}
+        self.batch_sizes = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    # LRU of vectors by normalized text
+
+    def _cached(self, key: str):
+        with self.lock:
+            vector = self.cache.get(key)
+            if vector is not None:
+                self.cache.move_to_end(key)
+                self.counters["cache_hits"] += 1
+            return vector
+
+    def _remember(self, keys: list[str], vectors: list):
+        with self.lock:
+            for key, vector in zip(keys, vectors):
+                self.cache[key] = vector
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _forward(self, texts: list[str]) -> list:
+        started = time.perf_counter()
+        vectors = [tuple(vector) for vector in self.model.embed_documents(texts)]
+        seconds = time.perf_counter() - started
+        with self.lock:
+            self.counters["embedded"] += len(texts)
+            self.counters["batches"] += 1
+            self.counters["forward_seconds"] += seconds
+            bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if len(texts) <= bound),
+                          len(BATCH_SIZE_BUCKETS))
+            self.batch_sizes[bucket] += 1
+        self._remember(texts, vectors)
+        return vectors
+
+    # Micro-batching worker
+
+    def _start_worker(self):
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self.worker.start()
+
+    def _collect(self) -> list[tuple[str, Future]]:
+        batch = [self.requests.get()]
+        # A lone query after a lone query (low load) goes straight to the model; the window only
+        # applies once requests have been arriving together
+        window = self.batch_window if self.last_batch_size > 1 else 0.0
+        deadline = time.perf_counter() + window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Past the window, still take whatever queued up during the last forward pass
+                batch.append(self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        self.last_batch_size = len(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = {}
+            for key, future in batch:
+                futures.setdefault(key, []).append(future)
+            texts = list(futures)
+            try:
+                vectors = self._forward(texts)
+            except Exception as e:
+                for waiting in futures.values():
+                    for future in waiting:
+                        future.set_exception(e)
+                continue
+            for text, vector in zip(texts, vectors):
+                for future in futures[text]:
+                    future.set_result(vector)
+
+    def submit(self, text: str) -> Future:
+        """
+        Queue a query for the next batch.
+
+        Returns:
+            Future: Resolves to the vector (a tuple of floats).
+        """
+        key = normalize_text(text)
+        with self.lock:
+            self.counters["queries"] += 1
+        future = Future()
+        vector = self._cached(key)
+        if vector is not None:
+            future.set_result(vector)
+            return future
+        self._start_worker()
+        self.requests.put((key, future))
+        return future
+
+    # LangChain Embeddings interface
+
+    def embed_query(self, text: str) -> list[float]:
+        return list(self.submit(text).result())
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return list(await asyncio.wrap_future(self.submit(text)))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed texts that are already batched (ingestion, batch runs, scope examples): cached
+        ones are reused, the rest go to the model in one call, without waiting for the window.
+        """
+        keys = [normalize_text(text) for text in texts]
+        with self.lock:
+            self.counters["documents"] += len(keys)
+        vectors = {key: self._cached(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, vector in vectors.items() if vector is None]
+        for start in range(0, len(missing), self.max_batch_size):
+            chunk = missing[start:start + self.max_batch_size]
+            vectors.update(zip(chunk, self._forward(chunk)))
+        return [list(vectors[key]) for key in keys]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    def stats(self) -> dict:
+        """
+        Requests, cache hits, forward passes and their batch sizes.
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            sizes = dict(zip([*map(str, BATCH_SIZE_BUCKETS), f">{BATCH_SIZE_BUCKETS[-1]}"], self.batch_sizes))
+            stats["cached_vectors"] = len(self.cache)
+        requested = stats["queries"] + stats["documents"]
+        stats["batch_sizes"] = sizes
+        stats["average_batch_size"] = stats["embedded"] / stats["batches"] if stats["batches"] else 0.0
+        stats["cache_hit_rate"] = stats["cache_hits"] / requested if requested else 0.0
+        stats["texts_per_second"] = stats["embedded"] / stats["forward_seconds"] if stats["forward_seconds"] else 0.0
+        return stats
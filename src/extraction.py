@@ -1,41 +1,22 @@
 import os
 import json
-import yaml
-from pathlib import Path
 from .functions import compliance_classifier, scope_classifier_format
-from openai import OpenAI
-from dotenv import load_dotenv
+from .llm import DEFAULT_MODEL, prompts, create_response, acreate_response
+from .context import measure_prompt
+from .cache import response_cache, normalize_question
+from .references import parse_references
 
-load_dotenv()
+# Below this confidence the local reference parser defers to the LLM extractor
+REFERENCE_PARSER_MIN_CONFIDENCE = float(os.getenv("REFERENCE_PARSER_MIN_CONFIDENCE", "0.8"))
 
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-script_location = Path(__file__).absolute().parent
-file_location = script_location / 'prompts.yml'
-prompts = yaml.safe_load(file_location.read_text())
-
-
-client = OpenAI(
-  base_url="https://openrouter.ai/api/v1",
-  api_key=OPENROUTER_API_KEY,
-)
-
-
-def extract_articles_and_paragraphs(question: str) -> dict:
-    """
-    Extract relevant articles and paragraphs from the question.
-
-    Args:
-        question (str): The input question.
-
-    Returns:
-        dict: A dictionary containing the extracted articles and paragraphs.
-    """
+def _extractor_request(question: str) -> dict:
     system_prompt = prompts["prompts"]["extractor"]["system_prompt"]
-    user_prompt = prompts["prompts"]["extractor"]["user_prompt"]
+    user_prompt = prompts["prompts"]["extractor"]["user_prompt"].replace("{{ document_text }}", question)
+    measure_prompt("extractor", system=system_prompt, user=user_prompt)
 
-    response = client.responses.create(
-        model="openai/gpt-oss-20b:free",
+    return dict(
+        model=DEFAULT_MODEL,
         input=[
                 # Define the system prompt
                 {
@@ -44,32 +25,21 @@ def extract_articles_and_paragraphs(question: str) -> dict:
                 },
                 {
                     "role": "user",
-                    "content": user_prompt.replace("{{ document_text }}", question)
+                    "content": user_prompt
                 }
                 ],
         extra_body={"reasoning": {"enabled": True}},
         text = compliance_classifier
     )
 
-    response_dict = json.loads(response.output_text)
-    return response_dict
-
-
-def extract_qa_scope(question: str) -> bool:
-    """
-    Extract relevant sectors from the question.
 
-    Args:
-        question (str): The input question.
-
-    Returns:
-        bool: True if the question is within scope, False otherwise.
-    """
+def _scope_request(question: str) -> dict:
     system_prompt = prompts["prompts"]["scope_classifier"]["system_prompt"]
-    user_prompt = prompts["prompts"]["scope_classifier"]["user_prompt"]
+    user_prompt = prompts["prompts"]["scope_classifier"]["user_prompt"].replace("{{ user_input }}", question)
+    measure_prompt("scope_classifier", system=system_prompt, user=user_prompt)
 
-    response = client.responses.create(
-        model="openai/gpt-oss-20b:free",
+    return dict(
+        model=DEFAULT_MODEL,
         input=[
                 {
                     "role": "system",
@@ -77,13 +47,93 @@ def extract_qa_scope(question: str) -> bool:
                 },
                 {
                     "role": "user",
-                    "content": user_prompt.replace("{{ user_input }}", question)
+                    "content": user_prompt
                 }
                 ],
         extra_body={"reasoning": {"enabled": True}},
         text = scope_classifier_format
     )
 
+
+@response_cache.memoize("extractor", normalize=normalize_question)
+def extract_articles_and_paragraphs(question: str) -> dict:
+    """
+    Extract relevant articles and paragraphs from the question.
+
+    Args:
+        question (str): The input question.
+
+    Returns:
+        dict: A dictionary containing the extracted articles and paragraphs.
+    """
+    response = create_response(**_extractor_request(question))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict
+
+
+@response_cache.memoize("extractor", normalize=normalize_question)
+async def aextract_articles_and_paragraphs(question: str) -> dict:
+    """
+    Async version of `extract_articles_and_paragraphs`.
+    """
+    response = await acreate_response(**_extractor_request(question))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict
+
+
+def extract_references(question: str) -> dict:
+    """
+    Extract the articles and paragraphs referenced in the question, using the local parser and
+    falling back to the LLM extractor only when the parser is not confident.
+
+    Args:
+        question (str): The input question.
+
+    Returns:
+        dict: A dictionary containing the extracted articles and paragraphs.
+    """
+    result, confidence = parse_references(question)
+    if confidence >= REFERENCE_PARSER_MIN_CONFIDENCE:
+        return result
+    return extract_articles_and_paragraphs(question)
+
+
+async def aextract_references(question: str) -> dict:
+    """
+    Async version of `extract_references`.
+    """
+    result, confidence = parse_references(question)
+    if confidence >= REFERENCE_PARSER_MIN_CONFIDENCE:
+        return result
+    return await aextract_articles_and_paragraphs(question)
+
+
+@response_cache.memoize("scope_classifier", normalize=normalize_question)
+def extract_qa_scope(question: str) -> bool:
+    """
+    Extract relevant sectors from the question.
+
+    Args:
+        question (str): The input question.
+
+    Returns:
+        bool: True if the question is within scope, False otherwise.
+    """
+    response = create_response(**_scope_request(question))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict["value"]
+
+
+@response_cache.memoize("scope_classifier", normalize=normalize_question)
+async def aextract_qa_scope(question: str) -> bool:
+    """
+    Async version of `extract_qa_scope`.
+    """
+    response = await acreate_response(**_scope_request(question))
+
     response_dict = json.loads(response.output_text)
     return response_dict["value"]
 
@@ -111,7 +111,8 @@ response_with_citations_schema = {
         "properties": {
           "article": { "type": "integer", "minimum": 1 },
           "paragraph": { "type": "integer", "minimum": 1 },
-          "text": { "type": "string" }
+          "text": { "type": "string" },
+          "regulation": { "type": "string" }
         },
         "required": ["article", "paragraph", "text"],
         "additionalProperties": False
@@ -142,3 +143,17 @@ conversation_summary_format = {
     }
   }
 }
+
+paragraph_summary_format = {
+  "format": {
+    "type": "json_schema",
+    "name": "paragraph_summary_only",
+    "strict": True,
+    "schema": {
+      "type": "object",
+      "properties": {"summary": {"type": "string"}},
+      "required": ["summary"],
+      "additionalProperties": False
+    }
+  }
+}
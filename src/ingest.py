@@ -0,0 +1,293 @@
+# Ingestion: regulation PDF -> article / paragraph chunks -> embeddings -> Chroma
+#   python -m src.ingest "docs/Personal Data English V2-23April2023- Reviewed-.pdf" --version-date 27/03/2023
+
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from langchain_core.documents import Document
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_chroma.vectorstores import Chroma
+from langchain_graph_retriever.transformers import ShreddingTransformer
+from .embeddings import EMBEDDING_BACKEND, load_embedding_model
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+COLLECTION_NAME = "Personal_Data_Protection_Law_en"
+PERSIST_DIRECTORY = "./chroma_langchain_db"
+# Minimum TF-IDF cosine similarity between a paragraph and a sector profile to tag the sector
+SECTOR_THRESHOLD = float(os.getenv("SECTOR_THRESHOLD", "0.01"))
+
+ARTICLE_SPLIT = re.compile(r"(?i)(?=\bArticle\s+\d+\b)")
+ARTICLE_HEADER = re.compile(r"(?i)\s*Article\s+(\d+)\b")
+PARAGRAPH_SPLIT = re.compile(r"(?=\b\d+\s*-\s*)")
+PARAGRAPH_NUMBER = re.compile(r"\s*(\d+)\s*-")
+
+SECTOR_PROFILES = {
+    "Government & Public Sector": [
+        "public entity", "competent authority", "ministry", "council of ministers",
+        "public authority", "government", "regulator", "public institution"
+    ],
+    "Health & Medical Services": [
+        "health", "medical records", "patient", "health services", "telemedicine", "clinical"
+    ],
+    "Finance & Banking": [
+        "bank", "credit", "credit bureau", "central bank", "loan", "financial institution", "payment"
+    ],
+    "Telecommunications & Digital Infrastructure": [
+        "telecom", "internet service provider", "isp", "network", "communications", "digital identity"
+    ],
+    "Cybersecurity & National Security": [
+        "cybersecurity", "encryption", "security breach", "national cybersecurity authority", "incident response"
+    ],
+    "Research, Education & Statistics": [
+        "research", "study", "statistics", "anonymized", "academic", "university", "student"
+    ],
+}
+
+
+def stream_pages(file_path: str):
+    """
+    Yield the text of each page of a PDF, one page at a time.
+    """
+    for page in PyPDFLoader(file_path).lazy_load():
+        yield page.page_content
+
+
+def split_articles(pages):
+    """
+    Split streamed page texts at each "Article N" header. An article is emitted as soon as the
+    next header is seen, so only the article in progress is held in memory.
+
+    Args:
+        pages: Iterable of page texts, in order.
+
+    Yields:
+        str: The text before the first article (the regulation title), then each article.
+    """
+    buffer = ""
+    preamble = True
+    for page in pages:
+        parts = ARTICLE_SPLIT.split(buffer + page)
+        # The last part may continue on the next page (or be a header cut in two)
+        for part in parts[:-1]:
+            # A buffer starting with a header splits off an empty part
+            if part or preamble:
+                yield part
+                preamble = False
+        buffer = parts[-1]
+    yield buffer
+
+
+def split_paragraphs(article: str) -> list[tuple[str, str]]:
+    """
+    Split an article into its numbered paragraphs ("1-...", "2 - ...").
+
+    Args:
+        article (str): The article text, starting with its header.
+
+    Returns:
+        list[tuple[str, str]]: (paragraph number, text) pairs. The header and any text before
+            the first numbered paragraph have paragraph number "".
+    """
+    paragraphs = []
+    for paragraph in PARAGRAPH_SPLIT.split(article):
+        text = paragraph.strip()
+        if not text:
+            continue
+        number = PARAGRAPH_NUMBER.match(text)
+        paragraphs.append((number.group(1) if number else "", text))
+    return paragraphs
+
+
+def tag_sectors(texts: list[str], threshold: float = SECTOR_THRESHOLD) -> list[list[str]]:
+    """
+    Tag texts with the sectors they relate to, by TF-IDF cosine similarity against a keyword
+    profile of each sector.
+
+    Args:
+        texts (list[str]): The texts to tag; the TF-IDF vocabulary is fitted on them together
+            with the sector profiles.
+        threshold (float): Minimum similarity to tag a sector.
+
+    Returns:
+        list[list[str]]: Sectors of each text, most similar first.
+    """
+    labels = list(SECTOR_PROFILES)
+    # Keywords are repeated to give them some weight relative to long articles
+    profiles = [f"{label} " + " ".join(keywords) + " " + " ".join(keywords)
+                for label, keywords in SECTOR_PROFILES.items()]
+
+    vectorizer = TfidfVectorizer(stop_words="english", ngram_range=(1, 2), max_df=0.95, min_df=1)
+    matrix = vectorizer.fit_transform(profiles + texts)
+    similarities = cosine_similarity(matrix[len(profiles):], matrix[:len(profiles)])
+
+    sectors = []
+    for row in similarities:
+        order = np.argsort(-row, kind="stable")
+        sectors.append([labels[i] for i in order if row[i] >= threshold])
+    return sectors
+
+
+def chunk_documents(pages, version_date: str, language: str = "English",
+                    regulation_name: str = None) -> list[Document]:
+    """
+    Chunk a regulation into one document per article header and paragraph, with the metadata
+    the retrieval code expects.
+
+    Args:
+        pages: Iterable of page texts, in order.
+        version_date (str): Version date of the regulation text.
+        language (str): Language of the text.
+        regulation_name (str): Regulation name; defaults to the text before the first article.
+
+    Returns:
+        list[Document]: The chunks, with the "sector" list shredded into metadata keys.
+    """
+    preamble, *articles = split_articles(pages)
+    regulation_name = regulation_name or preamble.strip()
+    # Sectors are tagged per article; IDF needs the whole text, which is small next to the embeddings
+    sectors = tag_sectors([preamble] + articles)[1:]
+
+    documents = []
+    for article, article_sectors in zip(articles, sectors):
+        article_number = int(ARTICLE_HEADER.match(article).group(1))
+        for paragraph_number, text in split_paragraphs(article):
+            documents.append(Document(
+                page_content=text,
+                metadata={
+                    "regulation name": regulation_name,
+                    "article number": article_number,
+                    "paragraph number": paragraph_number,
+                    "version date": version_date,
+                    "language": language,
+                    "sector": article_sectors,
+                },
+            ))
+    return list(ShreddingTransformer().transform_documents(documents))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(document: Document) -> str:
+    """
+    Content-addressed id of a chunk: the same text at the same (article, paragraph) keeps its id
+    across versions of the law.
+    """
+    metadata = document.metadata
+    return content_hash(f"{metadata['article number']}|{metadata['paragraph number']}|{document.page_content}")
+
+
+def _batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def ingest(documents: list[Document], vector_store, batch_size: int = INGEST_BATCH_SIZE) -> dict:
+    """
+    Bring a collection in line with `documents`, embedding only text it has not seen before.
+
+    - same id and metadata: skipped
+    - same id, new metadata: metadata updated, no embedding
+    - new id whose text is already in the collection (e.g. a renumbered paragraph): the
+      stored embedding is reused
+    - new text: embedded, `batch_size` chunks per call
+    - ids no longer in `documents`: deleted
+
+    Args:
+        documents (list[Document]): Chunks from `chunk_documents`.
+        vector_store: The Chroma vector store to update.
+        batch_size (int): Chunks per embedding call and per write.
+
+    Returns:
+        dict: Counts per outcome, timings and throughput (chunks per second).
+    """
+    started = time.perf_counter()
+    collection = vector_store._collection
+    existing = collection.get(include=["documents", "metadatas", "embeddings"])
+    stored = dict(zip(existing["ids"], existing["metadatas"]))
+    embeddings_by_text = {content_hash(text): embedding
+                          for text, embedding in zip(existing["documents"], existing["embeddings"])}
+
+    records = {chunk_id(document): document for document in documents}
+    metadata_updates = [(id_, document) for id_, document in records.items()
+                        if id_ in stored and stored[id_] != document.metadata]
+    new = [(id_, document) for id_, document in records.items() if id_ not in stored]
+    reused = [(id_, document) for id_, document in new if content_hash(document.page_content) in embeddings_by_text]
+    to_embed = [(id_, document) for id_, document in new if content_hash(document.page_content) not in embeddings_by_text]
+    stale = [id_ for id_ in stored if id_ not in records]
+
+    def upsert(batch, embeddings):
+        collection.upsert(
+            ids=[id_ for id_, _ in batch],
+            embeddings=embeddings,
+            documents=[document.page_content for _, document in batch],
+            metadatas=[document.metadata for _, document in batch],
+        )
+
+    embed_seconds = 0.0
+    for batch in _batches(to_embed, batch_size):
+        embed_started = time.perf_counter()
+        embeddings = vector_store.embeddings.embed_documents([document.page_content for _, document in batch])
+        embed_seconds += time.perf_counter() - embed_started
+        # Written batch by batch, so an interrupted run keeps what it has embedded
+        upsert(batch, embeddings)
+    for batch in _batches(reused, batch_size):
+        upsert(batch, [embeddings_by_text[content_hash(document.page_content)] for _, document in batch])
+    for batch in _batches(metadata_updates, batch_size):
+        collection.update(ids=[id_ for id_, _ in batch], metadatas=[document.metadata for _, document in batch])
+    for batch in _batches(stale, batch_size):
+        collection.delete(ids=batch)
+
+    seconds = time.perf_counter() - started
+    return {
+        "chunks": len(records),
+        "unchanged": len(records) - len(new) - len(metadata_updates),
+        "metadata_updated": len(metadata_updates),
+        "reused_embeddings": len(reused),
+        "embedded": len(to_embed),
+        "deleted": len(stale),
+        "seconds": seconds,
+        "embed_seconds": embed_seconds,
+        "chunks_per_second": len(records) / seconds if seconds else 0.0,
+        "embedded_chunks_per_second": len(to_embed) / embed_seconds if embed_seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk, embed and index a regulation PDF")
+    parser.add_argument("pdf", help="The regulation PDF")
+    parser.add_argument("--version-date", required=True, help="Version date of the regulation text, e.g. 27/03/2023")
+    parser.add_argument("--language", default="English", help="Language of the text")
+    parser.add_argument("--regulation-name", default=None, help="Defaults to the text before the first article")
+    parser.add_argument("--collection", default=COLLECTION_NAME, help="Chroma collection name")
+    parser.add_argument("--persist-directory", default=PERSIST_DIRECTORY, help="Chroma directory")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="Embedding model")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=["torch", "onnx"],
+                        help="Embedding backend (use the one the app will query with)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Chunks per embedding call")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    documents = chunk_documents(stream_pages(args.pdf), args.version_date, args.language, args.regulation_name)
+    chunk_seconds = time.perf_counter() - started
+
+    vector_store = Chroma(
+        embedding_function=load_embedding_model(args.model, args.backend),
+        collection_name=args.collection,
+        persist_directory=args.persist_directory,
+    )
+    report = ingest(documents, vector_store, args.batch_size)
+    report["chunk_seconds"] = chunk_seconds
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,52 @@
 # Handle language classification and translation tasks
 
 import os
+import re
 import json
-import yaml
-from pathlib import Path
 from .functions import translation_format
-from openai import OpenAI
-from dotenv import load_dotenv
+from .llm import DEFAULT_MODEL, prompts, create_response, acreate_response, stream_response, astream_response
+from .context import measure_prompt
+from .cache import response_cache, normalize_text
+from .streaming import stream_json_field, astream_json_field
 
-load_dotenv()
+# "translate": Arabic questions are translated to English for the answer prompt and the English
+# answer is translated back (two extra LLM calls per turn).
+# "direct": the question is answered as asked, with query_response writing the answer in the
+# user's language; the back-translation only runs if the answer comes back in another language.
+ANSWER_LANGUAGE_MODE = os.getenv("ANSWER_LANGUAGE_MODE", "translate")
 
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+ARABIC_SCRIPT = re.compile(r"[\u0600-\u06FF]")
 
-script_location = Path(__file__).absolute().parent
-file_location = script_location / 'prompts.yml'
-prompts = yaml.safe_load(file_location.read_text())
 
+def answers_directly(language: str) -> bool:
+    """
+    Whether questions in `language` are answered in that language by `query_response` instead
+    of going through English and translation.
+    """
+    return language != "English" and ANSWER_LANGUAGE_MODE == "direct"
 
-client = OpenAI(
-  base_url="https://openrouter.ai/api/v1",
-  api_key=OPENROUTER_API_KEY,
-)
 
-def arabic_to_english_translation(text: str) -> str:
+def answer_language(language: str) -> str:
     """
-    Translate Arabic text to English.
+    The language `query_response` should write the answer in for a user writing in `language`.
+    """
+    return language if answers_directly(language) else "English"
 
-    Args:
-        text (str): The input Arabic text.
 
-    Returns:
-        str: The translated English text.
+def needs_translation(text: str, language: str) -> bool:
     """
+    Whether an answer still has to be translated for a user writing in `language`.
+    """
+    return language == "Arabic" and not ARABIC_SCRIPT.search(text)
+
+
+def _ar_en_request(text: str) -> dict:
     system_prompt = prompts["prompts"]["translate_ar_en"]["system_prompt"]
-    user_prompt = prompts["prompts"]["translate_ar_en"]["user_prompt"]
+    user_prompt = prompts["prompts"]["translate_ar_en"]["user_prompt"].replace("{{ arabic_text }}", text)
+    measure_prompt("translate_ar_en", system=system_prompt, user=user_prompt)
 
-    response = client.responses.create(
-        model="openai/gpt-oss-20b:free",
+    return dict(
+        model=DEFAULT_MODEL,
         input=[
                 {
                     "role": "system",
@@ -44,31 +54,20 @@ def arabic_to_english_translation(text: str) -> str:
                 },
                 {
                     "role": "user",
-                    "content": user_prompt.replace("{{ arabic_text }}", text)
+                    "content": user_prompt
                 }
             ],
         # extra_body={"reasoning": {"enabled": True}},
         text = translation_format
     )
 
-    response_dict = json.loads(response.output_text)
-    return response_dict
-
-def english_to_arabic_translation(text: str) -> str:
-    """
-    Translate English text to Arabic.
-
-    Args:
-        text (str): The input English text.
-
-    Returns:
-        str: The translated Arabic text.
-    """
+def _en_ar_request(text: str) -> dict:
     system_prompt = prompts["prompts"]["translate_en_ar"]["system_prompt"]
-    user_prompt = prompts["prompts"]["translate_en_ar"]["user_prompt"]
+    user_prompt = prompts["prompts"]["translate_en_ar"]["user_prompt"].replace("{{ english_text }}", text)
+    measure_prompt("translate_en_ar", system=system_prompt, user=user_prompt)
 
-    response = client.responses.create(
-        model="openai/gpt-oss-20b:free",
+    return dict(
+        model=DEFAULT_MODEL,
         input=[
                 {
                     "role": "system",
@@ -76,16 +75,102 @@ def english_to_arabic_translation(text: str) -> str:
                 },
                 {
                     "role": "user",
-                    "content": user_prompt.replace("{{ english_text }}", text)
+                    "content": user_prompt
                 }
             ],
         # extra_body={"reasoning": {"enabled": True}},
         text = translation_format
     )
 
+@response_cache.memoize("translate_ar_en")
+def arabic_to_english_translation(text: str) -> str:
+    """
+    Translate Arabic text to English.
+
+    Args:
+        text (str): The input Arabic text.
+
+    Returns:
+        str: The translated English text.
+    """
+    response = create_response(**_ar_en_request(text))
+
     response_dict = json.loads(response.output_text)
     return response_dict
 
+@response_cache.memoize("translate_ar_en")
+async def aarabic_to_english_translation(text: str) -> str:
+    """
+    Async version of `arabic_to_english_translation`.
+    """
+    response = await acreate_response(**_ar_en_request(text))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict
+
+@response_cache.memoize("translate_en_ar")
+def english_to_arabic_translation(text: str) -> str:
+    """
+    Translate English text to Arabic.
+
+    Args:
+        text (str): The input English text.
+
+    Returns:
+        str: The translated Arabic text.
+    """
+    response = create_response(**_en_ar_request(text))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict
+
+@response_cache.memoize("translate_en_ar")
+async def aenglish_to_arabic_translation(text: str) -> str:
+    """
+    Async version of `english_to_arabic_translation`.
+    """
+    response = await acreate_response(**_en_ar_request(text))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict
+
+def stream_english_to_arabic_translation(text: str):
+    """
+    Streaming version of `english_to_arabic_translation`, sharing its cache.
+
+    Args:
+        text (str): The input English text.
+
+    Yields:
+        dict: {"type": "delta", "text": ...} pieces of the translation, then
+            {"type": "response", "response": {"translation": ...}}.
+    """
+    key = response_cache.make_key("translate_en_ar", [normalize_text(text)])
+    hit, value = response_cache.get("translate_en_ar", key)
+    if hit:
+        yield {"type": "delta", "text": value["translation"]}
+        yield {"type": "response", "response": value}
+        return
+    for event in stream_json_field(stream_response(**_en_ar_request(text)), "translation"):
+        if event["type"] == "response":
+            response_cache.set("translate_en_ar", key, event["response"])
+        yield event
+
+async def astream_english_to_arabic_translation(text: str):
+    """
+    Async version of `stream_english_to_arabic_translation`.
+    """
+    key = response_cache.make_key("translate_en_ar", [normalize_text(text)])
+    hit, value = await response_cache.aget("translate_en_ar", key)
+    if hit:
+        yield {"type": "delta", "text": value["translation"]}
+        yield {"type": "response", "response": value}
+        return
+    async for event in astream_json_field(astream_response(**_en_ar_request(text)), "translation"):
+        if event["type"] == "response":
+            await response_cache.aset("translate_en_ar", key, event["response"])
+        yield event
+
 if __name__ == "__main__":
     # arabic_text = "ما الأحكام الواردة في قانون حماية البيانات الشخصية بشأن حقوق صاحب البيانات في الوصول إلى بياناته الشخصية؟ بالنظر إلى المادة 1 (الفقرات 4 و5 و6) ما الذي تستخلصه؟ وبالنسبة للفقرة 6 من المادة 23، ماذا تتضمن بالضبط؟"
     # translation = arabic_to_english_translation(arabic_text)
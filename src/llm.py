@@ -0,0 +1,417 @@
+# LLM gateway: pooled clients, per-model rate limits, retries and metrics for every OpenRouter call
+
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+import yaml
+import httpx
+import openai
+from pathlib import Path
+from email.utils import parsedate_to_datetime
+from openai import OpenAI, AsyncOpenAI
+from dotenv import load_dotenv
+from .tracing import record_llm_call
+
+load_dotenv()
+
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+DEFAULT_MODEL = "openai/gpt-oss-20b:free"
+
+# Maximum number of LLM requests in flight at once (per event loop / per process for sync callers)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+# HTTP connection pool size and request timeout (seconds)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "32"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+# Retry policy
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+
+# Rate limits in requests per minute, e.g. "openai/gpt-oss-20b:free=20,openai/gpt-4o=600".
+# Models not listed use LLM_FREE_TIER_RPM if they are on the ":free" tier, otherwise no limit.
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+LLM_FREE_TIER_RPM = float(os.getenv("LLM_FREE_TIER_RPM", "20"))
+LLM_RATE_BURST = float(os.getenv("LLM_RATE_BURST", "5"))
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+script_location = Path(__file__).absolute().parent
+file_location = script_location / 'prompts.yml'
+prompts = yaml.safe_load(file_location.read_text())
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `reserve` takes a token immediately (the balance may go negative)
+    and returns how long the caller has to wait before using it, so sync and async callers can
+    share one bucket and still be served in arrival order.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens (burst size).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+def _parse_rate_limits(spec: str) -> dict:
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, rpm = item.rsplit("=", 1)
+            limits[model.strip()] = float(rpm)
+    return limits
+
+
+_rate_limits = _parse_rate_limits(LLM_RATE_LIMITS)
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def _bucket(model: str):
+    with _buckets_lock:
+        if model not in _buckets:
+            rpm = _rate_limits.get(model)
+            if rpm is None and model.endswith(":free"):
+                rpm = LLM_FREE_TIER_RPM
+            _buckets[model] = TokenBucket(rpm / 60.0, LLM_RATE_BURST) if rpm else None
+        return _buckets[model]
+
+
+class GatewayMetrics:
+    """
+    Per-model counters for the gateway. Queue time covers waiting for a concurrency slot and
+    for the rate limiter (including backoff between retries); request time covers the HTTP calls.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.models = {}
+
+    def record(self, model: str, queue_seconds: float, request_seconds: float, attempts: int, ok: bool,
+               input_tokens: int = 0, output_tokens: int = 0):
+        with self.lock:
+            stats = self.models.setdefault(model, {
+                "requests": 0,
+                "failures": 0,
+                "retries": 0,
+                "queue_seconds": 0.0,
+                "request_seconds": 0.0,
+                "max_queue_seconds": 0.0,
+                "max_request_seconds": 0.0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+            })
+            stats["requests"] += 1
+            stats["failures"] += 0 if ok else 1
+            stats["retries"] += attempts - 1
+            stats["queue_seconds"] += queue_seconds
+            stats["request_seconds"] += request_seconds
+            stats["max_queue_seconds"] = max(stats["max_queue_seconds"], queue_seconds)
+            stats["max_request_seconds"] = max(stats["max_request_seconds"], request_seconds)
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+        # Also attributed to the pipeline stage (span) that made the call
+        record_llm_call(model, queue_seconds, input_tokens, output_tokens)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            snapshot = {}
+            for model, stats in self.models.items():
+                stats = dict(stats)
+                stats["avg_queue_seconds"] = stats["queue_seconds"] / stats["requests"]
+                stats["avg_request_seconds"] = stats["request_seconds"] / stats["requests"]
+                snapshot[model] = stats
+            return snapshot
+
+
+metrics = GatewayMetrics()
+
+
+def get_metrics() -> dict:
+    """
+    Get a snapshot of the gateway metrics.
+
+    Returns:
+        dict: Per-model request counts, retries, failures, tokens and queue vs request time.
+    """
+    return metrics.snapshot()
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+# Retries are handled by the gateway, so the SDK's own retry loop is disabled
+client = OpenAI(
+    base_url=OPENROUTER_BASE_URL,
+    api_key=OPENROUTER_API_KEY,
+    max_retries=0,
+    http_client=httpx.Client(limits=_http_limits(), timeout=LLM_TIMEOUT),
+)
+_sync_semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+# httpx connections and asyncio semaphores are bound to the event loop that created them,
+# so keep one client / semaphore pair per running loop.
+_loop_state = weakref.WeakKeyDictionary()
+
+
+def _state() -> tuple[AsyncOpenAI, asyncio.Semaphore]:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        async_client = AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=OPENROUTER_API_KEY,
+            max_retries=0,
+            http_client=httpx.AsyncClient(limits=_http_limits(), timeout=LLM_TIMEOUT),
+        )
+        state = (async_client, asyncio.Semaphore(LLM_MAX_CONCURRENCY))
+        _loop_state[loop] = state
+    return state
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Get the pooled AsyncOpenAI client of the running event loop.
+
+    Returns:
+        AsyncOpenAI: The shared client.
+    """
+    return _state()[0]
+
+
+def _retry_after(error: Exception):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def _backoff(attempt: int, error: Exception) -> float:
+    # Full jitter, but never retry sooner than the server asked us to
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, LLM_BACKOFF_MAX))
+    return delay
+
+
+def _usage(response) -> tuple[int, int]:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0
+    return getattr(usage, "input_tokens", 0) or 0, getattr(usage, "output_tokens", 0) or 0
+
+
+class _Call:
+    """
+    Queue/request timings, attempts and metrics of one gateway request, shared by the sync and
+    async paths, which only differ in how they wait.
+    """
+
+    def __init__(self, request: dict):
+        self.model = request.get("model", DEFAULT_MODEL)
+        self.bucket = _bucket(self.model)
+        self.queue_seconds = 0.0
+        self.request_seconds = 0.0
+        self.attempt = 0
+        self.queued = time.perf_counter()
+        self.started = None
+
+    def throttle(self) -> float:
+        # Seconds to wait for the model's rate limit
+        return self.bucket.reserve() if self.bucket is not None else 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.queue_seconds += self.started - self.queued
+
+    def retry_delay(self, error: Exception):
+        """
+        Seconds to wait before retrying after `error`, or None (with the failure recorded) if
+        the request should not be retried.
+        """
+        self.request_seconds += time.perf_counter() - self.started
+        if self.attempt >= LLM_MAX_RETRIES or not _is_retryable(error):
+            metrics.record(self.model, self.queue_seconds, self.request_seconds, self.attempt + 1, ok=False)
+            return None
+        self.queued = time.perf_counter()
+        delay = _backoff(self.attempt, error)
+        self.attempt += 1
+        return delay
+
+    def finish(self, ok: bool, input_tokens: int = 0, output_tokens: int = 0):
+        self.request_seconds += time.perf_counter() - self.started
+        metrics.record(self.model, self.queue_seconds, self.request_seconds, self.attempt + 1, ok=ok,
+                       input_tokens=input_tokens, output_tokens=output_tokens)
+
+
+def create_response(**request):
+    """
+    Send a Responses API request through the gateway.
+
+    Args:
+        **request: Keyword arguments for `client.responses.create`.
+
+    Returns:
+        The Responses API response.
+    """
+    call = _Call(request)
+    with _sync_semaphore:
+        while True:
+            time.sleep(call.throttle())
+            call.start()
+            try:
+                response = client.responses.create(**request)
+            except Exception as e:
+                delay = call.retry_delay(e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            call.finish(True, *_usage(response))
+            return response
+
+
+async def acreate_response(**request):
+    """
+    Async version of `create_response`.
+    """
+    call = _Call(request)
+    async_client, semaphore = _state()
+    async with semaphore:
+        while True:
+            await asyncio.sleep(call.throttle())
+            call.start()
+            try:
+                response = await async_client.responses.create(**request)
+            except Exception as e:
+                delay = call.retry_delay(e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            call.finish(True, *_usage(response))
+            return response
+
+
+def stream_response(**request):
+    """
+    Send a streaming Responses API request through the gateway.
+
+    The request is retried like `create_response` until the stream is opened; once events
+    start arriving a failure is raised to the caller.
+
+    Args:
+        **request: Keyword arguments for `client.responses.create` (without `stream`).
+
+    Yields:
+        The Responses API stream events.
+    """
+    call = _Call(request)
+    with _sync_semaphore:
+        while True:
+            time.sleep(call.throttle())
+            call.start()
+            try:
+                stream = client.responses.create(stream=True, **request)
+                break
+            except Exception as e:
+                delay = call.retry_delay(e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+        usage = (0, 0)
+        ok = False
+        try:
+            with stream:
+                for event in stream:
+                    if event.type == "response.completed":
+                        usage = _usage(event.response)
+                    yield event
+            ok = True
+        finally:
+            call.finish(ok, *usage)
+
+
+async def astream_response(**request):
+    """
+    Async version of `stream_response`.
+    """
+    call = _Call(request)
+    async_client, semaphore = _state()
+    async with semaphore:
+        while True:
+            await asyncio.sleep(call.throttle())
+            call.start()
+            try:
+                stream = await async_client.responses.create(stream=True, **request)
+                break
+            except Exception as e:
+                delay = call.retry_delay(e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+        usage = (0, 0)
+        ok = False
+        try:
+            async with stream:
+                async for event in stream:
+                    if event.type == "response.completed":
+                        usage = _usage(event.response)
+                    yield event
+            ok = True
+        finally:
+            call.finish(ok, *usage)
@@ -0,0 +1,101 @@
+# In-memory brute-force vector store over a snapshot of a Chroma collection
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class InMemoryVectorStore:
+    """
+    Exact nearest-neighbour search over all embeddings of a collection, held in memory.
+
+    Exposes the subset of the LangChain `Chroma` interface used by this project
+    (`similarity_search`, `similarity_search_by_vector`, `similarity_search_with_score`,
+    `embeddings` and `_collection`), so it can be passed anywhere a `vector_store` is expected.
+
+    Args:
+        embedding: The LangChain embedding model used for queries.
+        ids (list[str]): Chunk ids.
+        documents (list[str]): Chunk texts.
+        metadatas (list[dict]): Chunk metadata.
+        vectors: Chunk embeddings, shape (n, dim).
+        collection: The underlying Chroma collection (used for metadata lookups and fingerprints).
+    """
+
+    def __init__(self, embedding, ids: list[str], documents: list[str], metadatas: list[dict], vectors,
+                 collection=None):
+        self._embedding = embedding
+        self._collection = collection
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+        self.square_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+
+    @classmethod
+    def from_chroma(cls, chroma_store) -> "InMemoryVectorStore":
+        """
+        Snapshot a LangChain `Chroma` store.
+
+        Args:
+            chroma_store: The Chroma vector store.
+
+        Returns:
+            InMemoryVectorStore: The in-memory store.
+        """
+        collection = chroma_store._collection
+        records = collection.get(include=["embeddings", "documents", "metadatas"])
+        return cls(
+            embedding=chroma_store.embeddings,
+            ids=records["ids"],
+            documents=records["documents"],
+            metadatas=records["metadatas"],
+            vectors=records["embeddings"],
+            collection=collection,
+        )
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _top_k(self, embedding, k: int) -> tuple[np.ndarray, np.ndarray]:
+        query = np.asarray(embedding, dtype=np.float32)
+        # Squared L2 distance (the collection's space), expanded so the work is one mat-vec
+        distances = self.square_norms - 2.0 * (self.matrix @ query) + float(query @ query)
+        k = min(k, len(distances))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if k < len(distances):
+            candidates = np.argpartition(distances, k - 1)[:k]
+        else:
+            candidates = np.arange(len(distances))
+        order = candidates[np.argsort(distances[candidates], kind="stable")]
+        return order, distances[order]
+
+    def _document(self, index: int) -> Document:
+        return Document(page_content=self.documents[index], metadata=self.metadatas[index], id=self.ids[index])
+
+    def similarity_search_by_vector_with_score(self, embedding, k: int = 4) -> list[tuple[Document, float]]:
+        order, distances = self._top_k(embedding, k)
+        return [(self._document(int(index)), float(distance)) for index, distance in zip(order, distances)]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs) -> list[Document]:
+        """
+        Return the `k` chunks closest to an embedding.
+        """
+        order, _ = self._top_k(embedding, k)
+        return [self._document(int(index)) for index in order]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        """
+        Return the `k` chunks closest to a query, with their squared L2 distances.
+        """
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        """
+        Return the `k` chunks closest to a query.
+        """
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k)
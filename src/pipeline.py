@@ -0,0 +1,204 @@
+# Dependency-graph orchestrator for the LLM / retrieval stages of a turn
+
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .tracing import span
+
+
+class Stage:
+    """
+    A single node of a pipeline.
+
+    Args:
+        name (str): Name of the stage; its result is stored under this key.
+        func (callable): Called with the results of `requires` as keyword arguments.
+        requires (tuple[str]): Names of pipeline inputs or other stages this stage depends on.
+        when (callable, optional): Predicate called with the same keyword arguments as `func`.
+            When it returns False the stage (and everything depending on it) is skipped.
+        afunc (coroutine function, optional): Async equivalent of `func` used by `Pipeline.arun`.
+            Without it, `arun` runs `func` in a worker thread.
+    """
+
+    def __init__(self, name: str, func, requires: tuple = (), when=None, afunc=None):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.when = when
+        self.afunc = afunc
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, requires={self.requires!r})"
+
+
+class PipelineResult:
+    """
+    Values and timings produced by a pipeline run.
+
+    `values` maps input and stage names to their results (skipped stages map to None),
+    `skipped` lists the skipped stage names and `timings` maps each executed stage to
+    {"start": <offset from run start>, "duration": <seconds>}, plus a "total" entry.
+    """
+
+    def __init__(self, values: dict, timings: dict, skipped: list):
+        self.values = values
+        self.timings = timings
+        self.skipped = skipped
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+
+class Pipeline:
+    """
+    Runs a set of stages as a dependency graph, executing independent stages at the same time.
+
+    Stages only wait for the stages they name in `requires`, so the wall time of a run is
+    the longest dependency chain rather than the sum of every stage.
+    """
+
+    def __init__(self, stages: list[Stage]):
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            self.stages[stage.name] = stage
+
+    def _validate(self, inputs: dict):
+        known = set(inputs) | set(self.stages)
+        for stage in self.stages.values():
+            missing = [dep for dep in stage.requires if dep not in known]
+            if missing:
+                raise ValueError(f"Stage {stage.name!r} requires unknown values: {missing}")
+
+    def _ready(self, stage: Stage, values: dict) -> bool:
+        return all(dep in values for dep in stage.requires)
+
+    def _schedule(self, pending: dict, values: dict, skipped: list) -> list:
+        """
+        Pop every pending stage whose dependencies are resolved. Stages that must be skipped
+        are resolved to None immediately; the others are returned with their keyword arguments.
+        """
+        ready = []
+        progressed = True
+        while progressed:
+            progressed = False
+            for name, stage in list(pending.items()):
+                if not self._ready(stage, values):
+                    continue
+                del pending[name]
+                progressed = True
+                if any(dep in skipped for dep in stage.requires):
+                    skipped.append(name)
+                    values[name] = None
+                    continue
+                kwargs = {dep: values[dep] for dep in stage.requires}
+                if stage.when is not None and not stage.when(**kwargs):
+                    skipped.append(name)
+                    values[name] = None
+                    continue
+                ready.append((stage, kwargs))
+        return ready
+
+    def run(self, **inputs) -> PipelineResult:
+        """
+        Execute the pipeline on a thread pool.
+
+        Args:
+            **inputs: Initial values available to every stage by name.
+
+        Returns:
+            PipelineResult: The values and per-stage timings of the run.
+        """
+        self._validate(inputs)
+        values = dict(inputs)
+        skipped = []
+        timings = {}
+        pending = dict(self.stages)
+        running = {}
+        run_start = time.perf_counter()
+
+        def execute(stage, kwargs, scheduled):
+            start = time.perf_counter()
+            with span(stage.name, queue_seconds=start - scheduled):
+                result = stage.func(**kwargs)
+            return result, start, time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max(len(self.stages), 1)) as executor:
+            while pending or running:
+                for stage, kwargs in self._schedule(pending, values, skipped):
+                    # Each stage runs in a copy of the caller's context, so its span nests under the caller's
+                    context = contextvars.copy_context()
+                    future = executor.submit(context.run, execute, stage, kwargs, time.perf_counter())
+                    running[future] = stage.name
+
+                if not running:
+                    if pending:
+                        raise ValueError(f"Unresolvable stages (dependency cycle?): {list(pending)}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    result, start, end = future.result()
+                    values[name] = result
+                    timings[name] = {"start": start - run_start, "duration": end - start}
+
+        timings["total"] = {"start": 0.0, "duration": time.perf_counter() - run_start}
+        return PipelineResult(values, timings, skipped)
+
+    async def arun(self, **inputs) -> PipelineResult:
+        """
+        Execute the pipeline on the running event loop.
+
+        Stages with an `afunc` are awaited directly; the others run in a worker thread.
+
+        Args:
+            **inputs: Initial values available to every stage by name.
+
+        Returns:
+            PipelineResult: The values and per-stage timings of the run.
+        """
+        self._validate(inputs)
+        values = dict(inputs)
+        skipped = []
+        timings = {}
+        pending = dict(self.stages)
+        running = {}
+        run_start = time.perf_counter()
+
+        async def execute(stage, kwargs, scheduled):
+            start = time.perf_counter()
+            with span(stage.name, queue_seconds=start - scheduled):
+                if stage.afunc is not None:
+                    result = await stage.afunc(**kwargs)
+                else:
+                    result = await asyncio.to_thread(stage.func, **kwargs)
+            return result, start, time.perf_counter()
+
+        try:
+            while pending or running:
+                for stage, kwargs in self._schedule(pending, values, skipped):
+                    running[asyncio.ensure_future(execute(stage, kwargs, time.perf_counter()))] = stage.name
+
+                if not running:
+                    if pending:
+                        raise ValueError(f"Unresolvable stages (dependency cycle?): {list(pending)}")
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    result, start, end = task.result()
+                    values[name] = result
+                    timings[name] = {"start": start - run_start, "duration": end - start}
+        finally:
+            for task in running:
+                task.cancel()
+
+        timings["total"] = {"start": 0.0, "duration": time.perf_counter() - run_start}
+        return PipelineResult(values, timings, skipped)
@@ -1,62 +1,45 @@
 import os
 import json
-import yaml
+import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from .functions import response_with_citations_schema, conversation_summary_format
-from .extraction import extract_articles_and_paragraphs
-from pathlib import Path
-from openai import OpenAI
-from langchain_core.documents import Document
-from langchain_chroma.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from dotenv import load_dotenv
+from .extraction import extract_references, aextract_references
+from .llm import DEFAULT_MODEL, prompts, create_response, acreate_response, stream_response, astream_response
+from .streaming import stream_json_field, astream_json_field
+from .cache import response_cache
+from .pipeline import Pipeline, Stage
+from .corpus import METADATA_INDEX_ENABLED, load_corpus, mention_pairs, batched_metadata_lookup, chunk_key
+from .bm25 import lexical_search, reciprocal_rank_fusion
+from .context import CONTEXT_TOKEN_BUDGET, fit_to_budget, pack_context, measure_prompt
+from .registry import get_registry
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+# Hybrid retrieval: RETRIEVAL_CANDIDATES chunks each from BM25 and the vector search are fused
+# with reciprocal rank fusion, and the best RETRIEVAL_TOP_K are kept within CONTEXT_TOKEN_BUDGET
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "1") == "1"
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
 
-script_location = Path(__file__).absolute().parent
-file_location = script_location / 'prompts.yml'
-prompts = yaml.safe_load(file_location.read_text())
-
-
-client = OpenAI(
-  base_url="https://openrouter.ai/api/v1",
-  api_key=OPENROUTER_API_KEY,
-)
+# Searches of the collections picked by the router run side by side
+_route_executor = ThreadPoolExecutor(max_workers=int(os.getenv("ROUTED_SEARCH_WORKERS", "8")))
 
 def vector_db():
-    embedding = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        # model_kwargs={"device": "cpu"}
-    )
-
-    vector_store = Chroma(
-        embedding_function=embedding,
-        collection_name="Personal_Data_Protection_Law_en",
-        persist_directory="./chroma_langchain_db",
-    )
-    return vector_store
+    # The default regulation's English collection (see src/collections.yml), loaded once
+    return get_registry().default_store()
 
-def get_question_summary(question: str, conversation_history: list[str]) -> str:
-    """
-    Get a summary of the question along with conversation history.
-
-    Args:
-        question (str): The input question.
-        conversation_history (list[str]): The conversation history.
-
-    Returns:
-        str: A summary of the question with conversation history.
-    """
+def _question_summary_request(question: str, conversation_history: list[str]) -> dict:
     system_prompt = prompts["prompts"]["conversation_history_prompt"]["system_prompt"]
     user_prompt = prompts["prompts"]["conversation_history_prompt"]["user_prompt"]
 
-    # Replace user_prompt placeholders for: user_question, conversation_history
+    # Replace user_prompt placeholders for: user_question, conversation_history
     user_prompt = user_prompt.replace("{{ question }}", question)
     user_prompt = user_prompt.replace("{{ history }}", "\n".join(conversation_history))
+    measure_prompt("conversation_history_prompt", system=system_prompt, user=user_prompt)
 
-    response = client.responses.create(
-        model="openai/gpt-oss-20b:free",
+    return dict(
+        model=DEFAULT_MODEL,
         input=[
                 # Define the system prompt
                 {
@@ -72,30 +55,65 @@ def get_question_summary(question: str, conversation_history: list[str]) -> str:
         text = conversation_summary_format
     )
 
+@response_cache.memoize("conversation_history_prompt")
+def get_question_summary(question: str, conversation_history: list[str]) -> str:
+    """
+    Get a summary of the question along with conversation history.
+
+    Args:
+        question (str): The input question.
+        conversation_history (list[str]): The conversation history.
+
+    Returns:
+        str: A summary of the question with conversation history.
+    """
+    response = create_response(**_question_summary_request(question, conversation_history))
+
     response_dict = json.loads(response.output_text)
     return response_dict["summary"]
 
-def get_relevant_context(question_summary: str, vector_store) -> list[dict]:
+@response_cache.memoize("conversation_history_prompt")
+async def aget_question_summary(question: str, conversation_history: list[str]) -> str:
     """
-    Get relevant context snippets based on the question.
+    Async version of `get_question_summary`.
+    """
+    response = await acreate_response(**_question_summary_request(question, conversation_history))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict["summary"]
+
+def embed_query(question_summary: str, vector_store) -> list[float]:
+    """
+    Embed a question summary with the vector store's embedding model.
 
     Args:
         question_summary (str): The input question summary (with conversation history).
+        vector_store: The vector store whose embedding model is used.
 
     Returns:
-        list[dict]: A list of relevant context snippets.
+        list[float]: The query embedding.
     """
-    print(f"Question Summary inside get_relevant_context: {question_summary}")
-    print(type(vector_store))
-    results_search = vector_store.similarity_search(question_summary, k=5)
-    mentions = extract_articles_and_paragraphs(question_summary)
-    print("Extracted Articles and Paragraphs:")
-    print(mentions)
-    
-    # access the underlying chroma collection
-    chroma_collection = vector_store._collection
+    return vector_store.embeddings.embed_query(question_summary)
+
+def search_similar_chunks(question_summary: str, vector_store, k: int = 5, query_embedding=None) -> list[dict]:
+    """
+    Run a semantic similarity search over the vector store.
+
+    Args:
+        question_summary (str): The input question summary (with conversation history).
+        vector_store: The vector store to search.
+        k (int): Number of chunks to return.
+        query_embedding (list[float], optional): Precomputed embedding of `question_summary`.
+
+    Returns:
+        list[dict]: The matching chunks with their article and paragraph numbers.
+    """
+    if query_embedding is None:
+        results_search = vector_store.similarity_search(question_summary, k=k)
+    else:
+        results_search = vector_store.similarity_search_by_vector(query_embedding, k=k)
+    logger.debug("Results Search: %s", results_search)
     updated_results_search = []
-    print("Results Search:", results_search)
     for doc in results_search:
         updated_results_search.append(
             {
@@ -104,51 +122,247 @@ def get_relevant_context(question_summary: str, vector_store) -> list[dict]:
                 "paragraph number": doc.metadata["paragraph number"]
             }
         )
-    print(f"Updated Results search: {updated_results_search}")
-    results_mentions = []
+    logger.debug("Updated Results search: %s", updated_results_search)
+    return updated_results_search
+
+def lookup_mentioned_chunks(mentions: dict, vector_store) -> list[dict]:
+    """
+    Fetch the chunks for the articles and paragraphs explicitly mentioned in the question.
+
+    Uses the in-process (article, paragraph) index of the collection, or a single batched
+    metadata query when the index is disabled, so the cost stays flat as mentions grow.
+
+    Args:
+        mentions (dict): Output of `extract_references` / `extract_articles_and_paragraphs`.
+        vector_store: The vector store holding the chunks.
+
+    Returns:
+        list[dict]: The mentioned chunks with their article and paragraph numbers.
+    """
     try:
-      for record in mentions["articles"]:
-          article = record["article"]
-          paragraphs = record["paragraphs"]
-          for para in paragraphs:
-            res = chroma_collection.get(where={"$and": [{"article number": article}, {"paragraph number": str(para)}]}, include=["documents", "metadatas"])
-            for idx, doc in enumerate(res["documents"]):
-                results_mentions.append({
-                        "content": doc,
-                        "article number": res["metadatas"][idx]["article number"],
-                        "paragraph number": res["metadatas"][idx]["paragraph number"]
-                    }
-                )
+        pairs = mention_pairs(mentions)
     except KeyError:
-      print("No articles found in the extracted mentions.")
+        logger.debug("No articles found in the extracted mentions.")
+        pairs = []
+
+    if METADATA_INDEX_ENABLED:
+        results_mentions = load_corpus(vector_store).lookup(pairs)
+    else:
+        # access the underlying chroma collection
+        results_mentions = batched_metadata_lookup(vector_store._collection, pairs)
+
+    logger.debug("Results Mentions: %s", results_mentions)
+    return results_mentions
 
-    print(f"Results Mentions: {results_mentions}")
+def search_lexical_chunks(question_summary: str, vector_store, k: int = RETRIEVAL_CANDIDATES) -> list[dict]:
+    """
+    Run a BM25 search over the collection's chunks (empty when hybrid search is disabled).
 
-    return updated_results_search + results_mentions
+    Args:
+        question_summary (str): The input question summary (with conversation history).
+        vector_store: The vector store holding the chunks.
+        k (int): Number of chunks to return.
 
+    Returns:
+        list[dict]: The matching chunks with their article and paragraph numbers, best first.
+    """
+    if not HYBRID_SEARCH_ENABLED:
+        return []
+    results_lexical = lexical_search(question_summary, vector_store, k=k)
+    logger.debug("Results Lexical: %s", results_lexical)
+    return results_lexical
 
-def query_response(question: str, conversation_history: list[str], relevant_context: list[dict]) -> dict:
+def merge_context(mentioned_chunks: list[dict], rankings: list[list[dict]], top_k: int = RETRIEVAL_TOP_K,
+                  token_budget: int = CONTEXT_TOKEN_BUDGET) -> list[dict]:
     """
-    Query the LLM for an answer based on the question, conversation history, and relevant context.
-    
+    Merge the explicitly mentioned chunks with the fused search results.
+
+    Mentioned chunks come first, followed by the `top_k` best chunks of the reciprocal rank
+    fusion of `rankings`. Duplicates are dropped and the result is trimmed to `token_budget`
+    (see `fit_to_budget`).
+
     Args:
-        question (str): The input question.
-        conversation_history (list[str]): The conversation history.
-        relevant_context (list[dict]): The relevant context extracted from documents.
+        mentioned_chunks (list[dict]): Chunks of the articles/paragraphs named in the question.
+        rankings (list[list[dict]]): Ranked search results (e.g. vector and BM25), best first.
+        top_k (int): Number of search results to keep.
+        token_budget (int): Maximum estimated tokens of the merged context.
 
     Returns:
-        dict: A dictionary containing the answer and citations.
+        list[dict]: The relevant context, most relevant first.
     """
+    mentioned_keys = {chunk_key(chunk) for chunk in mentioned_chunks}
+    fused = [chunk for chunk in reciprocal_rank_fusion(rankings, key=chunk_key)
+             if chunk_key(chunk) not in mentioned_keys][:top_k]
+
+    context, report = fit_to_budget(mentioned_chunks + fused, token_budget)
+    logger.debug("Context budget report: %s", report)
+    return context
+
+def _tag_regulation(chunks: list[dict], route) -> list[dict]:
+    # Chunks of different regulations share article/paragraph numbers; the collection lets the
+    # citation check look the cited paragraph up in the right corpus
+    return [{**chunk, "regulation": route.regulation, "collection": route.collection} for chunk in chunks]
+
+def search_route(question_summary: str, route, query_embedding, k: int = RETRIEVAL_CANDIDATES) -> list[list[dict]]:
+    """
+    Run the similarity and BM25 searches over one routed collection.
+
+    Args:
+        question_summary (str): The input question summary (with conversation history).
+        route (Route): The collection to search (see `CollectionRegistry.route`).
+        query_embedding (list[float]): Embedding of `question_summary`.
+        k (int): Number of chunks per search.
+
+    Returns:
+        list[list[dict]]: The vector and BM25 rankings, chunks tagged with their "regulation"
+            and "collection".
+    """
+    vector_store = get_registry().load(route.collection)
+    rankings = [
+        search_similar_chunks(question_summary, vector_store, k=k, query_embedding=query_embedding),
+        search_lexical_chunks(question_summary, vector_store, k=k),
+    ]
+    return [_tag_regulation(ranking, route) for ranking in rankings]
+
+def search_routes(question_summary: str, routes: list, query_embedding) -> list[list[dict]]:
+    """
+    Search every routed collection in parallel.
+
+    Returns:
+        list[list[dict]]: The rankings of every collection, to be fused by `merge_context`.
+    """
+    futures = [_route_executor.submit(search_route, question_summary, route, query_embedding) for route in routes]
+    return [ranking for future in futures for ranking in future.result()]
+
+async def asearch_routes(question_summary: str, routes: list, query_embedding) -> list[list[dict]]:
+    """
+    Async version of `search_routes`.
+    """
+    results = await asyncio.gather(*(
+        asyncio.to_thread(search_route, question_summary, route, query_embedding) for route in routes
+    ))
+    return [ranking for rankings in results for ranking in rankings]
+
+def lookup_routed_mentions(mentions: dict, routes: list) -> list[dict]:
+    """
+    Fetch the mentioned articles and paragraphs from every routed collection, those of the
+    default regulation first. A bare "Article 5" does not say which regulation it is in.
+    """
+    registry = get_registry()
+    return [chunk for route in routes
+            for chunk in _tag_regulation(lookup_mentioned_chunks(mentions, registry.load(route.collection)), route)]
+
+def _routed_context_stages(vector_store) -> list[Stage]:
+    registry = get_registry()
+    return [
+        Stage("mentions", lambda question_summary: extract_references(question_summary),
+              requires=("question_summary",),
+              afunc=lambda question_summary: aextract_references(question_summary)),
+        # One query embedding: every collection shares the registry's embedding model
+        Stage("query_embedding", lambda question_summary: embed_query(question_summary, vector_store),
+              requires=("question_summary",)),
+        Stage("routes", lambda mentions, language: registry.route(mentions.get("sectors", []), language),
+              requires=("mentions", "language")),
+        Stage("search_rankings", search_routes, requires=("question_summary", "routes", "query_embedding"),
+              afunc=asearch_routes),
+        Stage("mentioned_chunks", lookup_routed_mentions, requires=("mentions", "routes")),
+        Stage("relevant_context",
+              lambda search_rankings, mentioned_chunks: merge_context(mentioned_chunks, search_rankings),
+              requires=("search_rankings", "mentioned_chunks")),
+    ]
+
+def relevant_context_stages(vector_store) -> list[Stage]:
+    """
+    Pipeline stages that turn a `question_summary` input into a `relevant_context` value.
+
+    The searches run alongside the reference extraction. When several collections are configured,
+    the stages also need a `language` input to route the question.
+
+    Args:
+        vector_store: The vector store to search (the default collection when routing).
+
+    Returns:
+        list[Stage]: The retrieval stages.
+    """
+    if get_registry().routed:
+        return _routed_context_stages(vector_store)
+    return [
+        Stage("mentions", lambda question_summary: extract_references(question_summary),
+              requires=("question_summary",),
+              afunc=lambda question_summary: aextract_references(question_summary)),
+        Stage("query_embedding", lambda question_summary: embed_query(question_summary, vector_store),
+              requires=("question_summary",)),
+        Stage("search_results",
+              lambda question_summary, query_embedding: search_similar_chunks(
+                  question_summary, vector_store, k=RETRIEVAL_CANDIDATES, query_embedding=query_embedding),
+              requires=("question_summary", "query_embedding")),
+        Stage("lexical_results", lambda question_summary: search_lexical_chunks(question_summary, vector_store),
+              requires=("question_summary",)),
+        Stage("mentioned_chunks", lambda mentions: lookup_mentioned_chunks(mentions, vector_store),
+              requires=("mentions",)),
+        Stage("relevant_context",
+              lambda search_results, lexical_results, mentioned_chunks: merge_context(
+                  mentioned_chunks, [search_results, lexical_results]),
+              requires=("search_results", "lexical_results", "mentioned_chunks")),
+    ]
+
+def _relevant_context_pipeline(question_summary: str, vector_store, query_embedding=None,
+                               language: str = "English") -> tuple[Pipeline, dict]:
+    stages = relevant_context_stages(vector_store)
+    inputs = {"question_summary": question_summary, "language": language}
+    if query_embedding is not None:
+        # Precomputed (e.g. batched) embedding: feed it in instead of running the stage
+        stages = [stage for stage in stages if stage.name != "query_embedding"]
+        inputs["query_embedding"] = query_embedding
+    return Pipeline(stages), inputs
+
+def get_relevant_context(question_summary: str, vector_store, query_embedding=None,
+                         language: str = "English") -> list[dict]:
+    """
+    Get relevant context snippets based on the question.
+
+    Args:
+        question_summary (str): The input question summary (with conversation history).
+        vector_store: The vector store to search.
+        query_embedding (list[float], optional): Precomputed embedding of `question_summary`.
+        language (str): Language of the question, used to route it to a collection.
+
+    Returns:
+        list[dict]: A list of relevant context snippets.
+    """
+    logger.debug("Question Summary inside get_relevant_context: %s", question_summary)
+    pipeline, inputs = _relevant_context_pipeline(question_summary, vector_store, query_embedding, language)
+    return pipeline.run(**inputs)["relevant_context"]
+
+async def aget_relevant_context(question_summary: str, vector_store, query_embedding=None,
+                                language: str = "English") -> list[dict]:
+    """
+    Async version of `get_relevant_context`.
+    """
+    logger.debug("Question Summary inside get_relevant_context: %s", question_summary)
+    pipeline, inputs = _relevant_context_pipeline(question_summary, vector_store, query_embedding, language)
+    return (await pipeline.arun(**inputs))["relevant_context"]
+
+
+def _query_response_request(question: str, conversation_history: list[str], relevant_context: list[dict],
+                            language: str = "English") -> dict:
     system_prompt = prompts["prompts"]["response_with_citations"]["system_prompt"]
     user_prompt = prompts["prompts"]["response_with_citations"]["user_prompt"]
 
-    # Replace user_prompt placeholders for: user_question, conversation_history, relevant_context
+    history = "\n".join(conversation_history)
+    packed_context, report = pack_context(relevant_context)
+    logger.debug("Context packing report: %s", report)
+    measure_prompt("response_with_citations", system=system_prompt, conversation_history=history,
+                   relevant_context=packed_context, user_question=question)
+
+    # Replace user_prompt placeholders for: user_question, conversation_history, relevant_context, answer_language
     user_prompt = user_prompt.replace("{{ user_question }}", question)
-    user_prompt = user_prompt.replace("{{ conversation_history }}", "\n".join(conversation_history))
-    user_prompt = user_prompt.replace("{{ relevant_context }}", "\n".join(str(item) for item in relevant_context))
+    user_prompt = user_prompt.replace("{{ conversation_history }}", history)
+    user_prompt = user_prompt.replace("{{ relevant_context }}", packed_context)
+    user_prompt = user_prompt.replace("{{ answer_language }}", language)
 
-    response = client.responses.create(
-        model="openai/gpt-oss-20b:free",
+    return dict(
+        model=DEFAULT_MODEL,
         input=[
                 # Define the system prompt
                 {
@@ -164,9 +378,66 @@ def query_response(question: str, conversation_history: list[str], relevant_cont
         text = response_with_citations_schema
     )
 
+def query_response(question: str, conversation_history: list[str], relevant_context: list[dict],
+                   language: str = "English") -> dict:
+    """
+    Query the LLM for an answer based on the question, conversation history, and relevant context.
+    
+    Args:
+        question (str): The input question.
+        conversation_history (list[str]): The conversation history.
+        relevant_context (list[dict]): The relevant context extracted from documents.
+        language (str): Language to write the answer in (the question may be in another one).
+
+    Returns:
+        dict: A dictionary containing the answer and citations.
+    """
+    request = _query_response_request(question, conversation_history, relevant_context, language)
+    response = create_response(**request)
+
     response_dict = json.loads(response.output_text)
     return response_dict
 
+async def aquery_response(question: str, conversation_history: list[str], relevant_context: list[dict],
+                          language: str = "English") -> dict:
+    """
+    Async version of `query_response`.
+    """
+    request = _query_response_request(question, conversation_history, relevant_context, language)
+    response = await acreate_response(**request)
+
+    response_dict = json.loads(response.output_text)
+    return response_dict
+
+def stream_query_response(question: str, conversation_history: list[str], relevant_context: list[dict],
+                          language: str = "English"):
+    """
+    Streaming version of `query_response`.
+
+    Args:
+        question (str): The input question.
+        conversation_history (list[str]): The conversation history.
+        relevant_context (list[dict]): The relevant context extracted from documents.
+        language (str): Language to write the answer in (the question may be in another one).
+
+    Yields:
+        dict: {"type": "delta", "text": ...} pieces of the answer as they are generated, then
+            {"type": "response", "response": <dict with the answer and citations>}.
+    """
+    request = _query_response_request(question, conversation_history, relevant_context, language)
+    events = stream_response(**request)
+    yield from stream_json_field(events, "answer")
+
+async def astream_query_response(question: str, conversation_history: list[str], relevant_context: list[dict],
+                                 language: str = "English"):
+    """
+    Async version of `stream_query_response`.
+    """
+    request = _query_response_request(question, conversation_history, relevant_context, language)
+    events = astream_response(**request)
+    async for event in astream_json_field(events, "answer"):
+        yield event
+
 
 if __name__ == "__main__":
     question = "What provisions are made in the personal data protection law for the rights of data subjects regarding access to their personal data? And from Articel 1, and Paragraphs 4, 5 and 6. What can you say? What about paragraph 6 in Article 23"
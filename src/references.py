@@ -0,0 +1,402 @@
+# Deterministic parser for article / paragraph references (English and Arabic)
+
+import re
+import functools
+
+ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+DASHES = str.maketrans({"–": "-", "—": "-", "‐": "-", "‑": "-", "−": "-", "،": ",", "؛": ";"})
+
+TOKEN_PATTERN = re.compile(r"(\d+)(?:st|nd|rd|th)?\b|[^\W\d_]+|[(),;:.?!؟&/-]")
+
+ARTICLE_WORDS = {"article", "articles", "art", "arts"}
+PARAGRAPH_WORDS = {"paragraph", "paragraphs", "para", "paras", "par", "paragraphe"}
+ARTICLE_STEMS_AR = {"مادة", "ماده", "مواد", "مادتين", "مادتان"}
+PARAGRAPH_STEMS_AR = {"فقرة", "فقره", "فقرات", "فقرتين", "فقرتان", "بند", "بنود", "بندين", "بندان"}
+
+# Spelled-out references that this parser does not resolve (the LLM should handle them)
+UNSUPPORTED_WORDS = {"section", "sections", "clause", "clauses", "subparagraph", "subparagraphs",
+                     "sub", "chapter", "chapters", "schedule", "annex", "appendix", "item", "items"}
+UNSUPPORTED_STEMS_AR = {"فصل", "باب", "ملحق"}
+ANAPHORA_WORDS = {"previous", "above", "same", "this", "that", "said", "aforementioned", "last",
+                  "former", "latter", "next", "preceding", "following"}
+ANAPHORA_STEMS_AR = {"سابقة", "سابق", "نفس", "هذه", "هذا", "ذاتها", "مذكورة", "مذكور", "تالية", "أخيرة"}
+
+LIST_SEPARATORS = {",", "and", "&", "or", "و", "او", "أو", "plus"}
+RANGE_SEPARATORS = {"-", "to", "through", "thru", "until", "till", "إلى", "الى", "حتى"}
+OF_CONNECTORS = {"of", "in", "under", "from", "within", "من", "في"}
+SENTENCE_END = {".", "?", "!", "؟", ";"}
+
+UNITS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+         "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"]
+UNIT_ORDINALS = ["zeroth", "first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth",
+                 "tenth", "eleventh", "twelfth", "thirteenth", "fourteenth", "fifteenth", "sixteenth",
+                 "seventeenth", "eighteenth", "nineteenth"]
+TENS = {"twenty": 20, "thirty": 30, "forty": 40, "fifty": 50}
+TENS_ORDINALS = {"twentieth": 20, "thirtieth": 30, "fortieth": 40, "fiftieth": 50}
+CARDINALS = {word: value for value, word in enumerate(UNITS) if value} | TENS
+ORDINALS = {word: value for value, word in enumerate(UNIT_ORDINALS) if value} | TENS_ORDINALS
+ORDINALS_AR = {
+    "أولى": 1, "اولى": 1, "أول": 1, "اول": 1,
+    "ثانية": 2, "ثاني": 2, "ثالثة": 3, "ثالث": 3, "رابعة": 4, "رابع": 4, "خامسة": 5, "خامس": 5,
+    "سادسة": 6, "سادس": 6, "سابعة": 7, "سابع": 7, "ثامنة": 8, "ثامن": 8, "تاسعة": 9, "تاسع": 9,
+    "عاشرة": 10, "عاشر": 10,
+}
+
+SECTOR_KEYWORDS = {
+    "Government & Public Sector": ["government", "public sector", "public entity", "public entities",
+                                   "ministry", "public authority", "حكومي", "حكومية", "القطاع العام", "جهة عامة",
+                                   "الجهات العامة", "وزارة"],
+    "Health & Medical Services": ["health", "medical", "patient", "hospital", "clinic", "genetic",
+                                  "صحي", "صحية", "طبي", "طبية", "مريض", "مستشفى", "وراثية"],
+    "Finance & Banking": ["bank", "banking", "financial", "finance", "credit", "payment", "loan",
+                          "مالي", "مالية", "بنك", "مصرف", "مصرفي", "ائتمان", "ائتمانية"],
+    "Telecommunications & Digital Infrastructure": ["telecom", "telecommunication", "network", "internet",
+                                                    "digital infrastructure", "cloud", "اتصالات", "شبكة",
+                                                    "الإنترنت", "رقمية"],
+    "Cybersecurity & National Security": ["cybersecurity", "cyber", "national security", "breach", "security",
+                                          "الأمن الوطني", "سيبراني", "الأمن السيبراني", "تسرب", "أمنية"],
+    "Research, Education & Statistics": ["research", "education", "educational", "statistic", "academic",
+                                         "scientific", "بحث", "بحثية", "تعليم", "تعليمية", "إحصاء", "إحصائية", "علمي"],
+}
+
+# Confidence levels
+CONFIDENT = 1.0
+FUZZY_KEYWORD = 0.85
+ACROSS_SENTENCES = 0.7
+AMBIGUOUS_ATTACHMENT = 0.6
+UNSUPPORTED = 0.4
+UNRESOLVED = 0.3
+
+# Widest range expanded into its members ("paragraphs 1-100" is left to the LLM)
+MAX_RANGE = 50
+
+
+def _osa_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions),
+    returning `limit + 1` as soon as the distance is known to exceed `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _strip_arabic_prefixes(word: str) -> str:
+    # Conjunction / preposition clitics followed by the definite article: "والمادة" -> "مادة"
+    if len(word) > 3 and word[0] in "وفبلك":
+        if word[1:].startswith(("ال", "لل")) or word[0] == "و":
+            word = word[1:]
+    for article in ("ال", "لل"):
+        if word.startswith(article) and len(word) > len(article) + 1:
+            return word[len(article):]
+    return word
+
+
+@functools.lru_cache(maxsize=4096)
+def _classify_keyword(word: str):
+    """
+    Returns ("article" | "paragraph" | None, exact: bool).
+    """
+    lower = word.lower()
+    if lower in ARTICLE_WORDS:
+        return "article", True
+    if lower in PARAGRAPH_WORDS:
+        return "paragraph", True
+    stem = _strip_arabic_prefixes(word)
+    if stem in ARTICLE_STEMS_AR:
+        return "article", True
+    if stem in PARAGRAPH_STEMS_AR:
+        return "paragraph", True
+    # Typos such as "Articel", "Atricle", "Pargraph"
+    if lower[0] == "a" and 6 <= len(lower) <= 9:
+        if min(_osa_distance(lower, target, 1) for target in ("article", "articles")) <= 1:
+            return "article", False
+    if lower[0] == "p" and 8 <= len(lower) <= 11:
+        if min(_osa_distance(lower, target, 2) for target in ("paragraph", "paragraphs")) <= 2:
+            return "paragraph", False
+    return None, True
+
+
+def _tokenize(text: str) -> list[tuple[str, object]]:
+    """
+    Returns a list of (kind, value) tokens where kind is one of
+    "num", "ord" (ordinal word / 6th), "word", "punct".
+    """
+    text = text.translate(ARABIC_DIGITS).translate(DASHES)
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text):
+        raw = match.group(0)
+        if match.group(1) is not None:
+            number = int(match.group(1))
+            is_ordinal = raw[len(match.group(1)):] != ""
+            tokens.append(("ord" if is_ordinal else "num", number))
+        elif raw.isalpha():
+            tokens.append(("word", raw))
+        else:
+            tokens.append(("punct", raw))
+    return _merge_number_words(tokens)
+
+
+def _merge_number_words(tokens: list) -> list:
+    """
+    Turn spelled-out numbers into number tokens: "twenty-three" -> num 23, "sixth" -> ord 6.
+    """
+    merged = []
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == "word":
+            lower = value.lower()
+            stem = _strip_arabic_prefixes(value)
+            if lower in TENS:
+                # "twenty three", "twenty-third"
+                j = i + 1
+                if j < len(tokens) and tokens[j] == ("punct", "-"):
+                    j += 1
+                if j < len(tokens) and tokens[j][0] == "word":
+                    following = tokens[j][1].lower()
+                    if following in CARDINALS and CARDINALS[following] < 10:
+                        merged.append(("num", TENS[lower] + CARDINALS[following]))
+                        i = j + 1
+                        continue
+                    if following in ORDINALS and ORDINALS[following] < 10:
+                        merged.append(("ord", TENS[lower] + ORDINALS[following]))
+                        i = j + 1
+                        continue
+                merged.append(("num", TENS[lower]))
+            elif lower in CARDINALS:
+                merged.append(("num", CARDINALS[lower]))
+            elif lower in ORDINALS:
+                merged.append(("ord", ORDINALS[lower]))
+            elif stem in ORDINALS_AR:
+                merged.append(("ord", ORDINALS_AR[stem]))
+            else:
+                merged.append((kind, value))
+        else:
+            merged.append((kind, value))
+        i += 1
+    return merged
+
+
+def _is_word(token, words: set) -> bool:
+    return token[0] == "word" and (token[1].lower() in words or token[1] in words)
+
+
+def _parse_number_list(tokens: list, start: int, kinds=("num", "ord")) -> tuple[list[int], int, bool]:
+    """
+    Parse "4", "4, 5 and 6", "4-6", "4 to 6" starting at `start`.
+
+    Returns:
+        tuple[list[int], int, bool]: The numbers, the index of the first unconsumed token and
+            whether every range could be expanded (False for reversed ranges or ranges wider
+            than MAX_RANGE).
+    """
+    numbers = []
+    expanded = True
+    i = start
+    if i >= len(tokens) or tokens[i][0] not in kinds:
+        return numbers, start, expanded
+    numbers.append(tokens[i][1])
+    i += 1
+    while i < len(tokens):
+        token = tokens[i]
+        if (token in (("punct", "-"),) or _is_word(token, RANGE_SEPARATORS)) \
+                and i + 1 < len(tokens) and tokens[i + 1][0] in kinds:
+            low, high = numbers[-1], tokens[i + 1][1]
+            if low < high <= low + MAX_RANGE:
+                numbers.extend(range(low + 1, high + 1))
+            else:
+                expanded = False
+            i += 2
+            continue
+        if token == ("punct", ",") or _is_word(token, LIST_SEPARATORS):
+            # "4, 5, and 6" / "4 and 6"
+            j = i + 1
+            while j < len(tokens) and (tokens[j] == ("punct", ",") or _is_word(tokens[j], LIST_SEPARATORS)):
+                j += 1
+            if j < len(tokens) and tokens[j][0] in kinds:
+                numbers.append(tokens[j][1])
+                i = j + 1
+                continue
+        break
+    return numbers, i, expanded
+
+
+def _find_events(tokens: list) -> tuple[list[dict], float]:
+    """
+    Locate article / paragraph mentions.
+
+    Returns:
+        tuple[list[dict], float]: Events ({"kind", "numbers", "start", "end", "sentence"}) and
+            the confidence so far.
+    """
+    events = []
+    confidence = CONFIDENT
+    sentence = 0
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == "punct" and value in SENTENCE_END:
+            # "Art. 5" / "para. 2" are abbreviations, not sentence ends
+            previous = tokens[i - 1] if i else None
+            if not (value == "." and previous and previous[0] == "word"
+                    and previous[1].lower() in {"art", "arts", "para", "paras", "par"}):
+                sentence += 1
+            i += 1
+            continue
+        if kind != "word":
+            i += 1
+            continue
+
+        keyword, exact = _classify_keyword(value)
+        if keyword is None:
+            lower = value.lower()
+            stem = _strip_arabic_prefixes(value)
+            if (lower in UNSUPPORTED_WORDS or stem in UNSUPPORTED_STEMS_AR) \
+                    and i + 1 < len(tokens) and tokens[i + 1][0] in ("num", "ord"):
+                confidence = min(confidence, UNSUPPORTED)
+            i += 1
+            continue
+        if not exact:
+            confidence = min(confidence, FUZZY_KEYWORD)
+
+        # Ordinals before the keyword: "the sixth paragraph", "first and second paragraphs"
+        numbers = []
+        expanded = True
+        j = i - 1
+        while j >= 0 and (tokens[j][0] == "ord" or tokens[j] in (("punct", ","), ("punct", "-"))
+                          or _is_word(tokens[j], LIST_SEPARATORS | RANGE_SEPARATORS)):
+            j -= 1
+        if j + 1 < i and tokens[j + 1][0] == "ord":
+            numbers, _, expanded = _parse_number_list(tokens, j + 1, kinds=("ord",))
+
+        # Numbers after the keyword: "Article 23", "paragraphs 4-6", "الفقرة السادسة"
+        k = i + 1
+        if k < len(tokens) and tokens[k] == ("punct", "."):
+            k += 1
+        if k < len(tokens) and _is_word(tokens[k], {"no", "number", "nos", "رقم"}):
+            k += 1
+            if k < len(tokens) and tokens[k] == ("punct", "."):
+                k += 1
+        after, end, after_expanded = _parse_number_list(tokens, k)
+        numbers.extend(after)
+        if not (expanded and after_expanded):
+            # Drop the mention rather than guess which members of the range were meant
+            numbers = []
+            confidence = min(confidence, UNRESOLVED)
+
+        # Anaphoric references ("the previous article", "نفس المادة") need the conversation
+        neighbours = tokens[max(i - 2, 0):i] + tokens[i + 1:i + 2]
+        if not numbers and any(
+            token[0] == "word" and (token[1].lower() in ANAPHORA_WORDS or _strip_arabic_prefixes(token[1]) in ANAPHORA_STEMS_AR)
+            for token in neighbours
+        ):
+            confidence = min(confidence, UNSUPPORTED)
+
+        # Roman numerals ("Article IV") are left to the LLM
+        if not numbers and k < len(tokens) and tokens[k][0] == "word" \
+                and re.fullmatch(r"[ivxlcdm]+", tokens[k][1].lower()) and tokens[k][1].isupper():
+            confidence = min(confidence, UNSUPPORTED)
+
+        event = {"kind": keyword, "numbers": [n for n in numbers if n >= 1], "start": i,
+                 "end": max(end, i + 1), "sentence": sentence}
+        if len(event["numbers"]) != len(numbers):
+            confidence = min(confidence, UNRESOLVED)
+        events.append(event)
+
+        # "Article 23(6)" -> paragraph 6 of article 23
+        if keyword == "article" and after and end + 2 < len(tokens) and tokens[end] == ("punct", "(") \
+                and tokens[end + 1][0] == "num" and tokens[end + 2] == ("punct", ")"):
+            events.append({"kind": "paragraph", "numbers": [tokens[end + 1][1]], "start": end,
+                           "end": end + 3, "sentence": sentence, "parenthesized": True})
+            end += 3
+        i = max(end, i + 1)
+    return events, confidence
+
+
+SECTOR_PATTERNS = {
+    sector: re.compile(r"(?<!\w)(?:" + "|".join(re.escape(keyword) for keyword in keywords) + ")")
+    for sector, keywords in SECTOR_KEYWORDS.items()
+}
+
+
+def _detect_sectors(text: str) -> list[str]:
+    lower = text.lower()
+    return [sector for sector, pattern in SECTOR_PATTERNS.items() if pattern.search(lower)]
+
+
+def parse_references(text: str) -> tuple[dict, float]:
+    """
+    Parse article and paragraph references such as "Article 23, Paragraph 6",
+    "paragraphs 4–6 of Article 1", "the sixth paragraph of Articel 23" or "الفقرة ٦ من المادة ٢٣".
+
+    Args:
+        text (str): The input question.
+
+    Returns:
+        tuple[dict, float]: The extraction result ({"articles": [...], "sectors": [...]}, the shape of
+            `compliance_classifier_schema`) and a confidence in [0, 1]. Low confidence means the text
+            contains references this parser could not resolve on its own.
+    """
+    tokens = _tokenize(text)
+    events, confidence = _find_events(tokens)
+
+    articles = {}
+
+    def add(article: int, paragraphs: list[int]):
+        existing = articles.setdefault(article, [])
+        for paragraph in paragraphs:
+            if paragraph not in existing:
+                existing.append(paragraph)
+
+    for index, event in enumerate(events):
+        if event["kind"] == "article":
+            for article in event["numbers"]:
+                add(article, [])
+            continue
+        if not event["numbers"]:
+            continue
+
+        # "paragraph 6 of/in Article 23"
+        target = None
+        following = events[index + 1] if index + 1 < len(events) else None
+        if following is not None and following["kind"] == "article" and following["numbers"] \
+                and following["start"] - event["end"] <= 2 \
+                and all(_is_word(token, OF_CONNECTORS) or token[0] == "punct" and token[1] == ","
+                        or _is_word(token, {"the"})
+                        for token in tokens[event["end"]:following["start"]]) \
+                and following["start"] > event["end"]:
+            target = following["numbers"][0]
+            if len(following["numbers"]) > 1:
+                confidence = min(confidence, AMBIGUOUS_ATTACHMENT)
+        else:
+            # "Article 1, paragraphs 4, 5 and 6" -> most recent article
+            previous = next((e for e in reversed(events[:index]) if e["kind"] == "article" and e["numbers"]), None)
+            if previous is not None:
+                target = previous["numbers"][-1]
+                if len(previous["numbers"]) > 1 and not event.get("parenthesized"):
+                    confidence = min(confidence, AMBIGUOUS_ATTACHMENT)
+                if previous["sentence"] != event["sentence"]:
+                    confidence = min(confidence, ACROSS_SENTENCES)
+        if target is None:
+            confidence = min(confidence, UNRESOLVED)
+            continue
+        add(target, event["numbers"])
+
+    result = {
+        "articles": [{"article": article, "paragraphs": paragraphs} for article, paragraphs in articles.items()],
+        "sectors": _detect_sectors(text),
+    }
+    return result, confidence
@@ -0,0 +1,285 @@
+# Registry of the regulation collections served by one deployment, and the retrieval router
+
+import os
+import sqlite3
+import threading
+import yaml
+from pathlib import Path
+from collections import OrderedDict, namedtuple
+from .corpus import METADATA_INDEX_ENABLED, load_corpus, invalidate_corpus
+from .bm25 import invalidate_bm25_index
+from .startup import lazy_import
+from .embeddings import EmbeddingService, load_embedding_model
+
+script_location = Path(__file__).absolute().parent
+COLLECTIONS_CONFIG = os.getenv("COLLECTIONS_CONFIG", str(script_location / 'collections.yml'))
+# Collections kept loaded (including the pinned default)
+REGISTRY_MAX_LOADED = int(os.getenv("REGISTRY_MAX_LOADED", "4"))
+# "chroma" queries the persisted HNSW index; "memory" snapshots the collection into a NumPy
+# matrix at startup and answers top-k by brute force (see src/memory_store.py)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma")
+
+DEFAULT_LANGUAGE = "English"
+
+# A collection to search: the regulation (its display name), the collection name and its language
+Route = namedtuple("Route", ["regulation", "collection", "language"])
+
+
+class Regulation:
+    """
+    A regulation and its collections.
+
+    Args:
+        key (str): Key of the regulation in the config.
+        name (str): Display name, used to label its chunks in the prompt.
+        collections (dict): Language -> collection name. An English collection is required:
+            it serves every language the regulation has no collection for.
+        sectors (list[str], optional): Sectors the regulation applies to; None for all sectors.
+
+    Raises:
+        ValueError: If the regulation has no English collection.
+    """
+
+    def __init__(self, key: str, name: str, collections: dict, sectors: list = None):
+        if DEFAULT_LANGUAGE not in collections:
+            raise ValueError(f"Regulation {key!r} has no {DEFAULT_LANGUAGE} collection in the collections config")
+        self.key = key
+        self.name = name
+        self.collections = dict(collections)
+        self.sectors = set(sectors) if sectors else None
+
+    def applies_to(self, sectors) -> bool:
+        """
+        Whether the regulation should be searched for a question mentioning `sectors`.
+        """
+        return self.sectors is None or bool(self.sectors & set(sectors))
+
+    def route(self, language: str, multilingual: bool = False) -> Route:
+        """
+        The collection to search for a question in `language`: the one in that language if the
+        regulation has it, the English one otherwise. With a multilingual embedding model the
+        English collection serves every language, so the question is searched as asked.
+        """
+        if language in self.collections:
+            return Route(self.name, self.collections[language], language)
+        return Route(self.name, self.collections[DEFAULT_LANGUAGE], language if multilingual else DEFAULT_LANGUAGE)
+
+
+class CollectionRegistry:
+    """
+    Lazily loaded, LRU-evicted vector stores for the collections of several regulations.
+
+    Args:
+        regulations (list[Regulation]): The regulations served.
+        default (str): Key of the default regulation.
+        embedding_model (str): Embedding model shared by every collection (behind one
+            micro-batching EmbeddingService).
+        persist_directory (str): Chroma directory.
+        max_loaded (int): Maximum number of collections kept loaded.
+        multilingual (bool): Whether the embedding model maps every language into one space
+            (the collections were embedded with it).
+    """
+
+    def __init__(self, regulations: list[Regulation], default: str, embedding_model: str,
+                 persist_directory: str, max_loaded: int = REGISTRY_MAX_LOADED, multilingual: bool = False):
+        self.regulations = {regulation.key: regulation for regulation in regulations}
+        # Chunks and citations carry the display name of their regulation
+        self.by_name = {regulation.name: regulation for regulation in regulations}
+        self.default = self.regulations[default]
+        self.default_collection = self.default.collections[DEFAULT_LANGUAGE]
+        self.embedding_model = embedding_model
+        self.persist_directory = persist_directory
+        self.max_loaded = max(max_loaded, 1)
+        self.multilingual = multilingual
+        self.stores = OrderedDict()
+        self.lock = threading.Lock()
+        self.load_locks = {}
+        self._embeddings = None
+        self.embeddings_lock = threading.Lock()
+        self.counters = {"hits": 0, "loads": 0, "evictions": 0, "routed": 0, "collections_searched": 0}
+
+    @classmethod
+    def from_yaml(cls, path: str = COLLECTIONS_CONFIG, **kwargs) -> "CollectionRegistry":
+        config = yaml.safe_load(Path(path).read_text())
+        regulations = [
+            Regulation(key, entry["name"], entry["collections"], entry.get("sectors"))
+            for key, entry in config["regulations"].items()
+        ]
+        kwargs.setdefault("multilingual", config.get("multilingual", False))
+        return cls(regulations, config["default"], config["embedding_model"], config["persist_directory"],
+                   **kwargs)
+
+    @property
+    def embeddings(self):
+        with self.embeddings_lock:
+            if self._embeddings is None:
+                self._embeddings = EmbeddingService(load_embedding_model(self.embedding_model))
+            return self._embeddings
+
+    @property
+    def routed(self) -> bool:
+        """
+        Whether more than one collection is configured, i.e. retrieval has to be routed.
+        """
+        return sum(len(regulation.collections) for regulation in self.regulations.values()) > 1
+
+    def _load_collection(self, collection: str):
+        # LangChain and Chroma are only imported once a collection is needed
+        vectorstores = lazy_import("langchain_chroma.vectorstores")
+        vector_store = vectorstores.Chroma(
+            embedding_function=self.embeddings,
+            collection_name=collection,
+            persist_directory=self.persist_directory,
+        )
+        if RETRIEVAL_BACKEND == "memory":
+            from .memory_store import InMemoryVectorStore
+            vector_store = InMemoryVectorStore.from_chroma(vector_store)
+        # Build the (article, paragraph) index up front so the first query doesn't pay for it
+        if METADATA_INDEX_ENABLED:
+            load_corpus(vector_store)
+        return vector_store
+
+    def _evict(self):
+        # Called with the lock held
+        while len(self.stores) > self.max_loaded:
+            name = next((name for name in self.stores if name != self.default_collection), None)
+            if name is None:
+                return
+            vector_store = self.stores.pop(name)
+            corpus = invalidate_corpus(vector_store)
+            if corpus is not None:
+                invalidate_bm25_index(corpus)
+            # src.scope imports the registry
+            from .scope import invalidate_scope_classifier
+            invalidate_scope_classifier(vector_store)
+            self.counters["evictions"] += 1
+
+    def load(self, collection: str):
+        """
+        The vector store of a collection, loaded on first use.
+
+        Args:
+            collection (str): The collection name.
+
+        Returns:
+            The vector store.
+        """
+        with self.lock:
+            if collection in self.stores:
+                self.stores.move_to_end(collection)
+                self.counters["hits"] += 1
+                return self.stores[collection]
+            load_lock = self.load_locks.setdefault(collection, threading.Lock())
+
+        # Loading takes seconds; other collections stay available meanwhile
+        with load_lock:
+            with self.lock:
+                if collection in self.stores:
+                    self.counters["hits"] += 1
+                    return self.stores[collection]
+            vector_store = self._load_collection(collection)
+            with self.lock:
+                self.stores[collection] = vector_store
+                self.counters["loads"] += 1
+                self._evict()
+            return vector_store
+
+    def default_store(self):
+        """
+        The vector store of the default regulation's English collection.
+        """
+        return self.load(self.default_collection)
+
+    def route(self, sectors: list[str], language: str = DEFAULT_LANGUAGE) -> list[Route]:
+        """
+        Pick the collections to search for a question.
+
+        Args:
+            sectors (list[str]): Sectors mentioned in the question.
+            language (str): Language of the question.
+
+        Returns:
+            list[Route]: The collections to search: the default regulation first, then every
+                other regulation that applies to `sectors`.
+        """
+        others = [regulation for regulation in self.regulations.values()
+                  if regulation is not self.default and regulation.applies_to(sectors)]
+        routes = [regulation.route(language, self.multilingual) for regulation in [self.default, *others]]
+        with self.lock:
+            self.counters["routed"] += 1
+            self.counters["collections_searched"] += len(routes)
+        return routes
+
+    def missing_collections(self) -> list[tuple[Regulation, str, str]]:
+        """
+        The configured collections that are not in the Chroma directory.
+
+        Returns:
+            list[tuple]: (regulation, language, collection) of each missing collection. Empty if
+                the directory can't be read (Chroma reports it when the collection is loaded).
+        """
+        path = Path(self.persist_directory) / "chroma.sqlite3"
+        if not path.exists():
+            persisted = set()
+        else:
+            # Read Chroma's catalog directly, so the check needs neither chromadb nor the model
+            try:
+                connection = sqlite3.connect(f"{path.absolute().as_uri()}?mode=ro", uri=True)
+                try:
+                    persisted = {name for name, in connection.execute("SELECT name FROM collections")}
+                finally:
+                    connection.close()
+            except sqlite3.Error:
+                return []
+        return [(regulation, language, collection)
+                for regulation in self.regulations.values()
+                for language, collection in regulation.collections.items()
+                if collection not in persisted]
+
+    def embedding_stats(self) -> dict:
+        """
+        Stats of the shared embedding service (empty until the model is loaded).
+        """
+        return self._embeddings.stats() if self._embeddings is not None else {}
+
+    def stats(self) -> dict:
+        """
+        Loaded collections, load/eviction counters and the average fan-out of routed searches.
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            stats["loaded"] = list(self.stores)
+        stats["average_fan_out"] = stats["collections_searched"] / stats["routed"] if stats["routed"] else 0.0
+        return stats
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> CollectionRegistry:
+    """
+    The registry described by COLLECTIONS_CONFIG, created once.
+
+    Returns:
+        CollectionRegistry: The shared registry.
+
+    Raises:
+        ValueError: If a configured collection has not been built.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            registry = CollectionRegistry.from_yaml()
+            missing = registry.missing_collections()
+            if missing:
+                # Chroma would silently create an empty collection and every answer would lack context
+                commands = "\n".join(
+                    f"  python -m src.ingest <{regulation.name} PDF> --version-date <DD/MM/YYYY> "
+                    f"--language {language} --collection {collection} --model {registry.embedding_model} "
+                    f"--persist-directory {registry.persist_directory}"
+                    for regulation, language, collection in missing)
+                raise ValueError(f"{COLLECTIONS_CONFIG} names collections missing from "
+                                 f"{registry.persist_directory}. Build them with:\n{commands}")
+            _registry = registry
+        return _registry
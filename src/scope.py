@@ -0,0 +1,244 @@
+# Local scope classifier (article centroids and labeled questions), with the LLM for uncertain questions
+
+import os
+import asyncio
+import logging
+import threading
+import yaml
+import numpy as np
+from pathlib import Path
+from .extraction import extract_qa_scope, aextract_qa_scope, REFERENCE_PARSER_MIN_CONFIDENCE
+from .references import parse_references
+from .language import ARABIC_SCRIPT
+from .registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+# margin = best in-scope similarity - best out-of-scope similarity
+# margin >= SCOPE_IN_THRESHOLD -> in scope; margin <= SCOPE_OUT_THRESHOLD -> out of scope;
+# anything in between is the uncertain band that goes to the LLM.
+# These margins are not tuned yet: measure them with `python -m bench.scope_eval --sweep`
+# before enabling the local tier.
+SCOPE_IN_THRESHOLD = float(os.getenv("SCOPE_IN_THRESHOLD", "0.08"))
+SCOPE_OUT_THRESHOLD = float(os.getenv("SCOPE_OUT_THRESHOLD", "-0.08"))
+SCOPE_LOCAL_ENABLED = os.getenv("SCOPE_LOCAL_ENABLED", "0") == "1"
+# Share of non-ASCII letters above which a question is not treated as English
+NON_ENGLISH_LETTER_SHARE = 0.2
+
+script_location = Path(__file__).absolute().parent
+examples_location = script_location / 'scope_examples.yml'
+
+
+def _normalize_rows(matrix) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def article_centroids(vector_store) -> tuple[np.ndarray, list[int]]:
+    """
+    Mean (normalized) chunk embedding of every article in the collection.
+
+    Args:
+        vector_store: The vector store holding the regulation chunks.
+
+    Returns:
+        tuple[np.ndarray, list[int]]: The centroid matrix and the article number of each row.
+    """
+    records = vector_store._collection.get(include=["embeddings", "metadatas"])
+    embeddings = _normalize_rows(records["embeddings"])
+    by_article = {}
+    for row, metadata in enumerate(records["metadatas"]):
+        by_article.setdefault(metadata["article number"], []).append(row)
+    articles = sorted(by_article)
+    centroids = np.stack([embeddings[by_article[article]].mean(axis=0) for article in articles])
+    return _normalize_rows(centroids), articles
+
+
+def looks_english(question: str) -> bool:
+    """
+    Whether a question is written in English, as far as an English-only embedding model is
+    concerned: no Arabic script and mostly ASCII letters.
+    """
+    if ARABIC_SCRIPT.search(question):
+        return False
+    letters = [char for char in question if char.isalpha()]
+    if not letters:
+        return True
+    return sum(not char.isascii() for char in letters) / len(letters) <= NON_ENGLISH_LETTER_SHARE
+
+
+class ScopeClassifier:
+    """
+    Embedding-based scope classifier.
+
+    Args:
+        vector_store: The vector store whose collection and embedding model are used.
+        in_threshold (float): Margin at or above which a question is in scope.
+        out_threshold (float): Margin at or below which a question is out of scope.
+        examples_path (Path): YAML file with `in_scope` and `out_of_scope` example questions.
+        multilingual (bool): Whether the embedding model maps every language into one space;
+            when False, only English questions are scored locally.
+    """
+
+    def __init__(self, vector_store, in_threshold: float = SCOPE_IN_THRESHOLD,
+                 out_threshold: float = SCOPE_OUT_THRESHOLD, examples_path: Path = examples_location,
+                 multilingual: bool = False):
+        self.embeddings = vector_store.embeddings
+        self.in_threshold = in_threshold
+        self.out_threshold = out_threshold
+        self.multilingual = multilingual
+        self.centroids, self.articles = article_centroids(vector_store)
+        examples = yaml.safe_load(Path(examples_path).read_text())
+        self.in_examples = _normalize_rows(self.embeddings.embed_documents(examples["in_scope"]))
+        self.out_examples = _normalize_rows(self.embeddings.embed_documents(examples["out_of_scope"]))
+
+    def score(self, question: str, query_embedding=None) -> dict:
+        """
+        Score a question.
+
+        Args:
+            question (str): The input question.
+            query_embedding (list[float], optional): Precomputed embedding of the question.
+
+        Returns:
+            dict: "in_score", "out_score", "margin" and the "nearest_article".
+        """
+        if query_embedding is None:
+            query_embedding = self.embeddings.embed_query(question)
+        vector = _normalize_rows(query_embedding)
+        centroid_similarities = self.centroids @ vector
+        nearest = int(np.argmax(centroid_similarities))
+        in_score = max(float(centroid_similarities[nearest]), float(np.max(self.in_examples @ vector)))
+        out_score = float(np.max(self.out_examples @ vector))
+        return {
+            "in_score": in_score,
+            "out_score": out_score,
+            "margin": in_score - out_score,
+            "nearest_article": self.articles[nearest],
+        }
+
+    def decide(self, margin: float):
+        """
+        Returns True / False for a confident decision, or None inside the uncertain band.
+        """
+        if margin >= self.in_threshold:
+            return True
+        if margin <= self.out_threshold:
+            return False
+        return None
+
+    def classify(self, question: str, query_embedding=None):
+        """
+        Classify a question locally.
+
+        Args:
+            question (str): The input question.
+            query_embedding (list[float], optional): Precomputed embedding of the question.
+
+        Returns:
+            tuple[bool | None, dict]: The decision (None when uncertain or not English) and the score.
+        """
+        # Explicit article / paragraph references are always in scope
+        references, confidence = parse_references(question)
+        if references["articles"] and confidence >= REFERENCE_PARSER_MIN_CONFIDENCE:
+            return True, {"reference": True}
+        if not self.multilingual and not looks_english(question):
+            return None, {"non_english": True}
+        score = self.score(question, query_embedding)
+        return self.decide(score["margin"]), score
+
+
+# id(vector_store) -> (vector_store, ScopeClassifier), holding the store so its id cannot be
+# reused while the classifier is cached; the registry drops the entry when it evicts the store
+_classifiers = {}
+_classifiers_lock = threading.Lock()
+_counters = {"local_in_scope": 0, "local_out_of_scope": 0, "llm_calls": 0}
+
+
+def get_scope_classifier(vector_store) -> ScopeClassifier:
+    """
+    The scope classifier of a vector store, built once.
+
+    Args:
+        vector_store: The vector store.
+
+    Returns:
+        ScopeClassifier: The shared classifier.
+    """
+    key = id(vector_store)
+    with _classifiers_lock:
+        if key not in _classifiers:
+            classifier = ScopeClassifier(vector_store, multilingual=get_registry().multilingual)
+            _classifiers[key] = (vector_store, classifier)
+        return _classifiers[key][1]
+
+
+def invalidate_scope_classifier(vector_store):
+    """
+    Drop the cached scope classifier of a vector store (e.g. when the registry evicts it).
+    """
+    with _classifiers_lock:
+        _classifiers.pop(id(vector_store), None)
+
+
+def _count(counter: str):
+    with _classifiers_lock:
+        _counters[counter] += 1
+
+
+def scope_stats() -> dict:
+    """
+    How many questions were decided locally vs by the LLM.
+
+    Returns:
+        dict: Counters and the LLM-call reduction rate.
+    """
+    with _classifiers_lock:
+        counters = dict(_counters)
+    total = sum(counters.values())
+    counters["llm_call_reduction"] = 1 - counters["llm_calls"] / total if total else 0.0
+    return counters
+
+
+def _local_decision(question: str, vector_store, query_embedding=None):
+    if not SCOPE_LOCAL_ENABLED:
+        return None
+    decision, score = get_scope_classifier(vector_store).classify(question, query_embedding)
+    logger.debug("Local scope score: %s", score)
+    if decision is not None:
+        _count("local_in_scope" if decision else "local_out_of_scope")
+    return decision
+
+
+def classify_scope(question: str, vector_store, query_embedding=None) -> bool:
+    """
+    Decide whether a question is within the scope of the regulation, calling the LLM
+    classifier only when the local score is in the uncertain band.
+
+    Args:
+        question (str): The input question.
+        vector_store: The vector store used for the local classifier.
+        query_embedding (list[float], optional): Precomputed embedding of the question.
+
+    Returns:
+        bool: True if the question is within scope, False otherwise.
+    """
+    decision = _local_decision(question, vector_store, query_embedding)
+    if decision is not None:
+        return decision
+    _count("llm_calls")
+    return extract_qa_scope(question)
+
+
+async def aclassify_scope(question: str, vector_store, query_embedding=None) -> bool:
+    """
+    Async version of `classify_scope`.
+    """
+    # Embedding is CPU-bound, keep it off the event loop
+    decision = await asyncio.to_thread(_local_decision, question, vector_store, query_embedding)
+    if decision is not None:
+        return decision
+    _count("llm_calls")
+    return await aextract_qa_scope(question)
@@ -0,0 +1,314 @@
+# Semantic answer cache in front of query_response
+
+import os
+import time
+import asyncio
+import threading
+import hashlib
+import numpy as np
+from . import tracing
+from .q_and_a import query_response, aquery_response, stream_query_response, astream_query_response
+from .scope import looks_english
+from .registry import get_registry
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") == "1"
+# Minimum cosine similarity between question summaries for a cached answer to be reused
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+# How often (seconds) the collection is re-fingerprinted to detect re-indexing
+SEMANTIC_CACHE_FINGERPRINT_TTL = float(os.getenv("SEMANTIC_CACHE_FINGERPRINT_TTL", "60"))
+
+HISTOGRAM_BINS = 20
+
+
+def context_key(relevant_context: list[dict]) -> frozenset:
+    """
+    The set of (regulation, article, paragraph) keys of a retrieved context.
+
+    Args:
+        relevant_context (list[dict]): Output of `get_relevant_context`.
+
+    Returns:
+        frozenset: The article/paragraph set.
+    """
+    return frozenset((item.get("regulation", ""), str(item["article number"]), str(item["paragraph number"]))
+                     for item in relevant_context)
+
+
+def collection_fingerprint(vector_store) -> str:
+    """
+    Fingerprint of the chunks stored in the vector store's collection.
+
+    Args:
+        vector_store: The vector store.
+
+    Returns:
+        str: A digest that changes whenever chunks are added, removed or re-indexed.
+    """
+    collection = vector_store._collection
+    ids = sorted(collection.get(include=[])["ids"])
+    digest = hashlib.sha256()
+    digest.update(collection.name.encode("utf-8"))
+    for chunk_id in ids:
+        digest.update(chunk_id.encode("utf-8"))
+    return f"{len(ids)}:{digest.hexdigest()[:16]}"
+
+
+class SemanticAnswerCache:
+    """
+    Reuses the answer of an earlier question when its summary is a close paraphrase
+    (cosine similarity above `threshold`) and the retrieved article/paragraph set is identical.
+
+    Args:
+        threshold (float): Minimum cosine similarity for a hit.
+        max_entries (int): Maximum number of cached answers; the oldest are evicted first.
+        fingerprint_ttl (float): Seconds between checks of the collection fingerprint.
+        enabled (bool): When False every lookup is a miss and nothing is stored.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, fingerprint_ttl: float, enabled: bool = True):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.fingerprint_ttl = fingerprint_ttl
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.entries = []
+        self.fingerprint = None
+        self.fingerprint_checked = 0.0
+        self.counters = {"lookups": 0, "hits": 0, "misses": 0, "context_mismatches": 0, "invalidations": 0,
+                         "skipped": 0}
+        self.histogram = [0] * HISTOGRAM_BINS
+
+    def _check_collection(self, vector_store):
+        now = time.monotonic()
+        if self.fingerprint is not None and now - self.fingerprint_checked < self.fingerprint_ttl:
+            return
+        fingerprint = collection_fingerprint(vector_store)
+        with self.lock:
+            self.fingerprint_checked = now
+            if fingerprint != self.fingerprint:
+                if self.entries:
+                    self.counters["invalidations"] += 1
+                self.fingerprint = fingerprint
+                self.vectors = np.zeros((0, 0), dtype=np.float32)
+                self.entries = []
+
+    @staticmethod
+    def _comparable(question_summary: str | None) -> bool:
+        # An English-only embedding model gives noise similarities for other languages
+        return question_summary is None or looks_english(question_summary) or get_registry().multilingual
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector_store, query_embedding, relevant_context: list[dict], language: str = "English",
+               question_summary: str = None):
+        """
+        Find a cached answer for a question.
+
+        Args:
+            vector_store: The vector store the context was retrieved from.
+            query_embedding (list[float]): Embedding of the question summary.
+            relevant_context (list[dict]): The retrieved context.
+            language (str): Language of the answer.
+            question_summary (str, optional): The embedded text; questions that are not in English
+                are never matched unless the embedding model is multilingual.
+
+        Returns:
+            dict | None: The cached {"answer", "citations"} response, or None.
+        """
+        if not self.enabled:
+            return None
+        if not self._comparable(question_summary):
+            with self.lock:
+                self.counters["skipped"] += 1
+            return None
+        self._check_collection(vector_store)
+        vector = self._normalize(query_embedding)
+        key = (context_key(relevant_context), language)
+        with self.lock:
+            self.counters["lookups"] += 1
+            if not self.entries:
+                self.counters["misses"] += 1
+                tracing.add("cache_misses")
+                return None
+            similarities = self.vectors @ vector
+            best = int(np.argmax(similarities))
+            self.histogram[min(max(int(similarities[best] * HISTOGRAM_BINS), 0), HISTOGRAM_BINS - 1)] += 1
+
+            # Best match among entries retrieved from the same article/paragraph set, in the same language
+            matching = [i for i, entry in enumerate(self.entries) if entry["context"] == key]
+            if matching:
+                candidate = max(matching, key=lambda i: similarities[i])
+                if similarities[candidate] >= self.threshold:
+                    self.counters["hits"] += 1
+                    tracing.add("cache_hits")
+                    return dict(self.entries[candidate]["response"])
+            if similarities[best] >= self.threshold:
+                self.counters["context_mismatches"] += 1
+            self.counters["misses"] += 1
+            tracing.add("cache_misses")
+            return None
+
+    def store(self, vector_store, query_embedding, relevant_context: list[dict], response: dict,
+              language: str = "English", question_summary: str = None):
+        """
+        Cache the answer of a question.
+
+        Args:
+            vector_store: The vector store the context was retrieved from.
+            query_embedding (list[float]): Embedding of the question summary.
+            relevant_context (list[dict]): The retrieved context.
+            response (dict): The {"answer", "citations"} response.
+            language (str): Language of the answer.
+            question_summary (str, optional): The embedded text (see `lookup`).
+        """
+        if not self.enabled or not self._comparable(question_summary):
+            return
+        self._check_collection(vector_store)
+        vector = self._normalize(query_embedding)
+        with self.lock:
+            if self.vectors.size == 0:
+                self.vectors = vector[None, :]
+            else:
+                self.vectors = np.vstack([self.vectors, vector])
+            self.entries.append({"context": (context_key(relevant_context), language), "response": dict(response)})
+            if len(self.entries) > self.max_entries:
+                overflow = len(self.entries) - self.max_entries
+                self.vectors = self.vectors[overflow:]
+                self.entries = self.entries[overflow:]
+
+    def clear(self):
+        """
+        Drop every cached answer.
+        """
+        with self.lock:
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+            self.entries = []
+
+    def stats(self) -> dict:
+        """
+        Hit rate and the distribution of best-match similarities, for tuning the threshold.
+
+        Returns:
+            dict: Counters, hit rate, threshold and a similarity histogram.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            histogram = {
+                f"{i / HISTOGRAM_BINS:.2f}-{(i + 1) / HISTOGRAM_BINS:.2f}": count
+                for i, count in enumerate(self.histogram)
+            }
+            entries = len(self.entries)
+        counters["hit_rate"] = counters["hits"] / counters["lookups"] if counters["lookups"] else 0.0
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "entries": entries,
+            **counters,
+            "similarity_histogram": histogram,
+        }
+
+
+semantic_cache = SemanticAnswerCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    fingerprint_ttl=SEMANTIC_CACHE_FINGERPRINT_TTL,
+    enabled=SEMANTIC_CACHE_ENABLED,
+)
+
+
+def cached_query_response(question: str, conversation_history: list[str], relevant_context: list[dict],
+                          query_embedding, vector_store, language: str = "English", question_summary: str = None) -> dict:
+    """
+    `query_response` behind the semantic answer cache.
+
+    Args:
+        question (str): The input question.
+        conversation_history (list[str]): The conversation history.
+        relevant_context (list[dict]): The relevant context extracted from documents.
+        query_embedding (list[float]): Embedding of the question summary.
+        vector_store: The vector store the context was retrieved from.
+        language (str): Language to write the answer in.
+        question_summary (str, optional): The text `query_embedding` was computed from.
+
+    Returns:
+        dict: A dictionary containing the answer and citations.
+    """
+    response = semantic_cache.lookup(vector_store, query_embedding, relevant_context, language, question_summary)
+    if response is not None:
+        return response
+    response = query_response(question, conversation_history, relevant_context, language)
+    semantic_cache.store(vector_store, query_embedding, relevant_context, response, language, question_summary)
+    return response
+
+
+async def acached_query_response(question: str, conversation_history: list[str], relevant_context: list[dict],
+                                 query_embedding, vector_store, language: str = "English",
+                                 question_summary: str = None) -> dict:
+    """
+    Async version of `cached_query_response`.
+    """
+    # The collection fingerprint check reads Chroma synchronously: keep it off the event loop
+    response = await asyncio.to_thread(semantic_cache.lookup, vector_store, query_embedding, relevant_context,
+                                       language, question_summary)
+    if response is not None:
+        return response
+    response = await aquery_response(question, conversation_history, relevant_context, language)
+    await asyncio.to_thread(semantic_cache.store, vector_store, query_embedding, relevant_context, response,
+                            language, question_summary)
+    return response
+
+
+def stream_cached_query_response(question: str, conversation_history: list[str], relevant_context: list[dict],
+                                 query_embedding, vector_store, language: str = "English",
+                                 question_summary: str = None):
+    """
+    `stream_query_response` behind the semantic answer cache. A cached answer is emitted as a
+    single delta.
+
+    Args:
+        question (str): The input question.
+        conversation_history (list[str]): The conversation history.
+        relevant_context (list[dict]): The relevant context extracted from documents.
+        query_embedding (list[float]): Embedding of the question summary.
+        vector_store: The vector store the context was retrieved from.
+        language (str): Language to write the answer in.
+        question_summary (str, optional): The text `query_embedding` was computed from.
+
+    Yields:
+        dict: "delta" events, then the "response" event.
+    """
+    response = semantic_cache.lookup(vector_store, query_embedding, relevant_context, language, question_summary)
+    if response is not None:
+        yield {"type": "delta", "text": response["answer"]}
+        yield {"type": "response", "response": response}
+        return
+    for event in stream_query_response(question, conversation_history, relevant_context, language):
+        if event["type"] == "response":
+            semantic_cache.store(vector_store, query_embedding, relevant_context, event["response"], language,
+                                 question_summary)
+        yield event
+
+
+async def astream_cached_query_response(question: str, conversation_history: list[str], relevant_context: list[dict],
+                                        query_embedding, vector_store, language: str = "English",
+                                        question_summary: str = None):
+    """
+    Async version of `stream_cached_query_response`.
+    """
+    response = await asyncio.to_thread(semantic_cache.lookup, vector_store, query_embedding, relevant_context,
+                                       language, question_summary)
+    if response is not None:
+        yield {"type": "delta", "text": response["answer"]}
+        yield {"type": "response", "response": response}
+        return
+    async for event in astream_query_response(question, conversation_history, relevant_context, language):
+        if event["type"] == "response":
+            await asyncio.to_thread(semantic_cache.store, vector_store, query_embedding, relevant_context,
+                                    event["response"], language, question_summary)
+        yield event
@@ -0,0 +1,279 @@
+# Server-side conversation sessions: bounded history window plus a rolling summary
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # "memory" or "sqlite"
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "./sessions.sqlite3")
+# Sessions idle for longer than the TTL (seconds) are dropped
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 3600)))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+# Messages kept per session; older turns only survive through the rolling summary
+SESSION_HISTORY_WINDOW = int(os.getenv("SESSION_HISTORY_WINDOW", "20"))
+
+
+class Session:
+    """
+    A conversation: its recent (role, text) messages and a rolling summary of the conversation.
+
+    Args:
+        session_id (str): The session id.
+        messages (list[tuple[str, str]]): Recent messages, oldest first.
+        summary (str): Rolling summary of the conversation so far.
+        pending (int): Number of trailing messages not folded into the summary yet.
+        updated (float): Last write (epoch seconds).
+        displayed (list[str | None]): Text shown for each message when it differs from the
+            message itself (an answer with its references), else None.
+    """
+
+    def __init__(self, session_id: str, messages: list = None, summary: str = "", pending: int = 0,
+                 updated: float = None, displayed: list = None):
+        self.session_id = session_id
+        self.messages = [tuple(message) for message in messages or []]
+        self.summary = summary
+        self.pending = pending
+        self.updated = updated if updated is not None else time.time()
+        # Sessions saved before `displayed` existed show their plain messages
+        self.displayed = list(displayed) if displayed is not None else [None] * len(self.messages)
+
+    def add_turn(self, question: str, answer: str, window: int = SESSION_HISTORY_WINDOW, message: str = None):
+        """
+        Append a question / answer exchange, keeping only the last `window` messages.
+        `message` is the answer as displayed (with its references), when it differs.
+        """
+        self.messages.extend([("user", question), ("assistant", answer)])
+        self.displayed.extend([None, message if message != answer else None])
+        del self.messages[:-window]
+        del self.displayed[:-window]
+        self.pending = min(self.pending + 2, len(self.messages))
+        self.updated = time.time()
+
+    def pending_messages(self) -> list[tuple[str, str]]:
+        """
+        The messages not folded into the summary yet.
+        """
+        return self.messages[len(self.messages) - self.pending:]
+
+    def recent_messages(self) -> list[tuple[str, str]]:
+        """
+        The messages to send along with the summary: every message not folded into it, and
+        at least the last exchange. Without a summary, all messages.
+        """
+        if not self.summary:
+            return list(self.messages)
+        return self.messages[-max(self.pending, 2):]
+
+    def display_messages(self) -> list[tuple[str, str]]:
+        """
+        The (role, text) messages as they were shown to the user.
+        """
+        return [(role, shown or text) for (role, text), shown in zip(self.messages, self.displayed)]
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "session_id": self.session_id,
+            "messages": self.messages,
+            "summary": self.summary,
+            "pending": self.pending,
+            "updated": self.updated,
+            "displayed": self.displayed,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str) -> "Session":
+        return cls(**json.loads(data))
+
+
+class SessionStore:
+    """
+    Interface of a session store. Subclasses implement `get`, `put` and `delete`.
+
+    Args:
+        ttl_seconds (float): Idle time after which a session expires.
+        window (int): Messages kept per session.
+    """
+
+    def __init__(self, ttl_seconds: float = SESSION_TTL, window: int = SESSION_HISTORY_WINDOW):
+        self.ttl_seconds = ttl_seconds
+        self.window = window
+        # Serializes the read-modify-write updates (`add_turn`, `update_summary`) of this process
+        self.update_lock = threading.Lock()
+
+    def get(self, session_id: str):
+        """
+        The session, or None when it does not exist or has expired.
+        """
+        raise NotImplementedError
+
+    def put(self, session: Session):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def _expired(self, updated: float) -> bool:
+        return time.time() - updated > self.ttl_seconds
+
+    def load(self, session_id: str) -> Session:
+        """
+        The session, or a new empty one.
+        """
+        return self.get(session_id) or Session(session_id)
+
+    def add_turn(self, session: Session, question: str, answer: str, message: str = None) -> Session:
+        """
+        Record an exchange and save the session.
+
+        The exchange is appended to the stored session, not to `session`, so that a summary
+        folded in since `session` was loaded is kept.
+
+        Args:
+            session (Session): The session, as returned by `load`.
+            question (str): The user message.
+            answer (str): The assistant answer.
+            message (str, optional): The answer as displayed, with its references.
+
+        Returns:
+            Session: The updated session.
+        """
+        with self.update_lock:
+            session = self.get(session.session_id) or session
+            session.add_turn(question, answer, self.window, message)
+            self.put(session)
+        return session
+
+    def update_summary(self, session_id: str, summary: str, folded: int):
+        """
+        Store a new rolling summary that folds in the oldest `folded` pending messages.
+        Messages added while the summary was being computed stay pending.
+
+        Args:
+            session_id (str): The session id.
+            summary (str): The new summary.
+            folded (int): Number of pending messages the summary covers.
+        """
+        with self.update_lock:
+            session = self.get(session_id)
+            if session is None:
+                return
+            session.summary = summary
+            session.pending = max(session.pending - folded, 0)
+            self.put(session)
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Sessions in a process-local LRU.
+
+    Args:
+        max_sessions (int): Sessions kept; the least recently used are evicted first.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX_SESSIONS, **kwargs):
+        super().__init__(**kwargs)
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id: str):
+        with self.lock:
+            data = self.sessions.get(session_id)
+            if data is None:
+                return None
+            session = Session.from_json(data)
+            if self._expired(session.updated):
+                del self.sessions[session_id]
+                return None
+            self.sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session: Session):
+        # Stored serialized so callers can't mutate a stored session in place
+        with self.lock:
+            self.sessions[session.session_id] = session.to_json()
+            self.sessions.move_to_end(session.session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Sessions in a SQLite file, shared by every process on the host and kept across restarts.
+
+    Args:
+        path (str): The SQLite file.
+    """
+
+    def __init__(self, path: str = SESSION_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.writes_since_eviction = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self.connection is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT, updated REAL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        return self.connection
+
+    def get(self, session_id: str):
+        with self.lock:
+            row = self._db().execute("SELECT data, updated FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None or self._expired(row[1]):
+            return None
+        return Session.from_json(row[0])
+
+    def put(self, session: Session):
+        with self.lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)",
+                (session.session_id, session.to_json(), session.updated),
+            )
+            # TTL eviction is amortized over many writes
+            self.writes_since_eviction += 1
+            if self.writes_since_eviction >= 100:
+                self.writes_since_eviction = 0
+                db.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl_seconds,))
+
+    def delete(self, session_id: str):
+        with self.lock:
+            self._db().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """
+    The session store selected by SESSION_STORE, created once.
+
+    Returns:
+        SessionStore: The shared store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if SESSION_STORE == "sqlite":
+                _store = SqliteSessionStore()
+            elif SESSION_STORE == "memory":
+                _store = MemorySessionStore()
+            else:
+                raise ValueError(f"Unknown SESSION_STORE: {SESSION_STORE!r}")
+        return _store
@@ -0,0 +1,188 @@
+# Startup: lazy imports of heavy dependencies, background warm-up and readiness
+
+import os
+import sys
+import time
+import logging
+import importlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_QUERY = os.getenv("WARMUP_QUERY", "What are the rights of the personal data subject?")
+# Delay before the first retry of a failed warm-up; doubled after every failure, up to the max
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "300"))
+
+WARMUP_STEPS = ["embedding_model", "vector_store", "warmup_query", "scope_classifier"]
+
+_lock = threading.Lock()
+_imports = {}
+_steps = {name: {"status": "pending", "seconds": None} for name in WARMUP_STEPS}
+_warmup = {"status": "pending", "seconds": None, "error": None, "attempts": 0}
+_thread = None
+_ready = threading.Event()
+
+
+def record_import(name: str, seconds: float):
+    """
+    Record how long importing `name` (a module or an entry point's imports) took.
+    """
+    with _lock:
+        _imports.setdefault(name, seconds)
+
+
+def lazy_import(module: str):
+    """
+    Import a module on first use, recording how long the import took.
+
+    Args:
+        module (str): Dotted module name.
+
+    Returns:
+        The module.
+    """
+    loaded = sys.modules.get(module)
+    if loaded is not None:
+        return loaded
+    started = time.perf_counter()
+    loaded = importlib.import_module(module)
+    record_import(module, time.perf_counter() - started)
+    return loaded
+
+
+def _warm_scope_classifier(vector_store):
+    from .scope import SCOPE_LOCAL_ENABLED, get_scope_classifier
+    if SCOPE_LOCAL_ENABLED:
+        get_scope_classifier(vector_store)
+
+
+def _warm_query(vector_store):
+    # Runs the retrieval path once: query embedding, HNSW search and the BM25 index
+    from .q_and_a import HYBRID_SEARCH_ENABLED, embed_query, search_similar_chunks
+    from .bm25 import lexical_search
+    embedding = embed_query(WARMUP_QUERY, vector_store)
+    search_similar_chunks(WARMUP_QUERY, vector_store, k=1, query_embedding=embedding)
+    if HYBRID_SEARCH_ENABLED:
+        lexical_search(WARMUP_QUERY, vector_store, k=1)
+
+
+def _run_step(name: str, func):
+    with _lock:
+        _steps[name]["status"] = "loading"
+    started = time.perf_counter()
+    try:
+        result = func()
+    except Exception:
+        with _lock:
+            _steps[name]["status"] = "failed"
+        raise
+    seconds = time.perf_counter() - started
+    with _lock:
+        _steps[name].update(status="ready", seconds=seconds)
+    logger.info("Warm-up: %s ready in %.2fs", name, seconds)
+    return result
+
+
+def warm_up():
+    """
+    Load the embedding model and the default collection, then run a retrieval query and build
+    the scope classifier, so the first question doesn't pay for any of it. Safe to call more
+    than once; later calls return immediately.
+
+    Returns:
+        The default vector store.
+    """
+    from .registry import get_registry
+    registry = get_registry()
+    with _lock:
+        if _warmup["status"] == "ready":
+            return registry.default_store()
+        _warmup.update(status="loading", error=None)
+        _warmup["attempts"] += 1
+
+    started = time.perf_counter()
+    try:
+        _run_step("embedding_model", lambda: registry.embeddings)
+        vector_store = _run_step("vector_store", registry.default_store)
+        _run_step("warmup_query", lambda: _warm_query(vector_store))
+        _run_step("scope_classifier", lambda: _warm_scope_classifier(vector_store))
+    except Exception as e:
+        with _lock:
+            _warmup.update(status="failed", error=str(e))
+        logger.warning("Warm-up failed: %s", e)
+        raise
+    with _lock:
+        _warmup.update(status="ready", seconds=time.perf_counter() - started)
+    _ready.set()
+    logger.info("Warm-up done in %.2fs", _warmup["seconds"])
+    return vector_store
+
+
+def start_warmup() -> threading.Thread:
+    """
+    Run `warm_up` in a background thread (once), so the app can answer readiness probes while
+    it loads. A failed warm-up is retried after WARMUP_RETRY_SECONDS, doubling the delay after
+    every failure. With WARMUP_ENABLED=0 nothing is loaded until the first question needs it,
+    and the app reports ready right away.
+
+    Returns:
+        threading.Thread: The warm-up thread, or None if warm-up is disabled.
+    """
+    global _thread
+
+    def run():
+        delay = WARMUP_RETRY_SECONDS
+        while True:
+            try:
+                warm_up()
+                return
+            except Exception:
+                # Reported by startup_report() until a retry succeeds
+                logger.info("Retrying warm-up in %.0fs", delay)
+                time.sleep(delay)
+                delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+
+    if not WARMUP_ENABLED:
+        _ready.set()
+        return None
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=run, name="warm-up", daemon=True)
+            _thread.start()
+        return _thread
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def wait_until_ready(timeout: float = None) -> bool:
+    """
+    Block until warm-up has finished.
+
+    Returns:
+        bool: Whether warm-up finished within `timeout`.
+    """
+    return _ready.wait(timeout)
+
+
+def startup_report() -> dict:
+    """
+    Readiness and cold-start timings: warm-up status and progress, each warm-up step's status
+    and duration, and the recorded import durations.
+    """
+    with _lock:
+        steps = {name: dict(step) for name, step in _steps.items()}
+        report = {
+            "ready": _ready.is_set(),
+            "status": _warmup["status"],
+            "error": _warmup["error"],
+            "attempts": _warmup["attempts"],
+            "progress": sum(step["status"] == "ready" for step in steps.values()) / len(steps),
+            "steps": steps,
+            "warmup_seconds": _warmup["seconds"],
+            "import_seconds": dict(_imports),
+        }
+    return report
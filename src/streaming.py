@@ -0,0 +1,150 @@
+# Incremental extraction of a JSON string field from a streamed structured-output response
+
+import json
+
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+TEXT_DELTA_EVENT = "response.output_text.delta"
+FAILED_EVENTS = ("response.failed", "response.incomplete", "error")
+
+
+class JsonFieldStreamer:
+    """
+    Streams the decoded value of a top-level string field of a JSON object.
+
+    Args:
+        field (str): Name of the top-level string field to stream.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.chunks = []
+        self.depth = 0
+        self.in_string = False
+        self.is_key = False
+        self.capturing = False
+        self.expect_value = False
+        self.escape = None
+        self.high_surrogate = None
+        self.key = []
+        self.last_key = None
+
+    @property
+    def text(self) -> str:
+        """
+        The raw JSON received so far.
+        """
+        return "".join(self.chunks)
+
+    def _emit(self, char: str, out: list):
+        if self.is_key:
+            self.key.append(char)
+        elif self.capturing:
+            out.append(char)
+
+    def _string_char(self, ch: str, out: list):
+        if self.escape == "\\":
+            if ch == "u":
+                self.escape = "u"
+            else:
+                self.escape = None
+                self._emit(ESCAPES.get(ch, ch), out)
+        elif self.escape is not None:
+            self.escape += ch
+            if len(self.escape) < 5:
+                return
+            code = int(self.escape[1:], 16)
+            self.escape = None
+            if 0xD800 <= code < 0xDC00:
+                self.high_surrogate = code
+                return
+            if 0xDC00 <= code < 0xE000 and self.high_surrogate is not None:
+                code = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self.high_surrogate = None
+            self._emit(chr(code), out)
+        elif ch == "\\":
+            self.escape = "\\"
+        elif ch == '"':
+            self.in_string = False
+            if self.is_key:
+                self.last_key = "".join(self.key)
+            self.is_key = False
+            self.capturing = False
+        else:
+            self._emit(ch, out)
+
+    def feed(self, chunk: str) -> str:
+        """
+        Consume the next fragment of JSON.
+
+        Args:
+            chunk (str): The fragment.
+
+        Returns:
+            str: The newly decoded characters of the field (possibly empty).
+        """
+        self.chunks.append(chunk)
+        out = []
+        for ch in chunk:
+            if self.in_string:
+                self._string_char(ch, out)
+            elif ch == '"':
+                self.in_string = True
+                if self.depth == 1 and not self.expect_value:
+                    self.is_key = True
+                    self.key = []
+                else:
+                    self.capturing = self.depth == 1 and self.expect_value and self.last_key == self.field
+                    self.expect_value = False
+            elif ch in "{[":
+                self.depth += 1
+                self.expect_value = False
+            elif ch in "}]":
+                self.depth -= 1
+            elif self.depth == 1 and ch == ":":
+                self.expect_value = True
+            elif self.depth == 1 and not ch.isspace():
+                # "," or the first character of a non-string value
+                self.expect_value = False
+        return "".join(out)
+
+
+def _check(event):
+    if event.type in FAILED_EVENTS:
+        raise RuntimeError(f"Streaming response failed: {event.type}")
+
+
+def stream_json_field(events, field: str):
+    """
+    Turn Responses API stream events into answer events.
+
+    Args:
+        events: Iterable of Responses API stream events.
+        field (str): The top-level string field to stream.
+
+    Yields:
+        dict: {"type": "delta", "text": ...} for each new piece of the field, then
+            {"type": "response", "response": <the parsed JSON object>}.
+    """
+    streamer = JsonFieldStreamer(field)
+    for event in events:
+        _check(event)
+        if event.type == TEXT_DELTA_EVENT:
+            text = streamer.feed(event.delta)
+            if text:
+                yield {"type": "delta", "text": text}
+    yield {"type": "response", "response": json.loads(streamer.text)}
+
+
+async def astream_json_field(events, field: str):
+    """
+    Async version of `stream_json_field`.
+    """
+    streamer = JsonFieldStreamer(field)
+    async for event in events:
+        _check(event)
+        if event.type == TEXT_DELTA_EVENT:
+            text = streamer.feed(event.delta)
+            if text:
+                yield {"type": "delta", "text": text}
+    yield {"type": "response", "response": json.loads(streamer.text)}
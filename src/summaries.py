@@ -0,0 +1,225 @@
+# Rolling conversation summaries, and the check that skips the standalone-question rewrite
+
+import os
+import re
+import json
+import asyncio
+import logging
+import threading
+from .functions import conversation_summary_format
+from .llm import DEFAULT_MODEL, prompts, create_response, acreate_response
+from .context import measure_prompt
+from .cache import response_cache
+from .language import ARABIC_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+# Pending messages needed before the rolling summary is updated (4 = every second exchange)
+SUMMARY_FOLD_MESSAGES = int(os.getenv("SUMMARY_FOLD_MESSAGES", "4"))
+SELF_CONTAINED_CHECK_ENABLED = os.getenv("SELF_CONTAINED_CHECK_ENABLED", "1") == "1"
+# Questions shorter than this are treated as follow-ups ("and paragraph 2?")
+SELF_CONTAINED_MIN_WORDS = int(os.getenv("SELF_CONTAINED_MIN_WORDS", "4"))
+
+# Words that usually point back to earlier turns
+FOLLOW_UP_WORDS = re.compile(
+    r"\b(it|its|it's|this|these|those|they|them|their|theirs|he|she|him|her|his|hers|such|same|"
+    r"above|previous|previously|earlier|former|latter|aforementioned|mentioned|else|also|too|"
+    r"another|again)\b",
+    re.IGNORECASE,
+)
+# Elliptical openings ("and for banks?", "what about paragraph 3?")
+FOLLOW_UP_OPENINGS = re.compile(
+    r"^\s*(and|or|but|so|then|what about|how about|what if|why not|how so|same for|ok|okay)\b",
+    re.IGNORECASE,
+)
+
+_counters = {"no_history": 0, "self_contained": 0, "rewritten": 0, "folds": 0, "folded_messages": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(counter: str, amount: int = 1):
+    with _counters_lock:
+        _counters[counter] += amount
+
+
+def is_self_contained(question: str) -> bool:
+    """
+    Whether a question can be understood without the conversation: long enough, with no
+    pronouns or references pointing back, and no elliptical opening.
+
+    Arabic questions are never treated as self-contained, since pronouns are usually attached
+    to the word (e.g. "معالجتها") and a word-level check would miss them.
+
+    Args:
+        question (str): The user question.
+
+    Returns:
+        bool: True if the question does not need the conversation history.
+    """
+    if ARABIC_SCRIPT.search(question):
+        return False
+    if "..." in question or "…" in question:
+        return False
+    if len(question.split()) < SELF_CONTAINED_MIN_WORDS:
+        return False
+    return not (FOLLOW_UP_WORDS.search(question) or FOLLOW_UP_OPENINGS.search(question))
+
+
+def needs_question_summary(question: str, conversation_history: list[str]) -> bool:
+    """
+    Whether the standalone-question rewrite has to run for this turn.
+
+    Args:
+        question (str): The user question.
+        conversation_history (list[str]): The formatted conversation history.
+
+    Returns:
+        bool: False when there is no history or the question is self-contained.
+    """
+    if not conversation_history:
+        _count("no_history")
+        return False
+    if SELF_CONTAINED_CHECK_ENABLED and is_self_contained(question):
+        _count("self_contained")
+        return False
+    _count("rewritten")
+    return True
+
+
+def summary_stats() -> dict:
+    """
+    How often the standalone-question rewrite was skipped, and rolling summary updates.
+
+    Returns:
+        dict: Counters and the rewrite skip rate.
+    """
+    with _counters_lock:
+        counters = dict(_counters)
+    turns = counters["no_history"] + counters["self_contained"] + counters["rewritten"]
+    counters["rewrite_skip_rate"] = 1 - counters["rewritten"] / turns if turns else 0.0
+    return counters
+
+
+def format_messages(messages: list[tuple[str, str]]) -> list[str]:
+    """
+    Format (role, text) messages as "User: ..." / "Assistant: ..." lines.
+    """
+    return [f"{'User' if role == 'user' else 'Assistant'}: {text}" for role, text in messages]
+
+
+def _rolling_summary_request(summary: str, messages: list[str]) -> dict:
+    system_prompt = prompts["prompts"]["rolling_summary"]["system_prompt"]
+    user_prompt = prompts["prompts"]["rolling_summary"]["user_prompt"]
+
+    # Replace user_prompt placeholders for: summary, messages
+    user_prompt = user_prompt.replace("{{ summary }}", summary)
+    user_prompt = user_prompt.replace("{{ messages }}", "\n".join(messages))
+    measure_prompt("rolling_summary", system=system_prompt, user=user_prompt)
+
+    return dict(
+        model=DEFAULT_MODEL,
+        input=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+                ],
+        text = conversation_summary_format
+    )
+
+
+@response_cache.memoize("rolling_summary")
+def update_conversation_summary(summary: str, messages: list[str]) -> str:
+    """
+    Fold new messages into a conversation summary.
+
+    Args:
+        summary (str): The current summary (may be empty).
+        messages (list[str]): The new messages, formatted by `format_messages`.
+
+    Returns:
+        str: The updated summary.
+    """
+    response = create_response(**_rolling_summary_request(summary, messages))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict["summary"]
+
+
+@response_cache.memoize("rolling_summary")
+async def aupdate_conversation_summary(summary: str, messages: list[str]) -> str:
+    """
+    Async version of `update_conversation_summary`.
+    """
+    response = await acreate_response(**_rolling_summary_request(summary, messages))
+
+    response_dict = json.loads(response.output_text)
+    return response_dict["summary"]
+
+
+def fold_due(store, session, in_scope: bool) -> bool:
+    """
+    Whether to refresh the rolling summary after a turn. Out-of-scope turns are normally
+    folded with the next in-scope one, but once the next exchange would push unfolded
+    messages out of the history window, the fold runs whatever the scope result.
+
+    Args:
+        store: The session store.
+        session (Session): The session, as returned by `store.add_turn`.
+        in_scope (bool): Whether the turn was in scope.
+
+    Returns:
+        bool: True if `refresh_summary` should be scheduled.
+    """
+    return in_scope or session.pending > store.window - 2
+
+
+def _pending(store, session_id: str, min_messages: int):
+    session = store.get(session_id)
+    if session is None or session.pending < min_messages:
+        return None, []
+    return session, session.pending_messages()
+
+
+def refresh_summary(store, session_id: str, min_messages: int = SUMMARY_FOLD_MESSAGES):
+    """
+    Fold a session's pending messages into its rolling summary once enough have accumulated.
+    Meant to run after the answer has been returned.
+
+    Args:
+        store: The session store.
+        session_id (str): The session id.
+        min_messages (int): Minimum number of pending messages to update the summary.
+    """
+    session, messages = _pending(store, session_id, min_messages)
+    if not messages:
+        return
+    try:
+        summary = update_conversation_summary(session.summary, format_messages(messages))
+    except Exception as e:
+        logger.warning("Error in rolling summary: %s", e)
+        return
+    store.update_summary(session_id, summary, len(messages))
+    _count("folds")
+    _count("folded_messages", len(messages))
+
+
+async def arefresh_summary(store, session_id: str, min_messages: int = SUMMARY_FOLD_MESSAGES):
+    """
+    Async version of `refresh_summary`. The store reads and writes run in a worker thread.
+    """
+    session, messages = await asyncio.to_thread(_pending, store, session_id, min_messages)
+    if not messages:
+        return
+    try:
+        summary = await aupdate_conversation_summary(session.summary, format_messages(messages))
+    except Exception as e:
+        logger.warning("Error in rolling summary: %s", e)
+        return
+    await asyncio.to_thread(store.update_summary, session_id, summary, len(messages))
+    _count("folds")
+    _count("folded_messages", len(messages))
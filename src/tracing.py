@@ -0,0 +1,323 @@
+# Per-stage spans (latency, queue time, tokens, cache hits), /metrics histograms and OTLP/JSON export
+
+import os
+import json
+import time
+import logging
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "regulatory-compliance-assistant")
+
+# Upper bounds of the histogram buckets (an implicit +Inf bucket follows)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+HISTOGRAMS = {
+    "wall_seconds": LATENCY_BUCKETS,
+    "queue_seconds": LATENCY_BUCKETS,
+    "input_tokens": TOKEN_BUCKETS,
+    "output_tokens": TOKEN_BUCKETS,
+}
+
+logger = logging.getLogger("src")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    One timed operation of a trace.
+
+    Args:
+        name (str): Name of the operation (e.g. the pipeline stage).
+        parent (Span, optional): Enclosing span; a span without one starts a new trace.
+        **attributes: Initial attributes.
+    """
+
+    def __init__(self, name: str, parent: "Span" = None, **attributes):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.started = time.perf_counter()
+        self.end_ns = None
+        self.seconds = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def set(self, key: str, value):
+        with self.lock:
+            self.attributes[key] = value
+
+    def add(self, key: str, amount=1):
+        with self.lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        self.end_ns = self.start_ns + int(self.seconds * 1e9)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with a running sum, Prometheus style.
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th quantile (the largest finite bound for +Inf).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": buckets,
+        }
+
+
+class SpanMetrics:
+    """
+    Per-span-name histograms and counters of finished spans.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def record(self, span: Span):
+        attributes = dict(span.attributes)
+        attributes["wall_seconds"] = span.seconds
+        with self.lock:
+            stage = self.stages.get(span.name)
+            if stage is None:
+                stage = self.stages[span.name] = {
+                    "spans": 0,
+                    "errors": 0,
+                    "llm_calls": 0,
+                    "cache_hits": 0,
+                    "cache_misses": 0,
+                    "models": {},
+                    "histograms": {name: Histogram(buckets) for name, buckets in HISTOGRAMS.items()},
+                }
+            stage["spans"] += 1
+            stage["errors"] += span.error is not None
+            for counter in ("llm_calls", "cache_hits", "cache_misses"):
+                stage[counter] += attributes.get(counter, 0)
+            if "model" in attributes:
+                stage["models"][attributes["model"]] = stage["models"].get(attributes["model"], 0) + 1
+            for name, histogram in stage["histograms"].items():
+                if name == "wall_seconds" or name in attributes:
+                    histogram.observe(attributes[name])
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                name: {
+                    **{key: value for key, value in stage.items() if key not in ("histograms", "models")},
+                    "models": dict(stage["models"]),
+                    **{metric: histogram.snapshot() for metric, histogram in stage["histograms"].items()},
+                }
+                for name, stage in self.stages.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+
+span_metrics = SpanMetrics()
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_span(span: Span) -> dict:
+    """
+    A finished span in the OTLP/JSON span format.
+    """
+    record = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error is not None else {"code": 1},
+    }
+    if span.parent is not None:
+        record["parentSpanId"] = span.parent.span_id
+    return record
+
+
+class SpanExporter:
+    """
+    Appends finished spans to a JSONL file, one OTLP/JSON export request per line (the format
+    of the OpenTelemetry Collector's file exporter, readable by its otlpjsonfile receiver).
+
+    Args:
+        path (str): The JSONL file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def export(self, span: Span):
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "src.tracing"}, "spans": [otlp_span(span)]}],
+        }]}, ensure_ascii=False)
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(line + "\n")
+            self.file.flush()
+
+
+exporter = SpanExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None
+
+
+def current_span():
+    """
+    The innermost open span of the calling context, or None.
+    """
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, parent: Span = None, **attributes):
+    """
+    Time a block as a span, child of `parent` (default: the current span).
+
+    Args:
+        name (str): Name of the span.
+        parent (Span, optional): Explicit parent.
+        **attributes: Initial attributes.
+
+    Yields:
+        Span: The open span; it is the current span inside the block.
+    """
+    current = Span(name, parent if parent is not None else _current.get(), **attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # A generator holding the span was closed from another context
+            pass
+        current.finish()
+        span_metrics.record(current)
+        if exporter is not None:
+            try:
+                exporter.export(current)
+            except OSError as e:
+                logger.warning("Span export failed: %s", e)
+
+
+def add(key: str, amount=1):
+    """
+    Add to a counter attribute (e.g. "cache_hits") of the current span, if any.
+    """
+    current = _current.get()
+    if current is not None:
+        current.add(key, amount)
+
+
+def record_llm_call(model: str, queue_seconds: float, input_tokens: int, output_tokens: int):
+    """
+    Attribute an LLM call to the current span: its model, queue time and tokens.
+    """
+    current = _current.get()
+    if current is None:
+        return
+    current.set("model", model)
+    current.add("llm_calls")
+    current.add("queue_seconds", queue_seconds)
+    current.add("input_tokens", input_tokens)
+    current.add("output_tokens", output_tokens)
+
+
+def get_span_metrics() -> dict:
+    """
+    Per-stage span counts, LLM calls, cache hits, models and histograms of wall time, queue
+    time and tokens.
+    """
+    return span_metrics.snapshot()
+
+
+def prometheus_metrics() -> str:
+    """
+    The span histograms in the Prometheus text exposition format.
+    """
+    lines = []
+    snapshot = get_span_metrics()
+    for metric in HISTOGRAMS:
+        name = f"stage_{metric}"
+        lines.append(f"# TYPE {name} histogram")
+        for stage, stats in snapshot.items():
+            histogram = stats[metric]
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram["count"]}')
+    for counter in ("llm_calls", "cache_hits", "cache_misses", "errors"):
+        lines.append(f"# TYPE stage_{counter}_total counter")
+        for stage, stats in snapshot.items():
+            lines.append(f'stage_{counter}_total{{stage="{stage}"}} {stats[counter]}')
+    return "\n".join(lines) + "\n"
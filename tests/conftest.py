@@ -0,0 +1,18 @@
+# Test settings. The OpenAI client needs an API key at import time, so a dummy one is set.
+# The LLM response cache and the session store write to a scratch directory, and no test
+# reaches the network.
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_scratch = Path(tempfile.mkdtemp(prefix="compliance-assistant-tests-"))
+
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("LLM_CACHE_PATH", str(_scratch / "llm_cache.sqlite3"))
+os.environ.setdefault("SESSION_DB_PATH", str(_scratch / "sessions.sqlite3"))
+os.environ.setdefault("ARTIFACTS_PATH", str(_scratch / "chunk_artifacts.sqlite3"))
+
+# `src` is imported as a namespace package from the repository root
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
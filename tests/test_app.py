@@ -0,0 +1,56 @@
+import pytest
+from fastapi.testclient import TestClient
+import app as app_module
+from src.sessions import MemorySessionStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = MemorySessionStore(window=6)
+    turns = []
+    refreshes = []
+
+    async def arun_turn(question, language, history, vector_store, summary=""):
+        turns.append({"question": question, "history": history, "summary": summary})
+        in_scope = question != "weather?"
+        return {"in_scope": in_scope, "answer": f"answer to {question}", "citations": [],
+                "message": f"answer to {question} + references", "question_summary": question, "timings": {}}
+
+    async def arefresh_summary(store, session_id):
+        refreshes.append(session_id)
+
+    monkeypatch.setattr(app_module, "get_session_store", lambda: store)
+    monkeypatch.setattr(app_module, "get_vector_store", lambda: None)
+    monkeypatch.setattr(app_module, "arun_turn", arun_turn)
+    monkeypatch.setattr(app_module, "arefresh_summary", arefresh_summary)
+    # No lifespan: nothing is warmed up
+    client = TestClient(app_module.app)
+    client.turns, client.refreshes = turns, refreshes
+    return client
+
+
+def test_chat_keeps_the_conversation_per_session(client):
+    first = client.post("/chat", params={"question": "What is personal data?"}).json()
+    session_id = first["session_id"]
+    second = client.post("/chat", params={"question": "Does it apply to banks?", "session_id": session_id}).json()
+
+    assert second["session_id"] == session_id
+    assert client.turns[0]["history"] == []
+    assert client.turns[1]["history"] == [("user", "What is personal data?"),
+                                          ("assistant", "answer to What is personal data?")]
+    assert client.refreshes == [session_id, session_id]
+
+    session = client.get(f"/chat/{session_id}").json()
+    assert session["display_messages"][-1] == ["assistant", "answer to Does it apply to banks? + references"]
+
+
+def test_out_of_scope_turns_do_not_refresh_the_summary(client):
+    client.post("/chat", params={"question": "weather?"})
+    assert client.refreshes == []
+
+
+def test_deleted_sessions_are_gone(client):
+    session_id = client.post("/chat", params={"question": "Hi there"}).json()["session_id"]
+
+    assert client.delete(f"/chat/{session_id}").json() == {"session_id": session_id, "deleted": True}
+    assert client.get(f"/chat/{session_id}").status_code == 404
@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+from src import artifacts as artifacts_module
+from src.artifacts import ChunkArtifacts, build_artifacts, localized_paragraph
+from src.chat import format_message
+from src.corpus import Corpus
+from src.registry import get_registry
+
+REGULATION = get_registry().default
+
+
+def corpus(chunks: list[tuple]) -> Corpus:
+    return Corpus([str(index) for index in range(len(chunks))], [text for _, _, text in chunks],
+                  [{"article number": article, "paragraph number": paragraph} for article, paragraph, _ in chunks])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkArtifacts(str(tmp_path / "artifacts.sqlite3"))
+
+
+@pytest.fixture
+def collections(monkeypatch):
+    # collection name -> chunks, read by the build instead of Chroma
+    chunks = {REGULATION.collections["English"]: [
+        (1, "1", "This law applies to every entity\nprocessing personal data."),
+        (5, "1", "The controller shall keep a record of processing activities."),
+        (5, "2", "The data subject may request the deletion of their personal data."),
+    ]}
+    monkeypatch.setattr(artifacts_module, "_collection_corpus", lambda collection: corpus(chunks[collection]))
+    return chunks
+
+
+@pytest.fixture
+def translations(monkeypatch):
+    translated = []
+
+    async def translate(text):
+        translated.append(text)
+        return {"translation": f"ترجمة: {text}"}
+
+    monkeypatch.setattr(artifacts_module, "aenglish_to_arabic_translation", translate)
+    return translated
+
+
+def build(store) -> dict:
+    return asyncio.run(build_artifacts([REGULATION.key], store=store))[REGULATION.key]
+
+
+def test_build_translates_every_paragraph(store, collections, translations):
+    report = build(store)
+
+    assert report == {"paragraphs": 3, "built": 3, "unchanged": 0, "deleted": 0, "translated": 3, "failed": 0}
+    row = store.lookup(REGULATION.key, 1, 1)
+    # Canonical text: the PDF line break is collapsed
+    assert row["text"] == "This law applies to every entity processing personal data."
+    assert row["arabic"] == "ترجمة: This law applies to every entity processing personal data."
+    assert row["arabic_source"] == "translated"
+    assert row["summary"] == ""
+
+
+def test_rebuild_only_touches_changed_paragraphs(store, collections, translations):
+    build(store)
+    translations.clear()
+    assert build(store) == {"paragraphs": 3, "built": 0, "unchanged": 3, "deleted": 0, "translated": 0, "failed": 0}
+    assert translations == []
+
+    english = collections[REGULATION.collections["English"]]
+    english[2] = (5, "2", "The data subject may request the erasure of their personal data.")
+    del english[0]
+    assert build(store) == {"paragraphs": 2, "built": 1, "unchanged": 1, "deleted": 1, "translated": 1, "failed": 0}
+    assert translations == ["The data subject may request the erasure of their personal data."]
+    assert store.lookup(REGULATION.key, 1, 1) is None
+    assert store.lookup(REGULATION.key, 5, 2)["arabic"].endswith("erasure of their personal data.")
+
+
+def test_official_arabic_text_is_used_when_available(store, collections, translations, monkeypatch):
+    monkeypatch.setitem(REGULATION.collections, "Arabic", "pdpl_ar")
+    collections["pdpl_ar"] = [(5, "1", "يلتزم المتحكم بالاحتفاظ بسجل لأنشطة المعالجة.")]
+
+    report = build(store)
+    assert report["translated"] == 2
+    row = store.lookup(REGULATION.key, 5, 1)
+    assert (row["arabic"], row["arabic_source"]) == ("يلتزم المتحكم بالاحتفاظ بسجل لأنشطة المعالجة.", "official")
+    assert len(translations) == 2
+
+
+def test_failed_paragraphs_are_retried_on_the_next_build(store, collections, monkeypatch):
+    async def unavailable(text):
+        raise RuntimeError("translation service unavailable")
+
+    monkeypatch.setattr(artifacts_module, "aenglish_to_arabic_translation", unavailable)
+    assert build(store)["failed"] == 3
+
+    async def translate(text):
+        return {"translation": "ترجمة"}
+
+    monkeypatch.setattr(artifacts_module, "aenglish_to_arabic_translation", translate)
+    assert build(store)["built"] == 3
+
+
+def test_lookup_rereads_the_file_after_a_build(store, tmp_path):
+    # A missing file means nothing is built yet, and is not created by a lookup
+    assert store.lookup(REGULATION.key, 5, 1) is None
+    assert not (tmp_path / "artifacts.sqlite3").exists()
+
+    builder = ChunkArtifacts(store.path)
+    builder.write([{"regulation": REGULATION.key, "article": 5, "paragraph": "1", "source_hash": "x",
+                    "text": "The controller shall keep a record.", "arabic": "يحتفظ المتحكم بسجل.",
+                    "arabic_source": "translated", "summary": "", "built": 0.0}])
+
+    assert store.lookup(REGULATION.key, 5, 1)["arabic"] == "يحتفظ المتحكم بسجل."
+    assert store.stats()["paragraphs"] == 1
+
+
+def test_arabic_message_shows_the_arabic_paragraph(store, collections, translations, monkeypatch):
+    build(store)
+    monkeypatch.setattr(artifacts_module, "artifacts", store)
+    citation = {"article": 5, "paragraph": 1, "text": "keep a record of processing activities", "status": "verified"}
+
+    localized = localized_paragraph(citation, "Arabic")
+    assert localized == {"text": "ترجمة: The controller shall keep a record of processing activities.",
+                         "source": "translated"}
+    assert localized_paragraph(citation, "English") is None
+    # Excerpts already in Arabic need no Arabic version
+    assert localized_paragraph({**citation, "text": "بسجل لأنشطة المعالجة"}, "Arabic") is None
+
+    message = format_message("الإجابة", [citation], "Arabic")
+    assert message.splitlines()[-2:] == [
+        "- المادة 5، الفقرة 1: keep a record of processing activities",
+        "  ترجمة الفقرة (آلية): ترجمة: The controller shall keep a record of processing activities.",
+    ]
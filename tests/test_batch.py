@@ -0,0 +1,144 @@
+import json
+import asyncio
+import pytest
+from src import batch, chat
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(list(texts))
+        return [[float(index)] for index in range(len(texts))]
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.embeddings = FakeEmbeddings()
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+
+
+def read_jsonl(path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_parse_requests_defaults_id_and_language():
+    lines = ['{"question": "What is personal data?"}', "", '{"id": 7, "question": "ما هي", "language": "Arabic"}']
+
+    assert batch.parse_requests(lines) == [
+        {"id": "1", "question": "What is personal data?", "language": "English"},
+        {"id": "7", "question": "ما هي", "language": "Arabic"},
+    ]
+
+
+def test_group_requests_merges_normalized_duplicates_per_language():
+    requests = [
+        {"id": "1", "question": "What is personal data?", "language": "English"},
+        {"id": "2", "question": "  what is personal data? ", "language": "English"},
+        {"id": "3", "question": "What is personal data?", "language": "Arabic"},
+    ]
+
+    groups = list(batch.group_requests(requests).values())
+    assert [[request["id"] for request in group] for group in groups] == [["1", "2"], ["3"]]
+
+
+def test_compact_output_keeps_one_answered_record_per_id(tmp_path):
+    output = tmp_path / "answers.jsonl"
+    output.write_text(
+        '{"id": "1", "answer": "first"}\n'
+        '{"id": "2", "error": "timeout"}\n'
+        '{"id": "1", "answer": "again"}\n'
+        '{"id": "3", "ans',
+        encoding="utf-8",
+    )
+
+    assert batch.completed_ids(output) == {"1"}
+    assert batch.compact_output(output) == {"1"}
+    assert read_jsonl(output) == [{"id": "1", "answer": "first"}]
+    assert not (tmp_path / "answers.jsonl.tmp").exists()
+
+
+def test_compact_output_without_earlier_run(tmp_path):
+    assert batch.compact_output(tmp_path / "missing.jsonl") == set()
+    assert not (tmp_path / "missing.jsonl").exists()
+
+
+def test_run_batch_file_resumes_and_retries_errors(tmp_path, monkeypatch):
+    calls = []
+
+    async def answer(question, language, embedding, vector_store, semaphore):
+        calls.append(question)
+        if question == "flaky" and calls.count("flaky") == 1:
+            raise RuntimeError("upstream error")
+        return {"in_scope": True, "answer": f"answer to {question}", "citations": [], "message": question}
+
+    monkeypatch.setattr(batch, "_answer", answer)
+    source = tmp_path / "questions.jsonl"
+    output = tmp_path / "answers.jsonl"
+    write_jsonl(source, [{"id": 1, "question": "stable"}, {"id": 2, "question": "flaky"},
+                         {"id": 3, "question": "Stable"}])
+    vector_store = FakeVectorStore()
+
+    report = asyncio.run(batch.run_batch_file(source, output, vector_store))
+    assert report["answered"] == 2 and report["errors"] == 1
+    # "stable" and "Stable" are one question, embedded in one batch with "flaky"
+    assert report["unique_questions"] == 2
+    assert sorted(calls) == ["flaky", "stable"]
+    assert vector_store.embeddings.batches == [["stable", "flaky"]]
+
+    report = asyncio.run(batch.run_batch_file(source, output, vector_store))
+    assert report["resumed"] == 2 and report["answered"] == 1 and report["errors"] == 0
+    assert calls[-1] == "flaky"
+
+    records = {record["id"]: record for record in read_jsonl(output)}
+    assert len(read_jsonl(output)) == 3
+    assert records["2"]["answer"] == "answer to flaky"
+    assert not any("error" in record for record in records.values())
+
+
+def test_scope_check_failure_does_not_block_the_answer(monkeypatch):
+    async def classify(question, vector_store, embedding):
+        raise RuntimeError("classifier unavailable")
+
+    async def relevant_context(question, vector_store, embedding, language):
+        return []
+
+    async def query_response(question, history, relevant_context, embedding, vector_store, language,
+                             question_summary):
+        return {"answer": "Yes.", "citations": []}
+
+    monkeypatch.setattr(chat, "aclassify_scope", classify)
+    monkeypatch.setattr(batch, "aget_relevant_context", relevant_context)
+    monkeypatch.setattr(batch, "acached_query_response", query_response)
+
+    result = asyncio.run(batch._answer("Is this allowed?", "English", [0.0], None, asyncio.Semaphore(1)))
+    assert result["in_scope"] is True
+    assert result["answer"] == "Yes."
+
+
+def test_out_of_scope_questions_skip_retrieval(monkeypatch):
+    async def classify(question, vector_store, embedding):
+        return False
+
+    async def relevant_context(question, vector_store, embedding, language):
+        pytest.fail("retrieval should not run for an out-of-scope question")
+
+    monkeypatch.setattr(chat, "aclassify_scope", classify)
+    monkeypatch.setattr(batch, "aget_relevant_context", relevant_context)
+
+    result = asyncio.run(batch._answer("What's the weather?", "English", [0.0], None, asyncio.Semaphore(1)))
+    assert result == {"in_scope": False, "answer": batch.OUT_OF_SCOPE_MESSAGE, "citations": [],
+                      "message": batch.OUT_OF_SCOPE_MESSAGE}
+
+
+def test_run_batch_rejects_a_concurrency_below_one():
+    async def run():
+        return [result async for result in batch.run_batch([{"id": "1", "question": "Hi", "language": "English"}],
+                                                           None, 0)]
+
+    with pytest.raises(ValueError, match="at least 1"):
+        asyncio.run(run())
@@ -0,0 +1,42 @@
+import json
+import sys
+import pytest
+from bench import results
+
+
+def report(results_: dict, config: dict = None) -> dict:
+    return {"benchmark": "retrieval", "commit": "abc1234", "config": config or {"k": 5}, "results": results_}
+
+
+def test_compare_reports_the_change_of_shared_numbers():
+    old = report({"latency": {"p50_ms": 20.0, "p95_ms": 40.0}, "recall": 0.8, "cached": True, "only_old": 1})
+    new = report({"latency": {"p50_ms": 15.0, "p95_ms": 44.0}, "recall": 0.8, "cached": False, "only_new": 1})
+
+    changes = results.compare(old, new)
+    assert [path for path, *_ in changes] == ["latency.p50_ms", "latency.p95_ms", "recall"]
+    assert [change for *_, change in changes] == pytest.approx([-25.0, 10.0, 0.0])
+
+
+def test_a_zero_baseline_is_not_a_division_by_zero():
+    assert results.compare(report({"errors": 0}), report({"errors": 3})) == [("errors", 0, 3, 0.0)]
+
+
+def test_latency_report_percentiles():
+    latency = results.latency_report([i / 1000 for i in range(1, 101)])
+
+    assert latency["count"] == 100
+    assert (latency["p50_ms"], latency["p95_ms"], latency["max_ms"]) == (51.0, 96.0, 100.0)
+    assert results.latency_report([]) == {"count": 0}
+
+
+def test_main_hides_changes_below_the_threshold(tmp_path, monkeypatch, capsys):
+    old, new = tmp_path / "old.json", tmp_path / "new.json"
+    old.write_text(json.dumps(report({"p50_ms": 100.0, "p95_ms": 200.0})))
+    new.write_text(json.dumps(report({"p50_ms": 105.0, "p95_ms": 260.0}, config={"k": 10})))
+    monkeypatch.setattr(sys, "argv", ["results", str(old), str(new), "--threshold", "10"])
+    results.main()
+
+    output = capsys.readouterr().out
+    assert "Warning: configs differ" in output
+    assert "p95_ms" in output and "+30.0%" in output
+    assert "p50_ms" not in output
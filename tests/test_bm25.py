@@ -0,0 +1,47 @@
+from src.bm25 import BM25Index, tokenize, reciprocal_rank_fusion
+from src.q_and_a import merge_context
+
+
+def chunk(article: int, paragraph: str) -> dict:
+    return {"content": f"Article {article} paragraph {paragraph}.", "article number": article,
+            "paragraph number": paragraph}
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("The controllers of the entities shall keep records") == ["controller", "entity", "keep", "record"]
+
+
+def test_rarer_and_repeated_terms_rank_higher():
+    index = BM25Index([
+        "The controller shall keep a record of processing.",
+        "The controller shall notify the data breach; a breach notice names the breach.",
+        "The controller shall appoint a data protection officer.",
+    ])
+
+    assert [position for position, _ in index.search("controller breach")] == [1, 0, 2]
+    assert index.search("weather forecast") == []
+
+
+def test_fusion_prefers_items_ranked_by_both_lists():
+    vector = ["a", "b", "c"]
+    lexical = ["c", "d", "b"]
+
+    # b and c are in both lists, c ranks higher on average; ties keep first-seen order
+    assert reciprocal_rank_fusion([vector, lexical]) == ["c", "b", "a", "d"]
+    assert reciprocal_rank_fusion([["x", "y"], ["y", "x"]]) == ["x", "y"]
+
+
+def test_fusion_merges_duplicates_by_key():
+    first = [{"id": 1, "source": "vector"}, {"id": 2, "source": "vector"}]
+    second = [{"id": 2, "source": "bm25"}]
+
+    fused = reciprocal_rank_fusion([first, second], key=lambda item: item["id"])
+    assert fused == [{"id": 2, "source": "vector"}, {"id": 1, "source": "vector"}]
+
+
+def test_merge_context_puts_mentioned_chunks_first_without_duplicates():
+    mentioned = [chunk(5, "2")]
+    rankings = [[chunk(7, "1"), chunk(5, "2"), chunk(1, "1")], [chunk(1, "1"), chunk(9, "1")]]
+
+    context = merge_context(mentioned, rankings, top_k=2, token_budget=10_000)
+    assert [(item["article number"], item["paragraph number"]) for item in context] == [(5, "2"), (1, "1"), (7, "1")]
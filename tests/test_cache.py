@@ -0,0 +1,116 @@
+import time
+import asyncio
+import pytest
+from src.cache import ResponseCache, normalize_question
+
+PROMPT = "translate_en_ar"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=3600, max_memory_entries=2,
+                         max_disk_entries=100)
+
+
+def test_memoize_calls_once_per_normalized_input(cache):
+    calls = []
+
+    @cache.memoize(PROMPT)
+    def translate(text: str) -> dict:
+        calls.append(text)
+        return {"translation": text.upper()}
+
+    assert translate("hello  world") == {"translation": "HELLO  WORLD"}
+    # Whitespace-normalized input hits the cache
+    assert translate(" hello world ") == {"translation": "HELLO  WORLD"}
+    assert translate("other") == {"translation": "OTHER"}
+    assert calls == ["hello  world", "other"]
+    assert cache.stats()["prompts"][PROMPT]["memory_hits"] == 1
+
+
+def test_cached_values_cannot_be_mutated_by_callers(cache):
+    @cache.memoize(PROMPT)
+    def translate(text: str) -> dict:
+        return {"translation": [text]}
+
+    translate("a")["translation"].append("mutated")
+    assert translate("a") == {"translation": ["a"]}
+
+
+def test_disk_tier_serves_entries_evicted_from_memory(cache):
+    calls = []
+
+    @cache.memoize(PROMPT)
+    def translate(text: str) -> str:
+        calls.append(text)
+        return text[::-1]
+
+    for text in ("one", "two", "three"):
+        translate(text)
+    # "one" fell out of the 2-entry LRU but is still on disk
+    assert translate("one") == "eno"
+    assert calls == ["one", "two", "three"]
+    assert cache.stats()["prompts"][PROMPT]["disk_hits"] == 1
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = ResponseCache(path=path, ttl_seconds=3600, max_memory_entries=8, max_disk_entries=100)
+    first.set(PROMPT, "key", {"answer": 42})
+    second = ResponseCache(path=path, ttl_seconds=3600, max_memory_entries=8, max_disk_entries=100)
+    assert second.get(PROMPT, "key") == (True, {"answer": 42})
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=0.05, max_memory_entries=8,
+                          max_disk_entries=100)
+    cache.set(PROMPT, "key", "value")
+    time.sleep(0.1)
+    assert cache.get(PROMPT, "key") == (False, None)
+
+
+def test_async_memoize_uses_both_tiers(cache):
+    calls = []
+
+    @cache.memoize(PROMPT)
+    async def atranslate(text: str) -> str:
+        calls.append(text)
+        return text.upper()
+
+    async def run():
+        results = [await atranslate(text) for text in ("a", "b", "c", "a", "c")]
+        return results
+
+    assert asyncio.run(run()) == ["A", "B", "C", "A", "C"]
+    assert calls == ["a", "b", "c"]
+    stats = cache.stats()["prompts"][PROMPT]
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1
+
+
+def test_keys_depend_on_the_normalizer(cache):
+    calls = []
+
+    @cache.memoize("scope_classifier", normalize=normalize_question)
+    def scope(question: str) -> bool:
+        calls.append(question)
+        return True
+
+    scope("Is biometric data sensitive?")
+    scope("is BIOMETRIC data   sensitive?")
+    assert len(calls) == 1
+    assert cache.make_key(PROMPT, ["a"]) != cache.make_key("scope_classifier", ["a"])
+
+
+def test_disabled_cache_always_calls_through(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=3600, max_memory_entries=8,
+                          max_disk_entries=100, enabled=False)
+    calls = []
+
+    @cache.memoize(PROMPT)
+    def translate(text: str) -> str:
+        calls.append(text)
+        return text
+
+    translate("a")
+    translate("a")
+    assert calls == ["a", "a"]
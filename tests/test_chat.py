@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+from src import chat, language
+from src.pipeline import Stage
+
+CONTEXT = [{"content": "The data subject may request deletion.", "article number": 5, "paragraph number": "2"}]
+RESPONSE = {"answer": "Yes, within 30 days.", "citations": []}
+
+
+def run_turns(prompt: str) -> dict:
+    async def astream():
+        return [event async for event in chat.astream_turn(prompt, "English", [], None)]
+
+    return {
+        "run_turn": chat.run_turn(prompt, "English", [], None),
+        "arun_turn": asyncio.run(chat.arun_turn(prompt, "English", [], None)),
+        "stream_turn": list(chat.stream_turn(prompt, "English", [], None)),
+        "astream_turn": asyncio.run(astream()),
+    }
+
+
+@pytest.fixture(autouse=True)
+def turn_stages(monkeypatch):
+    class Registry:
+        routed = False
+
+    def stream(*args):
+        yield {"type": "delta", "text": "Yes, "}
+        yield {"type": "delta", "text": "within 30 days."}
+        yield {"type": "response", "response": RESPONSE}
+
+    async def astream(*args):
+        for event in stream(*args):
+            yield event
+
+    async def response(*args):
+        return RESPONSE
+
+    monkeypatch.setattr(chat, "get_registry", Registry)
+    monkeypatch.setattr(chat, "relevant_context_stages", lambda vector_store: [
+        Stage("query_embedding", lambda question_summary: [1.0, 0.0], requires=("question_summary",)),
+        Stage("relevant_context", lambda question_summary: CONTEXT, requires=("question_summary",)),
+    ])
+    monkeypatch.setattr(chat, "cached_query_response", lambda *args: RESPONSE)
+    monkeypatch.setattr(chat, "acached_query_response", response)
+    monkeypatch.setattr(chat, "stream_cached_query_response", stream)
+    monkeypatch.setattr(chat, "astream_cached_query_response", astream)
+
+
+def scope_check(monkeypatch, check):
+    async def acheck(question, vector_store, query_embedding=None):
+        return check(question, vector_store, query_embedding)
+
+    monkeypatch.setattr(chat, "classify_scope", check)
+    monkeypatch.setattr(chat, "aclassify_scope", acheck)
+
+
+def test_a_failed_scope_check_does_not_block_any_turn_variant(monkeypatch):
+    def check(question, vector_store, query_embedding=None):
+        raise RuntimeError("classifier unavailable")
+
+    scope_check(monkeypatch, check)
+    turns = run_turns("Can I ask for my data to be deleted?")
+
+    for name in ("run_turn", "arun_turn"):
+        assert (turns[name]["in_scope"], turns[name]["answer"]) == (True, RESPONSE["answer"]), name
+    for name in ("stream_turn", "astream_turn"):
+        *deltas, done = turns[name]
+        assert "".join(event["text"] for event in deltas) == RESPONSE["answer"], name
+        assert (done["type"], done["in_scope"], done["answer"]) == ("done", True, RESPONSE["answer"]), name
+        assert "first_token" in done["timings"] and "response" in done["timings"]
+
+
+def test_out_of_scope_questions_get_the_same_reply_in_every_turn_variant(monkeypatch):
+    scope_check(monkeypatch, lambda question, vector_store, query_embedding=None: False)
+    turns = run_turns("What's the weather?")
+
+    for name in ("run_turn", "arun_turn"):
+        assert turns[name]["message"] == chat.OUT_OF_SCOPE_MESSAGE, name
+    for name in ("stream_turn", "astream_turn"):
+        delta, done = turns[name]
+        assert delta == {"type": "delta", "text": chat.OUT_OF_SCOPE_MESSAGE}, name
+        assert (done["in_scope"], done["message"]) == (False, chat.OUT_OF_SCOPE_MESSAGE), name
+
+
+@pytest.fixture
+def direct_mode(monkeypatch):
+    scope_check(monkeypatch, lambda question, vector_store, query_embedding=None: True)
+    monkeypatch.setattr(language, "ANSWER_LANGUAGE_MODE", "direct")
+    translations = []
+
+    async def translate(text):
+        translations.append(text)
+        return {"translation": "ترجمة"}
+
+    async def untranslatable(text):
+        pytest.fail("direct answers skip the question translation")
+
+    monkeypatch.setattr(chat, "aenglish_to_arabic_translation", translate)
+    monkeypatch.setattr(chat, "aarabic_to_english_translation", untranslatable)
+    return translations
+
+
+def answer_with(monkeypatch, answer: str) -> list:
+    requests = []
+
+    async def response(question, history, context, embedding, vector_store, answer_language, question_summary):
+        requests.append((question, answer_language))
+        return {"answer": answer, "citations": []}
+
+    monkeypatch.setattr(chat, "acached_query_response", response)
+    return requests
+
+
+def test_direct_mode_answers_arabic_questions_in_one_call(direct_mode, monkeypatch):
+    requests = answer_with(monkeypatch, "نعم، خلال ثلاثين يوما.")
+    result = asyncio.run(chat.arun_turn("هل يمكنني طلب حذف بياناتي؟", "Arabic", [], None))
+
+    assert requests == [("هل يمكنني طلب حذف بياناتي؟", "Arabic")]
+    assert result["answer"] == "نعم، خلال ثلاثين يوما."
+    assert direct_mode == []
+
+
+def test_direct_answers_that_come_back_in_english_are_translated(direct_mode, monkeypatch):
+    answer_with(monkeypatch, "Yes, within 30 days.")
+    result = asyncio.run(chat.arun_turn("هل يمكنني طلب حذف بياناتي؟", "Arabic", [], None))
+
+    assert direct_mode == ["Yes, within 30 days."]
+    assert result["answer"] == "ترجمة"
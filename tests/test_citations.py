@@ -0,0 +1,155 @@
+import pytest
+from src import citations
+from src.corpus import invalidate_corpus
+from src.citations import match_score, check_citation, verify_citations
+from src.registry import Route
+
+CONTEXT = [
+    {"content": "The controller shall keep a record of processing activities.",
+     "article number": 5, "paragraph number": "1"},
+    {"content": "The data subject may request the deletion of their personal data without undue delay.",
+     "article number": 5, "paragraph number": "2"},
+]
+
+
+class FakeCollection:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def get(self, include=(), where=None):
+        return {
+            "ids": [str(index) for index in range(len(self.chunks))],
+            "documents": [text for _, _, text in self.chunks],
+            "metadatas": [{"article number": article, "paragraph number": paragraph}
+                          for article, paragraph, _ in self.chunks],
+        }
+
+
+class FakeVectorStore:
+    def __init__(self, chunks):
+        self._collection = FakeCollection(chunks)
+
+
+@pytest.fixture
+def stores():
+    created = []
+
+    def make(chunks):
+        created.append(FakeVectorStore(chunks))
+        return created[-1]
+
+    yield make
+    for store in created:
+        invalidate_corpus(store)
+
+
+def test_match_score():
+    passage = "The controller shall keep a record of processing activities."
+    assert match_score("keep a record of processing", passage) == 1.0
+    # Case, quotes and ellipses are ignored
+    assert match_score('"The Controller shall keep ... a record"', passage) > 0.8
+    assert match_score("Banks shall report incidents", passage) < 0.5
+    assert match_score("", passage) == 0.0
+
+
+def test_verified():
+    check = check_citation({"article": 5, "paragraph": 2, "text": "may request the deletion"}, CONTEXT)
+    assert check["status"] == "verified"
+    assert check["passage"] == CONTEXT[1]["content"]
+
+
+def test_misattributed():
+    check = check_citation({"article": 5, "paragraph": 1, "text": "may request the deletion"}, CONTEXT)
+    assert check["status"] == "misattributed"
+    assert check["match"] is CONTEXT[1]
+
+
+def test_misquoted():
+    check = check_citation({"article": 5, "paragraph": 1, "text": "must appoint a data protection officer"}, CONTEXT)
+    assert check["status"] == "misquoted"
+    assert check["passage"] == CONTEXT[0]["content"]
+
+
+def test_unknown_reference():
+    check = check_citation({"article": 9, "paragraph": 4, "text": "must appoint a data protection officer"}, CONTEXT)
+    assert check == {"status": "unknown_reference", "score": 0.0, "passage": None, "regulation": "", "match": None}
+
+
+def test_paragraph_outside_the_context_is_looked_up_in_the_corpus(stores):
+    store = stores([(8, "3", "Transfers outside the Kingdom require an adequacy decision.")])
+    cited = [{"article": 8, "paragraph": 3, "text": "require an adequacy decision"}]
+
+    assert verify_citations(cited, CONTEXT, store, mode="flag")[0]["status"] == "verified"
+
+
+def test_flag_mode_keeps_citations_and_does_not_mutate_them():
+    cited = [{"article": 5, "paragraph": 1, "text": "may request the deletion"}]
+
+    flagged = verify_citations(cited, CONTEXT, mode="flag")
+    assert flagged[0]["status"] == "misattributed"
+    assert flagged[0]["text"] == "may request the deletion"
+    assert "status" not in cited[0]
+
+
+def test_repair_mode():
+    cited = [
+        {"article": 5, "paragraph": 2, "text": "may request the deletion"},
+        {"article": 5, "paragraph": 1, "text": "may request the deletion"},
+        {"article": 5, "paragraph": 1, "text": "must appoint a data protection officer"},
+        {"article": 9, "paragraph": 4, "text": "must appoint a data protection officer"},
+    ]
+
+    verified, reattributed, requoted = verify_citations(cited, CONTEXT, mode="repair")
+    assert verified["status"] == "verified"
+    assert (reattributed["article"], reattributed["paragraph"], reattributed["status"]) == (5, 2, "repaired")
+    assert reattributed["cited"] == {"article": 5, "paragraph": 1}
+    assert requoted["text"] == CONTEXT[0]["content"]
+    assert requoted["status"] == "repaired"
+
+
+def test_off_mode_passes_citations_through():
+    cited = [{"article": 9, "paragraph": 4, "text": "anything"}]
+    assert verify_citations(cited, CONTEXT, mode="off") is cited
+
+
+def test_routed_citations_are_checked_in_the_regulation_they_name(stores, monkeypatch):
+    collections = {
+        "pdpl_en": stores([(5, "1", "The controller shall keep records of processing.")]),
+        "banking_en": stores([(5, "1", "Banks shall report incidents within 72 hours.")]),
+    }
+
+    class Registry:
+        def load(self, collection):
+            return collections[collection]
+
+    monkeypatch.setattr(citations, "get_registry", Registry)
+    routes = [Route("PDPL", "pdpl_en", "English"), Route("Banking Rules", "banking_en", "English")]
+    banking_quote = "Banks shall report incidents within 72 hours."
+    cited = [{"article": 5, "paragraph": 1, "text": banking_quote, "regulation": "Banking Rules"},
+             {"article": 5, "paragraph": 1, "text": "keep records of processing"},
+             {"article": 5, "paragraph": 1, "text": banking_quote}]
+
+    banking, pdpl, unnamed = verify_citations(cited, [], collections["pdpl_en"], mode="flag", routes=routes)
+    assert (banking["status"], banking["regulation"]) == ("verified", "Banking Rules")
+    # Without a name, the default regulation is cited: the same-numbered paragraph of another
+    # regulation does not verify the quote
+    assert (pdpl["status"], pdpl["regulation"]) == ("verified", "PDPL")
+    assert (unnamed["status"], unnamed["regulation"]) == ("misquoted", "PDPL")
+
+
+def test_same_numbered_context_chunk_of_another_regulation_is_a_misattribution():
+    context = [
+        {"content": "The controller shall keep records of processing.", "article number": 5,
+         "paragraph number": "1", "regulation": "PDPL"},
+        {"content": "Banks shall report incidents within 72 hours.", "article number": 5,
+         "paragraph number": "1", "regulation": "Banking Rules"},
+    ]
+    cited = [{"article": 5, "paragraph": 1, "text": "Banks shall report incidents within 72 hours.",
+              "regulation": "PDPL"}]
+
+    flagged, = verify_citations(cited, context, mode="flag")
+    assert (flagged["status"], flagged["regulation"]) == ("misattributed", "Banking Rules")
+
+    repaired, = verify_citations(cited, context, mode="repair")
+    assert repaired["regulation"] == "Banking Rules"
+    assert repaired["cited"] == {"regulation": "PDPL", "article": 5, "paragraph": 1}
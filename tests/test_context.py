@@ -0,0 +1,49 @@
+import pytest
+from src import context
+from src.context import fit_to_budget, pack_context, render_chunk
+
+
+def chunk(article: int, paragraph: str, words: int, regulation: str = "") -> dict:
+    item = {"content": " ".join(["word"] * words), "article number": article, "paragraph number": paragraph}
+    if regulation:
+        item["regulation"] = regulation
+    return item
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # One token per word, whatever tokenizer is available
+    monkeypatch.setattr(context, "count_tokens", lambda text: len(text.split()))
+
+
+def test_chunks_past_the_budget_are_skipped_but_smaller_ones_still_fit():
+    # Rendered costs: label (4 words) + content + 1 for the newline
+    chunks = [chunk(1, "1", 10), chunk(2, "1", 20), chunk(3, "1", 5)]
+
+    kept, report = fit_to_budget(chunks, token_budget=30)
+    assert [item["article number"] for item in kept] == [1, 3]
+    assert report == {"chunks": 3, "kept": 2, "duplicates": 0, "over_budget": 1, "tokens": 25}
+
+
+def test_the_first_chunk_is_kept_even_over_budget():
+    kept, report = fit_to_budget([chunk(1, "1", 100), chunk(2, "1", 1)], token_budget=10)
+
+    assert [item["article number"] for item in kept] == [1]
+    assert report["tokens"] > 10
+
+
+def test_duplicates_are_dropped_per_regulation():
+    chunks = [chunk(5, "1", 3, "PDPL"), chunk(5, "1", 3, "PDPL"), chunk(5, "1", 3, "Banking Rules")]
+
+    kept, report = fit_to_budget(chunks, token_budget=1000)
+    assert [item["regulation"] for item in kept] == ["PDPL", "Banking Rules"]
+    assert report["duplicates"] == 1
+
+
+def test_pack_context_renders_one_labeled_line_per_chunk():
+    chunks = [{"content": "The controller shall\n keep records.", "article number": 5, "paragraph number": "1"},
+              {"content": "Scope.", "article number": 1, "paragraph number": "", "regulation": "PDPL"}]
+
+    text, report = pack_context(chunks, token_budget=1000)
+    assert text == "[Article 5, Paragraph 1] The controller shall keep records.\n[PDPL, Article 1] Scope."
+    assert report["tokens"] == sum(len(render_chunk(item).split()) + 1 for item in chunks)
@@ -0,0 +1,52 @@
+from src.corpus import Corpus, mention_pairs, chunk_key, batched_metadata_lookup
+
+CHUNKS = [
+    ("c1", "Article 5 header.", {"article number": 5, "paragraph number": ""}),
+    ("c2", "Article 5, paragraph 1.", {"article number": 5, "paragraph number": "1"}),
+    ("c3", "Article 5, paragraph 2.", {"article number": 5, "paragraph number": "2"}),
+    ("c4", "Article 12, paragraph 1.", {"article number": 12, "paragraph number": "1"}),
+]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.wheres = []
+
+    def get(self, include=(), where=None):
+        chunks = CHUNKS
+        if where is not None:
+            self.wheres.append(where)
+            for clause in where["$and"]:
+                (field, condition), = clause.items()
+                chunks = [chunk for chunk in chunks if chunk[2][field] in condition["$in"]]
+        return {"ids": [chunk_id for chunk_id, _, _ in chunks], "documents": [text for _, text, _ in chunks],
+                "metadatas": [metadata for _, _, metadata in chunks]}
+
+
+def test_mention_pairs_normalize_articles_and_paragraphs():
+    mentions = {"articles": [{"article": "5", "paragraphs": [2, ""]}, {"article": 12, "paragraphs": [1]}]}
+    assert mention_pairs(mentions) == [(5, "2"), (5, ""), (12, "1")]
+
+
+def test_corpus_lookup_returns_chunks_in_mention_order():
+    corpus = Corpus.from_collection(FakeCollection())
+
+    chunks = corpus.lookup([(12, "1"), (5, "2"), (7, "1")])
+    assert [chunk["content"] for chunk in chunks] == ["Article 12, paragraph 1.", "Article 5, paragraph 2."]
+    assert len(corpus) == 4
+
+
+def test_chunk_key_tells_regulations_apart():
+    chunk = {"article number": "5", "paragraph number": 1}
+    assert chunk_key(chunk) == ("", 5, "1")
+    assert chunk_key({**chunk, "regulation": "PDPL"}) != chunk_key(chunk)
+
+
+def test_batched_lookup_matches_the_in_process_index():
+    collection = FakeCollection()
+    pairs = [(12, "1"), (5, "2"), (12, "1")]
+
+    # The $in query over-fetches Article 5, Paragraph 1; only the exact pairs are kept
+    assert batched_metadata_lookup(collection, pairs) == Corpus.from_collection(collection).lookup(pairs)
+    assert len(collection.wheres) == 1
+    assert batched_metadata_lookup(collection, []) == []
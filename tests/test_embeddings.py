@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import pytest
+from src.embeddings import EmbeddingService
+
+
+class FakeModel:
+    def __init__(self, gate: threading.Event = None):
+        self.calls = []
+        self.gate = gate
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        if self.gate is not None:
+            self.gate.wait(5)
+        if "broken" in texts:
+            raise RuntimeError("model failed")
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_queries_queued_during_a_forward_pass_share_the_next_batch():
+    gate = threading.Event()
+    model = FakeModel(gate)
+    service = EmbeddingService(model, batch_window=0.0)
+
+    first = service.submit("a")
+    while not model.calls:
+        pass
+    # Duplicates are embedded once; whitespace is normalized away
+    waiting = [service.submit(text) for text in ("bb", "ccc", " bb ")]
+    gate.set()
+
+    assert first.result(5) == (1.0, 1.0)
+    assert [future.result(5) for future in waiting] == [(2.0, 1.0), (3.0, 1.0), (2.0, 1.0)]
+    assert model.calls == [["a"], ["bb", "ccc"]]
+    assert service.stats()["batch_sizes"]["2"] == 1
+
+
+def test_repeated_queries_are_memoized():
+    model = FakeModel()
+    service = EmbeddingService(model)
+
+    assert service.embed_query("What is personal data?") == [22.0, 1.0]
+    assert asyncio.run(service.aembed_query("What  is personal data?")) == [22.0, 1.0]
+    assert model.calls == [["What is personal data?"]]
+    assert service.stats()["cache_hit_rate"] == 0.5
+
+
+def test_documents_skip_cached_texts_and_respect_the_batch_cap():
+    model = FakeModel()
+    service = EmbeddingService(model, max_batch_size=2, cache_size=10)
+    service.embed_query("a")
+
+    vectors = service.embed_documents(["a", "bb", "ccc", "dddd", "bb"])
+
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [4.0, 1.0], [2.0, 1.0]]
+    assert model.calls == [["a"], ["bb", "ccc"], ["dddd"]]
+
+
+def test_the_lru_drops_the_oldest_vector():
+    model = FakeModel()
+    service = EmbeddingService(model, cache_size=2)
+    service.embed_documents(["a", "bb"])
+    service.embed_documents(["a"])  # refreshes "a"
+    service.embed_documents(["ccc"])
+
+    assert list(service.cache) == ["a", "ccc"]
+
+
+def test_a_failed_batch_fails_its_queries_but_not_the_worker():
+    service = EmbeddingService(FakeModel())
+
+    with pytest.raises(RuntimeError, match="model failed"):
+        service.embed_query("broken")
+    assert service.embed_query("fine") == [4.0, 1.0]
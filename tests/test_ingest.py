@@ -0,0 +1,100 @@
+import pytest
+
+for module in ("sklearn", "langchain_core", "langchain_community", "langchain_chroma", "langchain_graph_retriever"):
+    pytest.importorskip(module)
+
+from langchain_core.documents import Document  # noqa: E402
+from src.ingest import split_articles, split_paragraphs, chunk_documents, ingest  # noqa: E402
+
+PAGES = [
+    "Personal Data Protection Law\nArticle 1\nDefinitions. 1- Personal data means any data. 2- Processing means",
+    " any operation on data.\nArti",
+    "cle 2\n1- This law applies to banks and credit bureaus.",
+]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.records = {}
+
+    def get(self, include=()):
+        ids = list(self.records)
+        return {"ids": ids,
+                "documents": [self.records[id_]["document"] for id_ in ids],
+                "metadatas": [self.records[id_]["metadata"] for id_ in ids],
+                "embeddings": [self.records[id_]["embedding"] for id_ in ids]}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for id_, embedding, document, metadata in zip(ids, embeddings, documents, metadatas):
+            self.records[id_] = {"embedding": embedding, "document": document, "metadata": dict(metadata)}
+
+    def update(self, ids, metadatas):
+        for id_, metadata in zip(ids, metadatas):
+            self.records[id_]["metadata"] = dict(metadata)
+
+    def delete(self, ids):
+        for id_ in ids:
+            del self.records[id_]
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text))] for text in texts]
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self._collection = FakeCollection()
+        self.embeddings = FakeEmbeddings()
+
+
+def document(article: int, paragraph: str, text: str, version: str = "27/03/2023") -> Document:
+    return Document(page_content=text, metadata={"article number": article, "paragraph number": paragraph,
+                                                 "version date": version})
+
+
+def test_articles_are_split_across_page_breaks():
+    preamble, *articles = split_articles(PAGES)
+
+    assert preamble.strip() == "Personal Data Protection Law"
+    assert [article.split()[:2] for article in articles] == [["Article", "1"], ["Article", "2"]]
+    assert "Processing means any operation on data." in articles[0]
+
+
+def test_paragraphs_are_numbered_after_the_header():
+    paragraphs = split_paragraphs("Article 1\nDefinitions. 1- Personal data. 2 - Processing.")
+    assert paragraphs == [("", "Article 1\nDefinitions."), ("1", "1- Personal data."), ("2", "2 - Processing.")]
+
+
+def test_chunks_carry_the_retrieval_metadata():
+    documents = chunk_documents(PAGES, "27/03/2023")
+
+    assert [(d.metadata["article number"], d.metadata["paragraph number"]) for d in documents] == [
+        (1, ""), (1, "1"), (1, "2"), (2, ""), (2, "1")]
+    assert {d.metadata["regulation name"] for d in documents} == {"Personal Data Protection Law"}
+
+
+def test_reingesting_only_embeds_changed_text():
+    vector_store = FakeVectorStore()
+    first = [document(1, "1", "Personal data means any data."), document(1, "2", "Processing means any operation.")]
+    assert ingest(first, vector_store)["embedded"] == 2
+
+    revised = [
+        document(1, "1", "Personal data means any data.", version="01/01/2025"),  # metadata only
+        document(1, "3", "Processing means any operation."),  # renumbered
+        document(2, "1", "This law applies to banks."),  # new
+    ]
+    vector_store.embeddings.embedded.clear()
+    report = ingest(revised, vector_store, batch_size=1)
+
+    assert vector_store.embeddings.embedded == ["This law applies to banks."]
+    assert (report["metadata_updated"], report["reused_embeddings"], report["embedded"], report["deleted"]) == (1, 1, 1, 1)
+    stored = {(record["metadata"]["article number"], record["metadata"]["paragraph number"]): record
+              for record in vector_store._collection.records.values()}
+    assert set(stored) == {(1, "1"), (1, "3"), (2, "1")}
+    assert stored[(1, "1")]["metadata"]["version date"] == "01/01/2025"
+    assert ingest(revised, vector_store)["unchanged"] == 3
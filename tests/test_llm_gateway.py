@@ -0,0 +1,143 @@
+import asyncio
+import httpx
+import openai
+import pytest
+import src.llm as llm
+from src import language
+
+REQUEST = httpx.Request("POST", "https://openrouter.test/api/v1/responses")
+
+
+def _status_error(status: int, headers: dict = None):
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+class FakeResponses:
+    def __init__(self, failures: list):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def create(self, **request):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return type("Response", (), {"output_text": "{}", "usage": None})()
+
+    async def acreate(self, **request):
+        return self.create(**request)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_BACKOFF_BASE", 0.0)
+
+
+def test_retryable_errors_are_retried(monkeypatch):
+    fake = FakeResponses([openai.APIConnectionError(request=REQUEST), _status_error(503)])
+    monkeypatch.setattr(llm.client.responses, "create", fake.create)
+    response = llm.create_response(model="test/retry", input=[])
+    assert response.output_text == "{}"
+    assert fake.calls == 3
+    assert llm.get_metrics()["test/retry"]["retries"] == 2
+
+
+def test_client_errors_fail_without_retrying(monkeypatch):
+    fake = FakeResponses([_status_error(400)])
+    monkeypatch.setattr(llm.client.responses, "create", fake.create)
+    with pytest.raises(openai.APIStatusError):
+        llm.create_response(model="test/bad-request", input=[])
+    assert fake.calls == 1
+    assert llm.get_metrics()["test/bad-request"]["failures"] == 1
+
+
+def test_retries_stop_after_the_limit(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_MAX_RETRIES", 2)
+    fake = FakeResponses([_status_error(500)] * 5)
+    monkeypatch.setattr(llm.client.responses, "create", fake.create)
+    with pytest.raises(openai.APIStatusError):
+        llm.create_response(model="test/limit", input=[])
+    assert fake.calls == 3
+
+
+def test_async_gateway_retries(monkeypatch):
+    fake = FakeResponses([_status_error(429)])
+
+    async def run():
+        async_client, _ = llm._state()
+        monkeypatch.setattr(async_client.responses, "create", fake.acreate)
+        return await llm.acreate_response(model="test/async", input=[])
+
+    assert asyncio.run(run()).output_text == "{}"
+    assert fake.calls == 2
+
+
+def test_retry_after_header_sets_the_minimum_delay():
+    assert llm._retry_after(_status_error(429, {"retry-after": "3"})) == 3.0
+    assert llm._retry_after(_status_error(429, {"retry-after-ms": "250"})) == 0.25
+    assert llm._retry_after(_status_error(429)) is None
+    assert llm._backoff(0, _status_error(429, {"retry-after": "2"})) >= 2.0
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = llm.TokenBucket(rate=1.0, capacity=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(1.0, abs=0.05)
+    assert bucket.reserve() == pytest.approx(2.0, abs=0.05)
+
+
+def test_rate_limit_spec_is_parsed_per_model():
+    assert llm._parse_rate_limits("a/b=30, c/d:free=10,broken") == {"a/b": 30.0, "c/d:free": 10.0}
+
+
+def test_each_event_loop_gets_its_own_client_and_semaphore():
+    async def state():
+        assert llm._state() is llm._state()
+        return llm._state()
+
+    first, second = asyncio.run(state()), asyncio.run(state())
+    assert first[0] is not second[0] and first[1] is not second[1]
+
+
+
+def test_async_requests_in_flight_are_capped(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_MAX_CONCURRENCY", 2)
+    in_flight = []
+    peak = 0
+
+    async def create(**request):
+        nonlocal peak
+        in_flight.append(request)
+        peak = max(peak, len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        return type("Response", (), {"output_text": "{}", "usage": None})()
+
+    async def run():
+        async_client, _ = llm._state()
+        monkeypatch.setattr(async_client.responses, "create", create)
+        await asyncio.gather(*(llm.acreate_response(model="test/capped", input=[]) for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2
+    assert llm.get_metrics()["test/capped"]["requests"] == 6
+
+
+def test_sync_and_async_helpers_send_the_same_request(monkeypatch):
+    requests = []
+
+    def create(**request):
+        requests.append(request)
+        return type("Response", (), {"output_text": '{"translation": "Hello"}', "usage": None})()
+
+    async def acreate(**request):
+        return create(**request)
+
+    monkeypatch.setattr(language, "create_response", create)
+    monkeypatch.setattr(language, "acreate_response", acreate)
+    monkeypatch.setattr(language.response_cache, "enabled", False)
+
+    assert language.arabic_to_english_translation("مرحبا") == {"translation": "Hello"}
+    assert asyncio.run(language.aarabic_to_english_translation("مرحبا")) == {"translation": "Hello"}
+    assert requests[0] == requests[1]
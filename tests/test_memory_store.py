@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from src.memory_store import InMemoryVectorStore  # noqa: E402
+
+
+class FakeEmbeddings:
+    def embed_query(self, text: str) -> list[float]:
+        return [1.0, 0.0] if "controller" in text else [0.0, 1.0]
+
+
+class FakeCollection:
+    def get(self, include=()):
+        return {
+            "ids": ["a", "b", "c", "d"],
+            "documents": ["controller duties", "breach notice", "processor duties", "penalties"],
+            "metadatas": [{"article number": number, "paragraph number": "1"} for number in (1, 2, 3, 4)],
+            "embeddings": [[1.0, 0.0], [0.0, 1.0], [0.8, 0.2], [0.5, 0.5]],
+        }
+
+
+class FakeChroma:
+    def __init__(self):
+        self._collection = FakeCollection()
+        self.embeddings = FakeEmbeddings()
+
+
+@pytest.fixture
+def store():
+    return InMemoryVectorStore.from_chroma(FakeChroma())
+
+
+def test_top_k_is_exact_and_ordered_by_distance(store):
+    results = store.similarity_search_with_score("controller obligations", k=3)
+
+    assert [document.id for document, _ in results] == ["a", "c", "d"]
+    assert [score for _, score in results] == pytest.approx([0.0, 0.08, 0.5])
+    assert results[0][0].metadata == {"article number": 1, "paragraph number": "1"}
+
+
+def test_matches_brute_force_on_random_vectors():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 16)).astype(np.float32)
+    query = rng.normal(size=16).astype(np.float32)
+    store = InMemoryVectorStore(FakeEmbeddings(), [str(i) for i in range(200)], [""] * 200, [{}] * 200, vectors)
+
+    expected = np.argsort(((vectors - query) ** 2).sum(axis=1), kind="stable")[:10]
+    assert [document.id for document in store.similarity_search_by_vector(query, k=10)] == [str(i) for i in expected]
+
+
+def test_k_larger_than_the_collection_returns_everything(store):
+    assert len(store.similarity_search_by_vector([0.0, 1.0], k=10)) == len(store) == 4
@@ -0,0 +1,89 @@
+import time
+import asyncio
+import pytest
+from src.pipeline import Pipeline, Stage
+
+
+def test_stages_receive_their_dependencies_by_name():
+    pipeline = Pipeline([
+        Stage("double", lambda x: x * 2, requires=("x",)),
+        Stage("sum", lambda double, y: double + y, requires=("double", "y")),
+    ])
+    result = pipeline.run(x=3, y=1)
+    assert result["double"] == 6
+    assert result["sum"] == 7
+    assert set(result.timings) == {"double", "sum", "total"}
+
+
+def test_independent_stages_run_concurrently():
+    def slow(value):
+        time.sleep(0.2)
+        return value
+
+    pipeline = Pipeline([Stage(f"stage_{i}", lambda x: slow(x), requires=("x",)) for i in range(4)])
+    started = time.perf_counter()
+    result = pipeline.run(x=1)
+    assert time.perf_counter() - started < 0.6
+    assert [result[f"stage_{i}"] for i in range(4)] == [1, 1, 1, 1]
+
+
+def test_when_skips_the_stage_and_its_dependents():
+    calls = []
+    pipeline = Pipeline([
+        Stage("gate", lambda x: x, requires=("x",)),
+        Stage("answer", lambda gate: calls.append("answer") or "answer", requires=("gate",),
+              when=lambda gate: gate),
+        Stage("translate", lambda answer: calls.append("translate") or answer.upper(), requires=("answer",)),
+        Stage("other", lambda x: "other", requires=("x",)),
+    ])
+    result = pipeline.run(x=False)
+    assert result["answer"] is None and result["translate"] is None
+    assert set(result.skipped) == {"answer", "translate"}
+    assert result["other"] == "other"
+    assert calls == []
+
+
+def test_unknown_dependency_is_rejected_before_running():
+    pipeline = Pipeline([Stage("a", lambda missing: missing, requires=("missing",))])
+    with pytest.raises(ValueError, match="unknown values"):
+        pipeline.run()
+
+
+def test_dependency_cycle_is_reported():
+    pipeline = Pipeline([
+        Stage("a", lambda b: b, requires=("b",)),
+        Stage("b", lambda a: a, requires=("a",)),
+    ])
+    with pytest.raises(ValueError, match="cycle"):
+        pipeline.run()
+
+
+def test_duplicate_stage_names_are_rejected():
+    with pytest.raises(ValueError, match="Duplicate"):
+        Pipeline([Stage("a", lambda: 1), Stage("a", lambda: 2)])
+
+
+def test_arun_awaits_afunc_and_threads_sync_stages():
+    async def fetch(x):
+        await asyncio.sleep(0.01)
+        return x + 1
+
+    pipeline = Pipeline([
+        Stage("fetched", lambda x: pytest.fail("sync path used"), requires=("x",), afunc=fetch),
+        Stage("squared", lambda fetched: fetched ** 2, requires=("fetched",)),
+    ])
+    result = asyncio.run(pipeline.arun(x=2))
+    assert result["fetched"] == 3
+    assert result["squared"] == 9
+    assert result.timings["total"]["duration"] >= result.timings["fetched"]["duration"]
+
+
+def test_stage_errors_propagate():
+    def fail(x):
+        raise RuntimeError("stage failed")
+
+    pipeline = Pipeline([Stage("boom", fail, requires=("x",))])
+    with pytest.raises(RuntimeError, match="stage failed"):
+        pipeline.run(x=1)
+    with pytest.raises(RuntimeError, match="stage failed"):
+        asyncio.run(pipeline.arun(x=1))
@@ -0,0 +1,62 @@
+import pytest
+from src.references import parse_references, CONFIDENT, FUZZY_KEYWORD, UNSUPPORTED, UNRESOLVED
+
+
+def articles(text: str) -> dict:
+    result, _ = parse_references(text)
+    return {entry["article"]: entry["paragraphs"] for entry in result["articles"]}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("What does Article 5, Paragraph 2 say?", {5: [2]}),
+    ("Article 23(6)", {23: [6]}),
+    ("paragraph 6 of Article 23", {23: [6]}),
+    ("Article 1, paragraphs 4, 5 and 6", {1: [4, 5, 6]}),
+    ("Articles 3 and 4", {3: [], 4: []}),
+    ("الفقرة ٦ من المادة ٢٣", {23: [6]}),
+])
+def test_explicit_references(text, expected):
+    assert articles(text) == expected
+    assert parse_references(text)[1] == CONFIDENT
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("paragraphs 4-6 of Article 1", {1: [4, 5, 6]}),
+    ("paragraphs 4–6 of Article 1", {1: [4, 5, 6]}),
+    ("paragraphs 2 to 4 of Article 9", {9: [2, 3, 4]}),
+])
+def test_ranges_are_expanded(text, expected):
+    assert articles(text) == expected
+    assert parse_references(text)[1] == CONFIDENT
+
+
+@pytest.mark.parametrize("text", ["paragraph 1-100 of Article 5", "paragraphs 6-4 of Article 5"])
+def test_wide_or_reversed_ranges_are_left_to_the_llm(text):
+    result, confidence = parse_references(text)
+    assert result["articles"] == [{"article": 5, "paragraphs": []}]
+    assert confidence <= UNRESOLVED
+
+
+def test_ordinals():
+    assert articles("the sixth paragraph of Article 23") == {23: [6]}
+    assert articles("the first to third paragraphs of Article 2") == {2: [1, 2, 3]}
+
+
+def test_misspelled_keyword_lowers_confidence():
+    result, confidence = parse_references("the sixth paragraph of Articel 23")
+    assert result["articles"] == [{"article": 23, "paragraphs": [6]}]
+    assert confidence == FUZZY_KEYWORD
+
+
+@pytest.mark.parametrize("text", ["What does the previous article say?", "What does section 4 say?"])
+def test_unsupported_references_have_low_confidence(text):
+    assert parse_references(text)[1] <= UNSUPPORTED
+
+
+def test_question_without_references_is_confident():
+    assert parse_references("Tell me about capital requirements") == ({"articles": [], "sectors": []}, CONFIDENT)
+
+
+def test_sectors():
+    result, _ = parse_references("How are banks regulated under Article 7?")
+    assert result["sectors"] == ["Finance & Banking"]
@@ -0,0 +1,112 @@
+import sqlite3
+import pytest
+from src import scope, registry as registry_module
+from src.bm25 import get_bm25_index
+from src.corpus import load_corpus, invalidate_corpus
+from src.registry import CollectionRegistry, Regulation, Route
+
+
+class FakeCollection:
+    def __init__(self, name: str):
+        self.name = name
+
+    def get(self, include=(), where=None):
+        return {"ids": [f"{self.name}-1"], "documents": [f"Text of {self.name}."],
+                "metadatas": [{"article number": 1, "paragraph number": "1"}]}
+
+
+class FakeVectorStore:
+    def __init__(self, name: str):
+        self._collection = FakeCollection(name)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    regulations = [
+        Regulation("pdpl", "PDPL", {"English": "pdpl_en"}),
+        Regulation("credit", "Credit Information Law", {"English": "credit_en"}, sectors=["Finance & Banking"]),
+        Regulation("health", "Health Data Rules", {"English": "health_en", "Arabic": "health_ar"},
+                   sectors=["Health & Medical Services"]),
+    ]
+    registry = CollectionRegistry(regulations, "pdpl", "test-model", "./unused", max_loaded=2)
+    monkeypatch.setattr(registry, "_load_collection", FakeVectorStore)
+    yield registry
+    for vector_store in registry.stores.values():
+        invalidate_corpus(vector_store)
+
+
+def test_cached_corpus_keeps_its_collection_alive():
+    # The cache holds the collection, so a later collection can't reuse its id and get its index
+    vector_store = FakeVectorStore("first")
+    corpus = load_corpus(vector_store)
+    collection_id = id(vector_store._collection)
+    del vector_store
+
+    later = FakeVectorStore("second")
+    assert id(later._collection) != collection_id
+    assert load_corpus(later).documents == ["Text of second."]
+    assert corpus.documents == ["Text of first."]
+    invalidate_corpus(later)
+
+
+def test_eviction_drops_the_derived_caches(registry, monkeypatch):
+    monkeypatch.setattr(scope, "ScopeClassifier", lambda vector_store, multilingual: object())
+    credit = registry.load("credit_en")
+    corpus = load_corpus(credit)
+    index = get_bm25_index(credit)
+    classifier = scope.get_scope_classifier(credit)
+
+    registry.load("health_en")  # evicts credit_en; the default collection is pinned
+    registry.load("pdpl_en")
+
+    assert "credit_en" not in registry.stores
+    assert registry.stats()["evictions"] == 1
+    assert load_corpus(credit) is not corpus
+    assert get_bm25_index(credit) is not index
+    assert scope.get_scope_classifier(credit) is not classifier
+    invalidate_corpus(credit)
+    scope.invalidate_scope_classifier(credit)
+
+
+def test_collections_missing_from_chroma_are_reported(registry, tmp_path, monkeypatch):
+    connection = sqlite3.connect(tmp_path / "chroma.sqlite3")
+    connection.execute("CREATE TABLE collections (id TEXT PRIMARY KEY, name TEXT NOT NULL)")
+    connection.executemany("INSERT INTO collections VALUES (?, ?)", [("1", "pdpl_en"), ("2", "health_en")])
+    connection.commit()
+    connection.close()
+    registry.persist_directory = str(tmp_path)
+
+    assert [(regulation.key, language, collection) for regulation, language, collection
+            in registry.missing_collections()] == [("credit", "English", "credit_en"), ("health", "Arabic", "health_ar")]
+
+    monkeypatch.setattr(registry_module, "_registry", None)
+    monkeypatch.setattr(CollectionRegistry, "from_yaml", lambda: registry)
+    with pytest.raises(ValueError, match="python -m src.ingest .* --language Arabic --collection health_ar"):
+        registry_module.get_registry()
+    assert registry_module._registry is None
+
+
+def test_routing_follows_the_sectors_and_the_language(registry):
+    assert registry.routed
+    assert registry.route([]) == [Route("PDPL", "pdpl_en", "English")]
+    assert registry.route(["Finance & Banking"]) == [Route("PDPL", "pdpl_en", "English"),
+                                                     Route("Credit Information Law", "credit_en", "English")]
+    # Arabic questions search a regulation's Arabic collection, and the English one otherwise
+    assert registry.route(["Health & Medical Services"], "Arabic") == [
+        Route("PDPL", "pdpl_en", "English"), Route("Health Data Rules", "health_ar", "Arabic")]
+    assert registry.stats()["average_fan_out"] == pytest.approx(5 / 3)
+
+
+def test_a_multilingual_model_searches_english_collections_as_asked(registry):
+    registry.multilingual = True
+    assert registry.route([], "Arabic") == [Route("PDPL", "pdpl_en", "Arabic")]
+
+
+def test_every_regulation_needs_an_english_collection():
+    with pytest.raises(ValueError, match="no English collection"):
+        Regulation("health", "Health Data Rules", {"Arabic": "health_ar"})
+
+
+def test_a_single_collection_is_not_routed():
+    registry = CollectionRegistry([Regulation("pdpl", "PDPL", {"English": "pdpl_en"})], "pdpl", "test-model", "./unused")
+    assert not registry.routed
@@ -0,0 +1,138 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from src import extraction, q_and_a
+from src.bm25 import invalidate_bm25_index
+from src.corpus import invalidate_corpus
+from src.q_and_a import get_relevant_context, aget_relevant_context
+from src.registry import Route
+
+CHUNKS = [
+    (1, "", "Article 1 sets out the scope of this law."),
+    (1, "1", "This law applies to every entity processing personal data."),
+    (5, "1", "The controller shall keep a record of processing activities."),
+    (5, "2", "The data subject may request the deletion of their personal data."),
+    (7, "1", "Banks shall notify the regulator of any data breach within 72 hours."),
+]
+
+
+class FakeCollection:
+    def get(self, include=(), where=None):
+        return {
+            "ids": [f"chunk-{index}" for index in range(len(CHUNKS))],
+            "documents": [text for _, _, text in CHUNKS],
+            "metadatas": [{"article number": article, "paragraph number": paragraph}
+                          for article, paragraph, _ in CHUNKS],
+        }
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return [0.0, 1.0]
+
+
+class FakeVectorStore:
+    """A Chroma stand-in whose similarity searches return the breach paragraph first."""
+
+    def __init__(self):
+        self._collection = FakeCollection()
+        self.embeddings = FakeEmbeddings()
+        self.searches = []
+
+    def _documents(self, k: int) -> list:
+        order = [4, 2, 1]
+        return [SimpleNamespace(page_content=CHUNKS[index][2],
+                                metadata={"article number": CHUNKS[index][0], "paragraph number": CHUNKS[index][1]})
+                for index in order[:k]]
+
+    def similarity_search(self, query: str, k: int = 5) -> list:
+        self.searches.append(("text", query))
+        return self._documents(k)
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 5) -> list:
+        self.searches.append(("vector", embedding))
+        return self._documents(k)
+
+
+@pytest.fixture
+def vector_store():
+    store = FakeVectorStore()
+    yield store
+    corpus = invalidate_corpus(store)
+    if corpus is not None:
+        invalidate_bm25_index(corpus)
+
+
+@pytest.fixture(autouse=True)
+def no_llm_extraction(monkeypatch):
+    def extractor(question):
+        raise AssertionError("the LLM extractor should not be called for a confident parse")
+
+    async def aextractor(question):
+        extractor(question)
+
+    monkeypatch.setattr(extraction, "extract_articles_and_paragraphs", extractor)
+    monkeypatch.setattr(extraction, "aextract_articles_and_paragraphs", aextractor)
+
+
+def keys(context: list[dict]) -> list[tuple]:
+    return [(chunk["article number"], chunk["paragraph number"]) for chunk in context]
+
+
+def test_mentioned_paragraph_comes_first(vector_store):
+    context = get_relevant_context("What does Article 5, Paragraph 2 say?", vector_store)
+
+    assert keys(context)[0] == (5, "2")
+    assert context[0]["content"] == CHUNKS[3][2]
+    assert (7, "1") in keys(context)
+    # No duplicates between the mentioned chunk and the search results
+    assert len(keys(context)) == len(set(keys(context)))
+    assert vector_store.embeddings.queries == ["What does Article 5, Paragraph 2 say?"]
+    assert vector_store.searches == [("vector", [0.0, 1.0])]
+
+
+def test_precomputed_embedding_is_not_recomputed(vector_store):
+    context = get_relevant_context("What does Article 5, Paragraph 2 say?", vector_store,
+                                   query_embedding=[0.5, 0.5])
+
+    assert keys(context)[0] == (5, "2")
+    assert vector_store.embeddings.queries == []
+    assert vector_store.searches == [("vector", [0.5, 0.5])]
+
+
+def test_async_version_matches(vector_store):
+    question = "What does Article 5, Paragraph 2 say?"
+    context = asyncio.run(aget_relevant_context(question, vector_store, language="English"))
+
+    assert context == get_relevant_context(question, vector_store, language="English")
+    assert keys(context)[0] == (5, "2")
+
+
+def test_question_without_references_uses_search_results(vector_store):
+    context = get_relevant_context("Who must be notified of a data breach?", vector_store)
+
+    assert keys(context)[0] == (7, "1")
+
+
+def test_routed_mentions_are_resolved_in_every_routed_collection(monkeypatch):
+    default, other = FakeVectorStore(), FakeVectorStore()
+
+    class Registry:
+        def load(self, collection):
+            return {"pdpl_en": default, "banking_en": other}[collection]
+
+    monkeypatch.setattr(q_and_a, "get_registry", Registry)
+    routes = [Route("PDPL", "pdpl_en", "English"), Route("Banking Rules", "banking_en", "English")]
+    try:
+        chunks = q_and_a.lookup_routed_mentions({"articles": [{"article": 5, "paragraphs": [2]}]}, routes)
+    finally:
+        for store in (default, other):
+            invalidate_corpus(store)
+
+    assert [(chunk["regulation"], chunk["article number"], chunk["paragraph number"]) for chunk in chunks] == [
+        ("PDPL", 5, "2"), ("Banking Rules", 5, "2")]
+    assert chunks[1]["collection"] == "banking_en"
@@ -0,0 +1,101 @@
+import pytest
+from src import scope
+from src.scope import ScopeClassifier, looks_english
+
+# Toy embedding space: one axis for data protection, one for everything else
+AXES = {"data": [1.0, 0.0], "weather": [0.0, 1.0]}
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        words = text.casefold().split()
+        vector = [0.0, 0.0]
+        for word, axis in AXES.items():
+            if any(word in token for token in words):
+                vector = [value + delta for value, delta in zip(vector, axis)]
+        return vector if any(vector) else [0.5, 0.5]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeCollection:
+    def get(self, include=()):
+        return {"embeddings": [[1.0, 0.0], [0.9, 0.1]],
+                "metadatas": [{"article number": 1}, {"article number": 2}]}
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self._collection = FakeCollection()
+        self.embeddings = FakeEmbeddings()
+
+
+@pytest.fixture
+def examples(tmp_path):
+    path = tmp_path / "scope_examples.yml"
+    path.write_text('in_scope: ["Who owns my data?"]\nout_of_scope: ["Will the weather be sunny?"]\n')
+    return path
+
+
+@pytest.fixture
+def classifier(examples):
+    return ScopeClassifier(FakeVectorStore(), in_threshold=0.2, out_threshold=-0.2, examples_path=examples)
+
+
+def test_confident_margins_are_decided_locally(classifier):
+    assert classifier.classify("Can a bank sell customer data?")[0] is True
+    assert classifier.classify("Is the weather nice tomorrow?")[0] is False
+    # About as close to both sides: left to the LLM
+    decision, score = classifier.classify("Does the weather affect data centres?")
+    assert decision is None and abs(score["margin"]) < 0.2
+
+
+def test_a_precomputed_embedding_is_used_as_is(classifier):
+    classifier.embeddings.queries.clear()
+    assert classifier.classify("anything at all", query_embedding=[0.0, 1.0])[0] is False
+    assert classifier.embeddings.queries == []
+
+
+def test_explicit_references_are_in_scope_without_embedding(classifier):
+    classifier.embeddings.queries.clear()
+    assert classifier.classify("What does Article 5, Paragraph 2 say?") == (True, {"reference": True})
+    assert classifier.embeddings.queries == []
+
+
+def test_non_english_questions_are_scored_only_with_a_multilingual_model(examples):
+    question = "هل الطقس مشمس غدا؟"
+    english_only = ScopeClassifier(FakeVectorStore(), examples_path=examples)
+    multilingual = ScopeClassifier(FakeVectorStore(), examples_path=examples, multilingual=True)
+
+    assert english_only.classify(question) == (None, {"non_english": True})
+    assert "margin" in multilingual.classify(question)[1]
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("Can my employer read my emails?", True),
+    ("", True),
+    ("هل يحق لي حذف بياناتي؟", False),
+    ("Quels sont mes droits d'accès à mes données ?", True),
+    ("Какие у меня права?", False),
+])
+def test_looks_english(question, expected):
+    assert looks_english(question) is expected
+
+
+def test_uncertain_or_disabled_local_tier_defers_to_the_llm(classifier, monkeypatch):
+    calls = []
+    monkeypatch.setattr(scope, "extract_qa_scope", lambda question: calls.append(question) or True)
+    monkeypatch.setattr(scope, "get_scope_classifier", lambda vector_store: classifier)
+
+    monkeypatch.setattr(scope, "SCOPE_LOCAL_ENABLED", False)
+    assert scope.classify_scope("Is the weather nice tomorrow?", None) is True
+    monkeypatch.setattr(scope, "SCOPE_LOCAL_ENABLED", True)
+    assert scope.classify_scope("Is the weather nice tomorrow?", None) is False
+    assert scope.classify_scope("Does the weather affect data centres?", None) is True
+
+    assert calls == ["Is the weather nice tomorrow?", "Does the weather affect data centres?"]
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from src import semantic_cache as semantic_cache_module
+from src.semantic_cache import SemanticAnswerCache
+
+CONTEXT = [{"content": "...", "article number": 5, "paragraph number": "2"}]
+RESPONSE = {"answer": "The data subject may request deletion.", "citations": []}
+
+
+class FakeCollection:
+    name = "test_collection"
+
+    def __init__(self):
+        self.ids = ["chunk-1", "chunk-2"]
+
+    def get(self, include=()):
+        return {"ids": list(self.ids)}
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self._collection = FakeCollection()
+
+
+@pytest.fixture
+def vector_store():
+    return FakeVectorStore()
+
+
+@pytest.fixture
+def cache():
+    return SemanticAnswerCache(threshold=0.92, max_entries=16, fingerprint_ttl=0.0)
+
+
+def test_distinct_arabic_questions_do_not_share_answers(cache, vector_store):
+    # MiniLM embeds Arabic as near-identical noise vectors: the cache must not trust them
+    first = "ما هي حقوق صاحب البيانات في حذف بياناته؟"
+    second = "متى يجب على المتحكم حذف البيانات الشخصية؟"
+    cache.store(vector_store, [1.0, 0.0], CONTEXT, RESPONSE, "Arabic", question_summary=first)
+
+    assert cache.lookup(vector_store, [1.0, 0.0], CONTEXT, "Arabic", question_summary=second) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["skipped"] == 1
+
+
+def test_arabic_questions_are_cached_with_a_multilingual_model(cache, vector_store, monkeypatch):
+    class Registry:
+        multilingual = True
+
+    monkeypatch.setattr(semantic_cache_module, "get_registry", Registry)
+    question = "ما هي حقوق صاحب البيانات في حذف بياناته؟"
+    cache.store(vector_store, [1.0, 0.0], CONTEXT, RESPONSE, "Arabic", question_summary=question)
+
+    assert cache.lookup(vector_store, [1.0, 0.0], CONTEXT, "Arabic", question_summary=question) == RESPONSE
+
+
+def at_similarity(similarity: float) -> list[float]:
+    # A unit vector whose cosine similarity with [1, 0] is `similarity`
+    return [similarity, float(np.sqrt(1 - similarity ** 2))]
+
+
+def test_hits_start_at_the_threshold(cache, vector_store):
+    cache.store(vector_store, [1.0, 0.0], CONTEXT, RESPONSE)
+
+    assert cache.lookup(vector_store, at_similarity(0.93), CONTEXT) == RESPONSE
+    assert cache.lookup(vector_store, at_similarity(0.91), CONTEXT) is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_a_paraphrase_with_other_context_or_language_misses(cache, vector_store):
+    cache.store(vector_store, [1.0, 0.0], CONTEXT, RESPONSE)
+    other_context = [{"content": "...", "article number": 5, "paragraph number": "3"}]
+
+    assert cache.lookup(vector_store, [1.0, 0.0], other_context) is None
+    assert cache.lookup(vector_store, [1.0, 0.0], CONTEXT, "Arabic") is None
+    assert cache.stats()["context_mismatches"] == 2
+
+
+def test_reindexing_the_collection_drops_cached_answers(cache, vector_store):
+    cache.store(vector_store, [1.0, 0.0], CONTEXT, RESPONSE)
+    vector_store._collection.ids.append("chunk-3")
+
+    assert cache.lookup(vector_store, [1.0, 0.0], CONTEXT) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_oldest_answers_are_evicted_first(vector_store):
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=2, fingerprint_ttl=0.0)
+    for number, vector in enumerate(([1.0, 0.0], [0.0, 1.0], [-1.0, 0.0])):
+        cache.store(vector_store, vector, CONTEXT, {"answer": str(number), "citations": []})
+
+    assert cache.lookup(vector_store, [1.0, 0.0], CONTEXT) is None
+    assert cache.lookup(vector_store, [-1.0, 0.0], CONTEXT)["answer"] == "2"
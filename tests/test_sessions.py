@@ -0,0 +1,81 @@
+import json
+import time
+import pytest
+from src.sessions import Session, MemorySessionStore, SqliteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteSessionStore(path=str(tmp_path / "sessions.sqlite3"), window=6)
+    return MemorySessionStore(window=6)
+
+
+def test_displayed_answers_survive_a_reload(store):
+    session = store.load("s1")
+    store.add_turn(session, "What does Article 5 say?", "It requires records.",
+                   "It requires records.\n\nReferences:\n- Article 5, Paragraph 1: keep a record\n")
+    store.add_turn(store.load("s1"), "Thanks", "You're welcome.", "You're welcome.")
+
+    reloaded = store.load("s1")
+    # The model sees the plain answers, the user the rendered ones
+    assert reloaded.messages[1] == ("assistant", "It requires records.")
+    assert reloaded.display_messages() == [
+        ("user", "What does Article 5 say?"),
+        ("assistant", "It requires records.\n\nReferences:\n- Article 5, Paragraph 1: keep a record\n"),
+        ("user", "Thanks"),
+        ("assistant", "You're welcome."),
+    ]
+
+
+def test_displayed_messages_are_trimmed_with_the_window(store):
+    for number in range(5):
+        store.add_turn(store.load("s1"), f"q{number}", f"a{number}", f"a{number} + refs")
+
+    session = store.load("s1")
+    assert len(session.messages) == len(session.displayed) == 6
+    assert session.display_messages()[0] == ("user", "q2")
+    assert session.display_messages()[-1] == ("assistant", "a4 + refs")
+
+
+def test_sessions_saved_without_displayed_messages_still_load():
+    data = json.dumps({"session_id": "old", "messages": [["user", "hi"], ["assistant", "hello"]], "summary": "",
+                       "pending": 2, "updated": 0.0})
+
+    assert Session.from_json(data).display_messages() == [("user", "hi"), ("assistant", "hello")]
+
+
+def test_idle_sessions_expire(store, monkeypatch):
+    store.add_turn(store.load("s1"), "q", "a")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + store.ttl_seconds + 1)
+
+    assert store.get("s1") is None
+    assert store.load("s1").messages == []
+
+
+def test_least_recently_used_sessions_are_evicted():
+    store = MemorySessionStore(max_sessions=2)
+    for session_id in ("s1", "s2"):
+        store.add_turn(store.load(session_id), "q", "a")
+    store.get("s1")
+    store.add_turn(store.load("s3"), "q", "a")
+
+    assert [session_id for session_id in ("s1", "s2", "s3") if store.get(session_id)] == ["s1", "s3"]
+
+
+def test_a_turn_keeps_a_summary_folded_since_the_session_was_loaded(store):
+    store.add_turn(store.load("s1"), "q0", "a0")
+    stale = store.load("s1")
+    store.update_summary("s1", "summary of q0", 2)
+
+    session = store.add_turn(stale, "q1", "a1")
+    assert (session.summary, session.pending) == ("summary of q0", 2)
+    assert session.recent_messages() == [("user", "q1"), ("assistant", "a1")]
+
+
+def test_stored_sessions_are_not_shared_objects(store):
+    session = store.add_turn(store.load("s1"), "q", "a")
+    session.messages.append(("user", "unsaved"))
+
+    assert len(store.get("s1").messages) == 2
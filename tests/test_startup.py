@@ -0,0 +1,59 @@
+import sys
+import pytest
+from src import startup, registry as registry_module
+
+
+class FakeRegistry:
+    embeddings = object()
+
+    def default_store(self):
+        return "store"
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(startup, "_imports", {})
+    monkeypatch.setattr(startup, "_steps", {name: {"status": "pending", "seconds": None}
+                                            for name in startup.WARMUP_STEPS})
+    monkeypatch.setattr(startup, "_warmup", {"status": "pending", "seconds": None, "error": None, "attempts": 0})
+    monkeypatch.setattr(startup, "_ready", startup.threading.Event())
+    monkeypatch.setattr(registry_module, "get_registry", FakeRegistry)
+    monkeypatch.setattr(startup, "_warm_scope_classifier", lambda vector_store: None)
+
+
+def test_lazy_import_records_only_the_first_import(monkeypatch):
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    module = startup.lazy_import("colorsys")
+
+    assert startup.lazy_import("colorsys") is module is sys.modules["colorsys"]
+    assert list(startup.startup_report()["import_seconds"]) == ["colorsys"]
+
+
+def test_warm_up_runs_every_step_once(monkeypatch):
+    queries = []
+    monkeypatch.setattr(startup, "_warm_query", queries.append)
+
+    assert startup.warm_up() == startup.warm_up() == "store"
+    report = startup.startup_report()
+    assert queries == ["store"]
+    assert (report["ready"], report["status"], report["attempts"], report["progress"]) == (True, "ready", 1, 1.0)
+    assert {step["status"] for step in report["steps"].values()} == {"ready"}
+
+
+def test_a_failed_step_is_reported_and_retried(monkeypatch):
+    def fail(vector_store):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(startup, "_warm_query", fail)
+    with pytest.raises(RuntimeError):
+        startup.warm_up()
+    report = startup.startup_report()
+    assert (report["ready"], report["status"], report["error"]) == (False, "failed", "index unavailable")
+    assert report["steps"]["warmup_query"]["status"] == "failed"
+    assert report["steps"]["scope_classifier"]["status"] == "pending"
+    assert report["progress"] == 0.5
+
+    monkeypatch.setattr(startup, "_warm_query", lambda vector_store: None)
+    startup.warm_up()
+    report = startup.startup_report()
+    assert (report["ready"], report["status"], report["error"], report["attempts"]) == (True, "ready", None, 2)
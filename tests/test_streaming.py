@@ -0,0 +1,58 @@
+import json
+import asyncio
+from types import SimpleNamespace
+import pytest
+from src.streaming import JsonFieldStreamer, stream_json_field, astream_json_field
+
+RESPONSE = {
+    "citations": [{"article": 5, "paragraph": 2, "text": "the \"answer\" key"}],
+    "answer": "Yes — within 30 days.\nSee \"Article 5\" \\ \U0001F4D8 and المادة ٥.",
+    "confidence": 0.9,
+}
+
+
+def fragments(text: str, size: int) -> list[str]:
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_field_is_decoded_whatever_the_fragment_boundaries(size):
+    # ASCII escapes put escape sequences and surrogate pairs across fragment boundaries
+    text = json.dumps(RESPONSE, ensure_ascii=True)
+    streamer = JsonFieldStreamer("answer")
+
+    assert "".join(streamer.feed(fragment) for fragment in fragments(text, size)) == RESPONSE["answer"]
+    assert streamer.text == text
+
+
+def test_nested_keys_with_the_same_name_are_ignored():
+    text = json.dumps({"citations": [{"answer": "nested"}], "answer": "top level"})
+    assert JsonFieldStreamer("answer").feed(text) == "top level"
+
+
+def events(text: str, size: int = 4, failure: str = None) -> list:
+    stream = [SimpleNamespace(type="response.output_text.delta", delta=fragment) for fragment in fragments(text, size)]
+    if failure:
+        stream.append(SimpleNamespace(type=failure))
+    return stream
+
+
+def test_stream_json_field_yields_deltas_then_the_parsed_response():
+    streamed = list(stream_json_field(events(json.dumps(RESPONSE)), "answer"))
+
+    assert "".join(event["text"] for event in streamed[:-1]) == RESPONSE["answer"]
+    assert streamed[-1] == {"type": "response", "response": RESPONSE}
+
+
+def test_failed_streams_raise():
+    async def aevents():
+        for event in events(json.dumps(RESPONSE)[:20], failure="response.failed"):
+            yield event
+
+    async def consume():
+        return [event async for event in astream_json_field(aevents(), "answer")]
+
+    with pytest.raises(RuntimeError, match="response.failed"):
+        list(stream_json_field(events(json.dumps(RESPONSE)[:20], failure="response.failed"), "answer"))
+    with pytest.raises(RuntimeError, match="response.failed"):
+        asyncio.run(consume())
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from src import summaries
+from src.sessions import MemorySessionStore
+from src.summaries import fold_due, refresh_summary, arefresh_summary, is_self_contained, needs_question_summary
+
+
+@pytest.fixture
+def store():
+    return MemorySessionStore(window=6)
+
+
+def add_turns(store, session_id: str, count: int):
+    for number in range(count):
+        session = store.add_turn(store.load(session_id), f"q{number}", f"a{number}")
+    return session
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    calls = []
+
+    def update(summary, messages):
+        calls.append((summary, messages))
+        return f"summary of {len(messages)} messages"
+
+    async def aupdate(summary, messages):
+        return update(summary, messages)
+
+    monkeypatch.setattr(summaries, "update_conversation_summary", update)
+    monkeypatch.setattr(summaries, "aupdate_conversation_summary", aupdate)
+    return calls
+
+
+def test_out_of_scope_turns_are_folded_before_they_leave_the_window(store):
+    assert fold_due(store, add_turns(store, "s1", 1), in_scope=True)
+    assert not fold_due(store, add_turns(store, "s2", 2), in_scope=False)
+    # Another exchange would push unfolded messages out of the 6-message window
+    assert fold_due(store, add_turns(store, "s3", 3), in_scope=False)
+
+
+def test_refresh_waits_for_enough_pending_messages(store, summarizer):
+    add_turns(store, "s1", 1)
+    refresh_summary(store, "s1", min_messages=4)
+
+    assert summarizer == []
+    assert store.get("s1").pending == 2
+
+
+def test_refresh_folds_the_pending_messages(store, summarizer):
+    add_turns(store, "s1", 2)
+    refresh_summary(store, "s1", min_messages=4)
+
+    assert summarizer == [("", ["User: q0", "Assistant: a0", "User: q1", "Assistant: a1"])]
+    session = store.get("s1")
+    assert (session.summary, session.pending) == ("summary of 4 messages", 0)
+    assert session.recent_messages() == [("user", "q1"), ("assistant", "a1")]
+
+
+def test_messages_added_during_a_refresh_stay_pending(store, monkeypatch):
+    add_turns(store, "s1", 2)
+
+    async def aupdate(summary, messages):
+        store.add_turn(store.load("s1"), "late question", "late answer")
+        return "summary"
+
+    monkeypatch.setattr(summaries, "aupdate_conversation_summary", aupdate)
+    asyncio.run(arefresh_summary(store, "s1", min_messages=4))
+
+    session = store.get("s1")
+    assert session.pending == 2
+    assert session.pending_messages() == [("user", "late question"), ("assistant", "late answer")]
+
+
+def test_a_failed_refresh_keeps_the_messages_pending(store, monkeypatch):
+    add_turns(store, "s1", 2)
+
+    def update(summary, messages):
+        raise RuntimeError("LLM unavailable")
+
+    monkeypatch.setattr(summaries, "update_conversation_summary", update)
+    refresh_summary(store, "s1", min_messages=4)
+
+    assert (store.get("s1").summary, store.get("s1").pending) == ("", 4)
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("What are the obligations of a data controller?", True),
+    ("What about paragraph 3?", False),
+    ("Does it apply to banks?", False),
+    ("Which article?", False),
+    ("ما هي التزامات المتحكم في البيانات؟", False),
+])
+def test_self_contained_questions(question, expected):
+    assert is_self_contained(question) is expected
+
+
+def test_rewrite_is_only_needed_for_follow_ups_in_a_conversation():
+    history = ["Human: What is personal data?\n", "AI: Any data about a person.\n"]
+
+    assert not needs_question_summary("Does it apply to banks?", [])
+    assert not needs_question_summary("What are the obligations of a data controller?", history)
+    assert needs_question_summary("Does it apply to banks?", history)
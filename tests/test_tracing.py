@@ -0,0 +1,73 @@
+import json
+import pytest
+from src import tracing
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(tracing, "span_metrics", tracing.SpanMetrics())
+    monkeypatch.setattr(tracing, "exporter", None)
+
+
+def test_spans_nest_and_counters_go_to_the_innermost_span():
+    with tracing.span("turn") as turn:
+        with tracing.span("response") as response:
+            tracing.add("cache_misses")
+            tracing.record_llm_call("model-a", 0.2, 120, 30)
+        tracing.add("cache_hits")
+    tracing.add("cache_hits")  # no open span: ignored
+
+    assert response.parent is turn and response.trace_id == turn.trace_id
+    assert tracing.current_span() is None
+    metrics = tracing.get_span_metrics()
+    assert (metrics["turn"]["cache_hits"], metrics["turn"]["llm_calls"]) == (1, 0)
+    assert (metrics["response"]["cache_misses"], metrics["response"]["llm_calls"]) == (1, 1)
+    assert metrics["response"]["models"] == {"model-a": 1}
+    assert metrics["response"]["input_tokens"]["buckets"]["250"] == 1
+    assert metrics["response"]["input_tokens"]["buckets"]["100"] == 0
+    assert metrics["turn"]["input_tokens"]["count"] == 0
+
+
+def test_errors_are_counted_and_reraised():
+    with pytest.raises(ValueError):
+        with tracing.span("scope"):
+            raise ValueError("boom")
+
+    assert tracing.get_span_metrics()["scope"]["errors"] == 1
+    assert 'stage_errors_total{stage="scope"} 1' in tracing.prometheus_metrics()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = tracing.Histogram((1, 10))
+    for value in (0.5, 5, 5, 50):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 1, "10": 3, "+Inf": 4}
+    assert (snapshot["p50"], snapshot["p95"], snapshot["mean"]) == (10, 10, 15.125)
+
+
+def test_prometheus_exposition_has_a_series_per_stage():
+    with tracing.span("relevant_context"):
+        pass
+
+    text = tracing.prometheus_metrics()
+    assert '# TYPE stage_wall_seconds histogram' in text
+    assert 'stage_wall_seconds_bucket{stage="relevant_context",le="+Inf"} 1' in text
+    assert 'stage_wall_seconds_count{stage="relevant_context"} 1' in text
+
+
+def test_finished_spans_are_exported_as_otlp_json(tmp_path, monkeypatch):
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(tracing, "exporter", tracing.SpanExporter(str(path)))
+    with tracing.span("turn", language="Arabic") as turn:
+        with tracing.span("response"):
+            pass
+
+    child, parent = [json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+                     for line in path.read_text(encoding="utf-8").splitlines()]
+    assert (child["name"], parent["name"]) == ("response", "turn")
+    assert child["parentSpanId"] == parent["spanId"] == turn.span_id
+    assert "parentSpanId" not in parent
+    assert parent["attributes"] == [{"key": "language", "value": {"stringValue": "Arabic"}}]
+    assert parent["status"] == {"code": 1}